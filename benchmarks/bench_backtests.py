@@ -0,0 +1,34 @@
+# Time run_backtests over every selection file against a loop of run_backtest, and check they agree.
+# Run from anywhere: python benchmarks/bench_backtests.py
+import numpy as np
+
+import common
+import backtest as bt
+import datahandler as dh
+
+
+def loop(selections, periods, returns):
+    return {name: bt.run_backtest(selection, periods, returns) for name, selection in selections.items()}
+
+
+def main():
+    df = dh.normalise_constituents(common.synthetic_constituents(240, 600))
+    returns = dh.industry_return(df)
+    periods = dh.get_regime(dh.REGIME_FILE_OPTION[0])
+    selections = {name: dh.industry_group_selection(name) for name in dh.INDUSTRY_GROUPS_OPTION}
+
+    t_one, _ = common.timeit(bt.run_backtest, selections[dh.INDUSTRY_GROUPS_OPTION[0]], periods, returns)
+    t_loop, looped = common.timeit(loop, selections, periods, returns)
+    t_batch, batched = common.timeit(bt.run_backtests, selections, periods, returns)
+    for name, (incl, excl, incl_ex_stag, excl_ex_stag, _) in looped.items():
+        result = batched[batched['BT'] == name]
+        assert np.allclose(result['favour_mean'], incl['favour_mean'], rtol=1e-12)
+        assert np.allclose(result['avoid_mean'], excl['avoid_mean'], rtol=1e-12)
+        assert np.allclose(result['favour_mean_ex_stag'], incl_ex_stag['favour_mean'], rtol=1e-12)
+        assert np.allclose(result['avoid_mean_ex_stag'], excl_ex_stag['avoid_mean'], rtol=1e-12)
+    print(f'{len(selections)} selections: one run_backtest {t_one:.3f}s, loop {t_loop:.3f}s, '
+          f'run_backtests {t_batch:.3f}s  match ok')
+
+
+if __name__ == '__main__':
+    main()
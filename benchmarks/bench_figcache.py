@@ -0,0 +1,57 @@
+# Time serving the backtest figures through figcache: first build, memory hit and disk hit (a fresh
+# server process), for the compare chart and a quantstats monthly heatmap. Runs on the seeded
+# synthetic universe, 29 selection files.
+# Run from anywhere: python benchmarks/bench_figcache.py
+import shutil
+import tempfile
+import time
+
+import common
+import synthetic
+import backtest as bt
+import datahandler as dh
+import figcache as fc
+import plots as pt
+from bench_plots import compare_frame
+
+
+def serve(key, build, *args, **kwargs):
+    start = time.perf_counter()
+    fc.cached_figure(key, build, *args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    folder = tempfile.mkdtemp() + '/'
+    try:
+        run(folder)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def run(folder: str):
+    names = synthetic.load_data(folder)
+    regime_file = names['regimes'][0]
+    selects = names['selections']
+    returns = dh.get_return_panel('industry')
+    results = bt.run_backtests({s: dh.industry_group_selection(s) for s in selects}, dh.get_regime(regime_file), returns)
+    to_plot = compare_frame(results, bt.market_return(returns))
+    favour = results[results['BT'] == selects[0]].set_index('date')['favour_mean']
+    pt.plot_multi(to_plot.head(10))  # import plotly before timing
+
+    fc.FIGURE_STORE = folder + 'figures/'
+    for name, build, args, kind in [(f'plot_multi, {len(selects)} configs', pt.plot_multi, (to_plot,), 'plotly'),
+                                    ('monthly_returns heatmap', pt.monthly_returns, (favour,), 'pyplot')]:
+        key = fc.figure_key(name, regime_file, selects)
+        built = serve(key, build, *args, kind=kind)
+        memory = serve(key, build, *args, kind=kind)
+        fc.clear()
+        disk = serve(key, build, *args, kind=kind)
+        print(f'{name:<28} build {built * 1000:7.1f}ms  memory hit {memory * 1000:6.3f}ms  disk hit {disk * 1000:6.1f}ms')
+    start = time.perf_counter()
+    fc.figure_key('plot_multi', regime_file, selects, 'ALL', 'favour')
+    print(f'figure_key over {len(selects)} selection files: {(time.perf_counter() - start) * 1000:.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
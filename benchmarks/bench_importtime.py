@@ -0,0 +1,79 @@
+# Import-time budget check for the dashboard entry point, pages and shared modules.
+# Each target is imported in a fresh interpreter under `python -X importtime`; for a page
+# that is every import ahead of its first drawing statement.
+# Run from anywhere: python benchmarks/bench_importtime.py [--scale 1.5]
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+from common import ROOT
+
+DASHBOARD = os.path.join(ROOT, 'dashboard')
+# milliseconds, cumulative import time on a cold interpreter
+BUDGETS = {
+    'app': 800,
+    'datahandler': 1500,
+    'backtest': 900,
+    'metrics': 900,
+    'plots': 900,
+    'pages/sector_stats': 1800,
+    'pages/universe_stats': 1800,
+    'pages/regime_backtest': 1700,
+    'pages/compare_backtest': 1700,
+    'pages/rolling_stats': 1700,
+    'pages/royal_clock': 1800,
+}
+
+
+def startup_imports(path: str) -> list:
+    modules = []
+    for node in ast.parse(open(path).read()).body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules.append(node.module)
+        else:
+            break
+    return modules
+
+
+def import_time(modules: list) -> float:
+    # total of the cumulative microseconds of every top-level (unindented) entry in -X importtime
+    code = '; '.join(f'import {m}' for m in modules)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=DASHBOARD,
+                          capture_output=True, text=True, check=True)
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            total += int(cumulative)
+    return total / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every budget, for slower machines')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    failed = []
+    for target, budget in BUDGETS.items():
+        path = os.path.join(DASHBOARD, target + '.py')
+        modules = startup_imports(path) if target.startswith('pages/') or target == 'app' else [target]
+        ms = statistics.median(import_time(modules) for _ in range(args.repeat))
+        limit = budget * args.scale
+        status = 'ok' if ms <= limit else 'OVER'
+        print(f'{target:<26} {ms:8.0f}ms  budget {limit:6.0f}ms  {status}  ({", ".join(modules)})')
+        if ms > limit:
+            failed.append(target)
+    if failed:
+        sys.exit(f'over budget: {", ".join(failed)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Overhead of the instrumentation layer: per call of an instrumented function (disabled, timing,
+# timing + memory) against the bare function, and on the regime_backtest page's computations.
+# Run from anywhere: python benchmarks/bench_instrument.py
+import timeit
+
+import common
+import backtest as bt
+import datahandler as dh
+import instrument as ins
+import plots as pt
+
+
+@ins.timed
+def noop(x):
+    return x
+
+
+def page(selection, periods, returns):
+    # what regime_backtest.py computes on a rerun, without the result store and figure cache
+    incl, excl, incl_ex_stag, excl_ex_stag, market = bt.run_backtest(selection, periods, returns)
+    bt.evaluate_windows(incl, excl, market, bt.WINDOWS)
+    bt.evaluate_windows(incl_ex_stag, excl_ex_stag, market, bt.WINDOWS)
+    pt.plot(incl, excl, market)
+    pt.plot(incl_ex_stag, excl_ex_stag, market)
+
+
+def per_call(func, n: int = 200_000) -> float:
+    return min(timeit.repeat(lambda: func(1), number=n, repeat=5)) / n * 1e9
+
+
+def main():
+    bare = per_call(noop.__wrapped__)
+    ins.enable(False)
+    off = per_call(noop)
+    ins.enable(True)
+    on = per_call(noop)
+    ins.enable(True, memory=True)
+    memory = per_call(noop, 20_000)
+    print(f'per call: bare {bare:.0f}ns  disabled +{off - bare:.0f}ns  enabled +{on - bare:.0f}ns  '
+          f'enabled with memory +{memory - bare:.0f}ns')
+
+    returns = dh.build_return_panels(dh.normalise_constituents(common.synthetic_constituents(240, 2000)))['industry']
+    args = (dh.industry_group_selection(dh.INDUSTRY_GROUPS_OPTION[0]), dh.get_regime(dh.REGIME_FILE_OPTION[0]), returns)
+    page(*args)  # import plotly before timing
+    # modes interleaved over several rounds, best of each, so machine noise does not land on one mode
+    modes = [('disabled', False, False), ('enabled', True, False), ('enabled with memory', True, True)]
+    timings = dict.fromkeys([name for name, _, _ in modes], float('inf'))
+    for _ in range(5):
+        for name, on, memory in modes:
+            ins.enable(on, memory)
+            ins.begin('bench')
+            timings[name] = min(timings[name], common.timeit(page, *args)[0])
+    ins.enable(False)
+    base = timings['disabled']
+    print('page computations: ' + '  '.join(f'{name} {t * 1000:.1f}ms ({t / base - 1:+.1%})' for name, t in timings.items()))
+    stages = ins.record()['stages']
+    print(f'{len(stages)} stages recorded in the last rerun, slowest {stages[0]["stage"]}')
+
+
+if __name__ == '__main__':
+    main()
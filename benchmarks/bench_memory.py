@@ -0,0 +1,76 @@
+# Per-process memory footprint of a realistic-size constituents universe as the pages hold it: read
+# straight from the csv (object strings, float64), from the previous store (categorical groups but
+# object tickers and float64), both with the column of datetime.date universe_stats used to add,
+# against the compact store (categorical labels and tickers, datetime64 dates, float32). Times the
+# industry groupby and the page's date/sector filter on each.
+# Each layout is loaded in a fresh process so the peak RSS of one does not hide the other.
+# Run from anywhere: python benchmarks/bench_memory.py [n_dates] [n_stocks]
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import common
+import datahandler as dh
+
+
+def rss_mb() -> float:
+    # peak resident set size of this process; ru_maxrss is in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load(path: str, layout: str) -> dict:
+    baseline = rss_mb()
+    df = pd.read_parquet(path)
+    if layout != 'compact':
+        df['date'] = pd.to_datetime(df['date']).dt.date
+    lo, hi = df['date'].min(), df['date'].max()
+    start = time.perf_counter()
+    dh.group_return(df, ['date', 'industry_adj'])
+    grouped = time.perf_counter() - start
+    start = time.perf_counter()
+    mid = lo + (hi - lo) / 2
+    df[(df['date'] >= mid) & df['sector'].isin(['Financials', 'Energy'])]
+    filtered = time.perf_counter() - start
+    return {'frame': df.memory_usage(deep=True).sum() / 2**20, 'rss': rss_mb() - baseline,
+            'groupby': grouped, 'filter': filtered}
+
+
+def main():
+    n_dates = int(sys.argv[1]) if len(sys.argv) > 1 else 240
+    n_stocks = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    df = dh.normalise_constituents(common.synthetic_constituents(n_dates, n_stocks))
+    folder = tempfile.mkdtemp()
+    paths = {layout: f'{folder}/{layout}.parquet' for layout in ['csv', 'store v1', 'compact']}
+    df.to_parquet(paths['csv'], index=False)
+    previous = df.assign(date=pd.to_datetime(df['date']))
+    previous[dh.CATEGORY_COLUMNS] = previous[dh.CATEGORY_COLUMNS].astype('category')
+    previous.to_parquet(paths['store v1'], index=False)
+    dh.compact_constituents(df).to_parquet(paths['compact'], index=False)
+    print(f'{len(df):,} constituent rows, {n_stocks} tickers')
+
+    results = {}
+    for layout, path in paths.items():
+        with ProcessPoolExecutor(1) as pool:
+            results[layout] = pool.submit(load, path, layout).result()
+        r = results[layout]
+        print(f'{layout:<9} frame {r["frame"]:8.1f}MB  process rss +{r["rss"]:8.1f}MB  '
+              f'industry groupby {r["groupby"] * 1000:7.1f}ms  date/sector filter {r["filter"] * 1000:6.1f}ms')
+    new = results['compact']
+    for layout in ['csv', 'store v1']:
+        old = results[layout]
+        print(f'against {layout}: frame {old["frame"] / new["frame"]:.1f}x smaller, rss {old["rss"] / new["rss"]:.1f}x smaller, '
+          f'groupby {old["groupby"] / new["groupby"]:.1f}x faster, filter {old["filter"] / new["filter"]:.1f}x faster')
+
+    # the float32 store gives the same panels to float32 precision
+    keys = ['date', 'industry_adj']
+    pd.testing.assert_frame_equal(dh.group_return(dh.compact_constituents(df), keys), dh.group_return(previous, keys),
+                                  check_index_type=False, rtol=1e-5)
+    print('industry panel from the float32 store matches float64 to 1e-5')
+
+
+if __name__ == '__main__':
+    main()
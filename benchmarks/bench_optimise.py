@@ -0,0 +1,69 @@
+# The selection-matrix search: checks the batched kernel gives run_backtest's favour_mean +
+# avoid_mean for every hand-made selection file and that a written matrix reads back through
+# industry_group_selection, then times the kernel over random candidates and a full search.
+# Runs on the seeded synthetic universe, 29 selection files.
+# Run from anywhere: python benchmarks/bench_optimise.py [candidates]
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+import common
+import synthetic
+import backtest as bt
+import datahandler as dh
+import optimise as op
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    folder = tempfile.mkdtemp() + '/'
+    try:
+        run(folder, n)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def run(folder: str, n: int):
+    names = synthetic.load_data(folder)
+    returns = dh.get_return_panel('industry')
+    periods = dh.get_regime(names['regimes'][0])
+    data = op.prepare(periods, returns, train=(None, None), test=bt.WINDOWS['2023 onwards'])
+
+    selections = [dh.industry_group_selection(name) for name in names['selections']]
+    candidates = np.stack([op.from_selection(s, data) for s in selections])
+    for leg in op.LEGS:
+        got = op.leg_returns(data, candidates, 'train', leg)
+        for b, selection in enumerate(selections):
+            incl, excl, _, _, _ = bt.run_backtest(selection, periods, returns)
+            expected = {'favour': incl['favour_mean'], 'avoid': excl['avoid_mean'],
+                        'spread': incl['favour_mean'] + excl['avoid_mean']}[leg]
+            np.testing.assert_allclose(got[:, b], expected.to_numpy(), rtol=1e-12, atol=1e-15)
+    print(f'kernel matches run_backtest for {len(selections)} selection files')
+
+    op.to_selection(candidates[-1], data).to_csv(folder + 'written.csv', index=False)
+    np.testing.assert_array_equal(op.from_selection(dh.industry_group_selection('written'), data), candidates[-1])
+    print('written selection file reads back')
+
+    rng = np.random.default_rng(0)
+    shape = (len(data['labels']), len(data['industries']))
+    excluded = np.zeros(shape[0], dtype=bool)
+    random = op.random_candidates(n, shape, 5, 5, excluded, rng)
+    for objective in ['mean', 'sharpe']:
+        t, _ = common.timeit(op.score, data, random, 'train', 'spread', objective, repeat=1)
+        print(f'{n:,} random candidates, {objective:<6}: {t:6.2f}s  {n / t * 60 / 1e6:6.1f}M candidates per minute')
+
+    data = op.prepare(periods, returns)
+    t, result = common.timeit(op.optimise, data, repeat=1)
+    assert op.feasible(result['candidates'], 5, 5, excluded).all()
+    print(f'search: {result["evaluated"]:,} candidates in {t:.2f}s, best train sharpe {result["scores"]["train"].iloc[0]:.2f} '
+          f'(test {result["scores"]["test"].iloc[0]:.2f})')
+    t, result = common.timeit(op.optimise, data, 'sharpe', 'spread', 5, 5, ['Stagflation'], repeat=1)
+    assert not result['candidates'][:, data['labels'].index('Stagflation')].any()
+    print(f'no Stagflation trades: {result["evaluated"]:,} candidates in {t:.2f}s, best train sharpe '
+          f'{result["scores"]["train"].iloc[0]:.2f} (test {result["scores"]["test"].iloc[0]:.2f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+# Scaling of the return panel aggregation over a process pool: the constituents are written once to
+# a memory-mapped Arrow file, cut into date ranges and aggregated by 1/2/4/8 workers. Every worker
+# count must give exactly (bit for bit) the single-process panels.
+# Run from anywhere: python benchmarks/bench_parallel.py [n_dates] [n_stocks]
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+import common
+import datahandler as dh
+
+
+def main():
+    n_dates = int(sys.argv[1]) if len(sys.argv) > 1 else 240
+    n_stocks = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    df = dh.compact_constituents(dh.normalise_constituents(common.synthetic_constituents(n_dates, n_stocks)))
+    print(f'{len(df):,} constituent rows, {os.cpu_count()} cpu(s)')
+
+    t_serial, expected = common.timeit(dh.build_return_panels, df)
+    print(f'in process       {t_serial:6.2f}s')
+    path = tempfile.mkdtemp() + '/constituents.arrow'
+    t_write, _ = common.timeit(dh.write_arrow, df, path)
+    print(f'write arrow file {t_write:6.2f}s  {os.path.getsize(path) / 2**20:.0f}MB')
+    try:
+        for workers in [1, 2, 4, 8]:
+            t, panels = common.timeit(dh.parallel_return_panels, path, workers)
+            for level, panel in expected.items():
+                pd.testing.assert_frame_equal(panels[level], panel, check_exact=True)
+            print(f'{workers} worker(s)      {t:6.2f}s  speedup {t_serial / t:5.2f}x  '
+                  f'with the write {t_serial / (t + t_write):5.2f}x  exact match')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# Figure build time and JSON payload size of the backtest charts: the original per-date band loop
+# with SVG lines against run-length encoded bands, WebGL lines and optional decimation.
+# Run from anywhere: python benchmarks/bench_plots.py
+import time
+
+import numpy as np
+import pandas as pd
+
+import common
+import backtest as bt
+import datahandler as dh
+import legacy
+import plots as pt
+
+
+def compare_frame(results: pd.DataFrame, market: pd.Series) -> pd.DataFrame:
+    # the long frame compare_backtest.py hands to plot_multi
+    frames = []
+    for i, (name, result) in enumerate(results.groupby('BT', sort=False)):
+        result = result.set_index('date')
+        tmp = pd.DataFrame({'favour': result['favour_mean'].cumsum(), 'avoid': result['avoid_mean'].cumsum()})
+        tmp['market'] = market.cumsum() if i == 0 else None
+        tmp['date'] = tmp.index
+        tmp['OECD_CH'] = result['OECD_CH']
+        tmp['BT'] = name
+        frames.append(tmp)
+    to_plot = pd.concat(frames).melt(id_vars=['date', 'BT', 'OECD_CH'], value_vars=['favour', 'avoid', 'market'])
+    to_plot['label'] = np.where(to_plot['variable'] != 'market', to_plot['BT'] + '-' + to_plot['variable'], 'market')
+    return to_plot[to_plot['value'].notna()]
+
+
+def measure(build, *args):
+    start = time.perf_counter()
+    fig = build(*args)
+    built = time.perf_counter() - start
+    payload = fig.to_json()
+    return built, time.perf_counter() - start - built, len(payload), fig
+
+
+def report(name, build, *args):
+    built, serialised, size, fig = measure(build, *args)
+    print(f'  {name:<26} build {built * 1000:7.1f}ms  to_json {serialised * 1000:6.1f}ms  '
+          f'{size / 1024:8.1f}kB  {len(fig.layout.shapes):4d} shapes {len(fig.data):3d} traces')
+    return fig
+
+
+def same_bands(old, new) -> bool:
+    key = lambda s: (pd.Timestamp(s.x0), pd.Timestamp(s.x1), s.fillcolor)
+    return [key(s) for s in old.layout.shapes] == [key(s) for s in new.layout.shapes]
+
+
+def main():
+    returns = dh.build_return_panels(dh.normalise_constituents(common.synthetic_constituents(n_stocks=500)))['industry']
+    regime = dh.get_regime(dh.REGIME_FILE_OPTION[0])
+    selections = {s: dh.industry_group_selection(s) for s in dict.fromkeys(dh.INDUSTRY_GROUPS_OPTION)}
+    results = bt.run_backtests(selections, regime, returns)
+    market = bt.market_return(returns)
+    pt.plot_multi(compare_frame(results.head(1), market))  # import plotly before timing
+
+    incl, excl, _, _, _ = bt.run_backtest(selections[dh.INDUSTRY_GROUPS_OPTION[0]], regime, returns)
+    incl, excl = incl.loc[incl.index >= '2005-11-01'], excl.loc[excl.index >= '2005-11-01']
+    print(f'plot: one backtest, {len(incl)} months')
+    old = report('original', legacy.plot, incl, excl, market)
+    new = report('shape batch', pt.plot, incl, excl, market)
+    report('band traces', pt.plot, incl, excl, market, 'trace')
+    assert same_bands(old, new)
+
+    for n in [1, 10, len(selections)]:
+        picked = results[results['BT'].isin(list(selections)[:n])]
+        to_plot = compare_frame(picked, market)
+        print(f'plot_multi: {n} configs, {to_plot["label"].nunique()} lines')
+        old = report('original', legacy.plot_multi, to_plot)
+        new = report('shape batch', pt.plot_multi, to_plot)
+        report('band traces', pt.plot_multi, to_plot, 'trace')
+        report('shape batch, 120 points', pt.plot_multi, to_plot, 'shapes', 120)
+        assert same_bands(old, new)
+
+    # a daily-length history, where decimation matters
+    dates = pd.bdate_range('2005-11-01', periods=5000)
+    rng = np.random.default_rng(0)
+    labels = np.repeat(rng.choice(list(pt.COLOUR_MAP), 240), 5000 // 240 + 1)[:5000]
+    daily = pd.DataFrame({'OECD_CH': labels, 'favour_mean': rng.normal(0, 0.01, 5000)}, index=dates)
+    daily['avoid_mean'] = rng.normal(0, 0.01, 5000)
+    print(f'plot: {len(daily)} daily points')
+    report('original', legacy.plot, daily, daily, daily['favour_mean'])
+    report('shape batch', pt.plot, daily, daily, daily['favour_mean'])
+    report('shape batch, 1000 points', pt.plot, daily, daily, daily['favour_mean'], 'shapes', 1000)
+
+
+if __name__ == '__main__':
+    main()
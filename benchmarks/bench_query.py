@@ -0,0 +1,57 @@
+# The universe_stats table query: the original boolean-mask scan over the whole constituents frame
+# against the date-sorted, label-position index in query.py, for the page's default (whole history,
+# every label) and a few narrower picks. Checks both return the same rows in the same order.
+# Run from anywhere: python benchmarks/bench_query.py [n_dates] [n_stocks]
+import sys
+
+import numpy as np
+import pandas as pd
+
+import common
+import datahandler as dh
+import query
+
+COLUMNS = ['date', 'home_code', 'sector', 'industry_adj', 'MCAP_LOCAL']
+
+
+def scan(df, start, end, sectors, industries):
+    # as the page filtered before, then handed every row to st.dataframe
+    return df[(df['date'] >= pd.Timestamp(start)) & (df['date'] <= pd.Timestamp(end))
+              & (df['sector'].isin(sectors) | df['industry_adj'].isin(industries))]
+
+
+def indexed(index, start, end, sectors, industries):
+    rows = query.select(index, start, end, {'sector': sectors, 'industry_adj': industries})
+    return len(rows), query.page(index, rows, 1, 1000)
+
+
+def main():
+    n_dates = int(sys.argv[1]) if len(sys.argv) > 1 else 240
+    n_stocks = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    df = dh.compact_constituents(dh.normalise_constituents(common.synthetic_constituents(n_dates, n_stocks)))[COLUMNS]
+    t_build, index = common.timeit(query.build_index, df, ['sector', 'industry_adj'], repeat=1)
+    print(f'{len(df):,} constituent rows, index built in {t_build * 1000:.0f}ms')
+
+    sectors = sorted(df['sector'].unique())
+    industries = sorted(df['industry_adj'].unique())
+    first, last = df['date'].min(), df['date'].max()
+    cases = {
+        'whole history, every label': (first, last, sectors, industries),
+        'whole history, 2 sectors': (first, last, sectors[:2], []),
+        'whole history, 1 industry': (first, last, [], industries[:1]),
+        '1 year, 3 sectors + 2 industries': ('2015-01-01', '2015-12-31', sectors[:3], industries[-2:]),
+        'empty pick': (first, last, [], []),
+    }
+    for name, args in cases.items():
+        t_scan, expected = common.timeit(scan, df, *args)
+        t_index, (total, head) = common.timeit(indexed, index, *args)
+        assert total == len(expected)
+        pd.testing.assert_frame_equal(head.reset_index(drop=True), expected.head(1000).reset_index(drop=True))
+        rows = query.select(index, args[0], args[1], {'sector': args[2], 'industry_adj': args[3]})
+        np.testing.assert_array_equal(index['frame'].iloc[rows].index, np.arange(len(df))[expected.index])
+        print(f'{name:<34} {total:>9,} rows  scan {t_scan * 1000:7.1f}ms  index + first page {t_index * 1000:6.1f}ms  '
+              f'speedup {t_scan / t_index:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Time backtest.cached_backtest (miss and hit) against run_backtest, check the float32 round trip,
+# and let several processes fill and read one store at the same time. Runs on the seeded synthetic
+# universe, 29 selection files.
+# Run from anywhere: python benchmarks/bench_result_cache.py
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import common
+import synthetic
+import backtest as bt
+import datahandler as dh
+
+
+def inputs(names):
+    selections = [dh.industry_group_selection(s) for s in names['selections']]
+    return selections, dh.get_regime(names['regimes'][0]), dh.get_return_panel('industry')
+
+
+def run_all(run, selections, periods, returns):
+    return [run(s, periods, returns) for s in selections]
+
+
+def worker(folder, names, store):
+    synthetic.use_folder(folder)
+    bt.RESULT_STORE = store
+    selections, periods, returns = inputs(names)
+    return np.stack([result[0]['favour_mean'].to_numpy() for result in run_all(bt.cached_backtest, selections, periods, returns)])
+
+
+def main():
+    folder = tempfile.mkdtemp() + '/'
+    try:
+        names = synthetic.load_data(folder)
+        selections, periods, returns = inputs(names)
+        bt.RESULT_STORE = folder + 'results/'
+        t_run, expected = common.timeit(run_all, bt.run_backtest, selections, periods, returns)
+        t_miss, _ = common.timeit(run_all, bt.cached_backtest, selections, periods, returns, repeat=1)
+        t_hit, cached = common.timeit(run_all, bt.cached_backtest, selections, periods, returns)
+        for old, new in zip(expected, cached):
+            for a, b in zip(old[:4], new[:4]):
+                assert a.index.equals(b.index) and a.columns.equals(b.columns)
+                assert a['OECD_CH'].equals(b['OECD_CH'])
+                np.testing.assert_allclose(b.iloc[:, 1:].to_numpy(), a.iloc[:, 1:].to_numpy(), rtol=1e-6, atol=1e-7)
+            pd.testing.assert_index_equal(old[4].index, new[4].index)
+        size = sum(e.stat().st_size for e in os.scandir(bt.RESULT_STORE))
+        n = len(selections)
+        print(f'{n} selections, per backtest: run_backtest {t_run / n * 1000:.1f}ms  cache miss {t_miss / n * 1000:.1f}ms  '
+              f'hit {t_hit / n * 1000:.1f}ms  store {size / 1024:.0f}kB')
+
+        # four processes racing on an empty store all get the same results
+        shutil.rmtree(bt.RESULT_STORE)
+        with ProcessPoolExecutor(4) as pool:
+            results = list(pool.map(worker, [folder] * 4, [names] * 4, [bt.RESULT_STORE] * 4))
+        for result in results[1:]:
+            np.testing.assert_array_equal(result, results[0])
+        assert not [e.name for e in os.scandir(bt.RESULT_STORE) if e.name.endswith('.tmp')]
+        print(f'4 processes sharing one store: identical results, {len(os.listdir(bt.RESULT_STORE))} entries')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
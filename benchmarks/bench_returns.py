@@ -0,0 +1,27 @@
+# Compare the single-pass group_return engine against the original groupby-apply aggregations.
+# Run from anywhere: python benchmarks/bench_returns.py [n_dates] [n_stocks]
+import sys
+
+import pandas as pd
+
+import common
+import legacy
+import datahandler as dh
+
+FUNCS = ['universe_return', 'universe_return_by_country', 'sector_return', 'industry_return']
+
+
+def main():
+    n_dates = int(sys.argv[1]) if len(sys.argv) > 1 else 240
+    n_stocks = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    df = dh.normalise_constituents(common.synthetic_constituents(n_dates, n_stocks))
+    print(f'{len(df):,} constituent rows')
+    for name in FUNCS:
+        t_old, old = common.timeit(getattr(legacy, name), df.copy())
+        t_new, new = common.timeit(getattr(dh, name), df.copy())
+        pd.testing.assert_frame_equal(new, old, check_dtype=False, check_exact=False, rtol=1e-10)
+        print(f'{name:<28} legacy {t_old:8.3f}s  new {t_new:8.3f}s  speedup {t_old / t_new:6.1f}x  match ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# The Monte Carlo significance test over every selection file: checks the observed means are
+# summary_table's, that a few shuffles give what relabelling the regime file and rerunning the
+# backtest gives, and that results do not depend on the worker count; then times 10,000 resamples.
+# Runs on the seeded synthetic universe, 29 selection files.
+# Run from anywhere: python benchmarks/bench_significance.py [resamples]
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import common
+import synthetic
+import backtest as bt
+import datahandler as dh
+import significance as sg
+
+
+def relabelled(periods: pd.DataFrame, labels: np.ndarray) -> pd.DataFrame:
+    # a regime file giving each month end the shuffled label
+    monthly = bt.monthly_periods(periods)
+    return monthly.assign(OECD_CH=labels)
+
+
+def summary(selections: dict, periods: pd.DataFrame, returns: pd.DataFrame, market: pd.Series) -> dict:
+    results = bt.run_backtests(selections, periods, returns)
+    return {name: bt.summary_table(r.set_index('date'), r.set_index('date'), market.copy())
+            for name, r in results.groupby('BT', sort=False)}
+
+
+def main():
+    resamples = int(sys.argv[1]) if len(sys.argv) > 1 else sg.RESAMPLES
+    folder = tempfile.mkdtemp() + '/'
+    try:
+        run(folder, resamples)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def run(folder: str, resamples: int):
+    names = synthetic.load_data(folder)
+    returns = dh.get_return_panel('industry')
+    periods = dh.get_regime(names['regimes'][0])
+    selections = {name: dh.industry_group_selection(name) for name in names['selections']}
+    market = bt.market_return(returns)
+
+    legs, codes, labels = sg.regime_legs(selections, periods, returns)
+    n = len(selections)
+    weights = (codes[:, None] == np.arange(len(labels))).T[:, :, None].astype(float)
+    rng = np.random.default_rng(0)
+    for block in ['episode', 'month']:
+        shuffled = sg.permuted_weights(codes, block, 3, rng)
+        for k, w in enumerate([weights] + [shuffled[:, :, [b]] for b in range(3)]):
+            means = sg.regime_means(legs, w)[:len(labels), :, 0]
+            month_labels = np.array(labels)[w[:, :, 0].argmax(axis=0)]
+            for b, (name, expected) in enumerate(summary(selections, relabelled(periods, month_labels), returns, market).items()):
+                got = pd.DataFrame({'favour': means[:, b], 'avoid': means[:, n + b]}, index=labels)
+                pd.testing.assert_frame_equal(got.loc[expected.index], expected[['favour', 'avoid']],
+                                              check_names=False, rtol=1e-10)
+        assert (shuffled.sum(axis=1) == weights.sum(axis=1)).all()
+    print('observed and shuffled means match summary_table on the relabelled regime')
+
+    one = sg.significance(selections, periods, returns, 2000, batch=500)
+    two = sg.significance(selections, periods, returns, 2000, batch=500, workers=2)
+    pd.testing.assert_frame_equal(one, two)
+    print('the same with 1 and 2 workers')
+
+    for block in ['episode', 'month']:
+        for workers in [1, 2]:
+            t, table = common.timeit(sg.significance, selections, periods, returns, resamples, block, 0.05, 0, workers,
+                                     repeat=1)
+            print(f'{n} selections x {resamples:,} {block} resamples, {workers} worker(s): {t:6.2f}s  '
+                  f'{(table["p_value"] < 0.05).sum()} of {len(table)} p-values below 0.05')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# Scaling of the regime x selection sweep over its process pool: every pair is backtested in process
+# once, then by run_sweep with 1/2/4/8 workers. Every worker count must give exactly the in-process
+# rows. Runs on the seeded synthetic universe; the workers are forked, so they inherit the data
+# folder synthetic.load_data points datahandler at.
+# Run from anywhere: python benchmarks/bench_sweep.py [n_regimes] [n_selections]
+import os
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+
+import common
+import synthetic
+import backtest as bt
+import datahandler as dh
+import sweep
+
+
+def in_process(regimes, selections, returns):
+    return pd.concat([sweep.run_config(r, s, returns=returns) for r in regimes for s in selections], ignore_index=True)
+
+
+def main():
+    n_regimes = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    n_selections = int(sys.argv[2]) if len(sys.argv) > 2 else 29
+    folder = tempfile.mkdtemp() + '/'
+    try:
+        run(folder, n_regimes, n_selections)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def run(folder: str, n_regimes: int, n_selections: int):
+    names = synthetic.load_data(folder, n_regimes=n_regimes, n_selections=n_selections)
+    regimes, selections = names['regimes'], names['selections']
+    returns = dh.get_return_panel('industry')
+    print(f'{len(regimes)} regimes x {len(selections)} selections, {os.cpu_count()} cpu(s)')
+
+    t_serial, expected = common.timeit(in_process, regimes, selections, returns, repeat=1)
+    print(f'in process    {t_serial:6.2f}s')
+    for workers in [1, 2, 4, 8]:
+        t, results = common.timeit(sweep.run_sweep, regimes, selections, bt.WINDOWS, workers, None, repeat=1)
+        pd.testing.assert_frame_equal(results, expected, check_exact=True)
+        print(f'{workers} worker(s)   {t:6.2f}s  speedup {t_serial / t:5.2f}x  exact match')
+
+
+if __name__ == '__main__':
+    main()
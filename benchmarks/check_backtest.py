@@ -0,0 +1,43 @@
+# Regression check: run_backtest against the original implementation for every
+# regime file x selection file in dashboard/data, on synthetic industry returns.
+# Run from anywhere: python benchmarks/check_backtest.py
+import time
+import warnings
+
+import pandas as pd
+
+import common
+import legacy
+import backtest as bt
+import datahandler as dh
+
+NAMES = ['result_incl', 'result_excl', 'result_incl_ex_stag', 'result_excl_ex_stag', 'market']
+
+
+def main():
+    df = dh.normalise_constituents(common.synthetic_constituents(240, 600))
+    returns = dh.industry_return(df)
+    t_old = t_new = 0.0
+    for regime_file in dh.REGIME_FILE_OPTION:
+        periods = dh.get_regime(regime_file)
+        for select in dh.INDUSTRY_GROUPS_OPTION:
+            selection = dh.industry_group_selection(select)
+            start = time.perf_counter()
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                old = legacy.run_backtest(selection, periods, returns)
+            t_old += time.perf_counter() - start
+            start = time.perf_counter()
+            new = bt.run_backtest(selection, periods, returns)
+            t_new += time.perf_counter() - start
+            for name, a, b in zip(NAMES, new, old):
+                if isinstance(a, pd.Series):
+                    pd.testing.assert_series_equal(a, b, check_names=False, rtol=1e-12)
+                else:
+                    pd.testing.assert_frame_equal(a, b, check_names=False, rtol=1e-12)
+    n = len(dh.REGIME_FILE_OPTION) * len(dh.INDUSTRY_GROUPS_OPTION)
+    print(f'{n} regime x selection backtests match; legacy {t_old:.2f}s new {t_new:.2f}s speedup {t_old / t_new:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Cold-start several processes on an empty cache at once, as Streamlit workers do after a deploy:
+# each must get the same version, the store must be built once and read back complete, and no
+# temporary build directories may be left behind.
+# Run from anywhere: python benchmarks/check_concurrent_ingest.py [processes]
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import common
+import datahandler as dh
+
+
+def use_cache(folder: str):
+    dh.CACHE_FOLDER = folder + 'cache/'
+    dh.CONSTITUENTS_STORE = dh.CACHE_FOLDER + 'constituents/'
+    dh.PANEL_STORE = dh.CACHE_FOLDER + 'panels/'
+
+
+def cold_start(source: str, folder: str):
+    use_cache(folder)
+    version = dh.ingest_constituents(source)
+    return version, len(pd.read_parquet(dh.materialise_return_panels(version) + 'industry.parquet'))
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    folder = tempfile.mkdtemp() + '/'
+    try:
+        source = folder + 'constituents.csv'
+        common.synthetic_constituents(120, 2000).to_csv(source, index=False)
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(cold_start, [source] * processes, [folder] * processes))
+        assert len(set(results)) == 1, results
+        use_cache(folder)
+        version = results[0][0]
+        assert dh.read_manifest()['hash'] == version
+        assert len(dh.load_constituents(version)) == 120 * 2000
+        assert os.listdir(dh.PANEL_STORE) == [version]
+        leftovers = [name for name in os.listdir(dh.CACHE_FOLDER) if name.endswith('.tmp')]
+        assert not leftovers, leftovers
+        print(f'{processes} processes cold-starting together: one store, one panel version, no leftovers')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
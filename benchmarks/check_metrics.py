@@ -0,0 +1,67 @@
+# Equivalence check of the NumPy metrics against quantstats, and bt_stats timing.
+# Run from anywhere: python benchmarks/check_metrics.py
+import warnings
+
+import numpy as np
+import pandas as pd
+import quantstats as qs
+
+import common
+import legacy
+import backtest as bt
+import datahandler as dh
+import metrics as mt
+
+QS = {
+    'cagr': lambda r: qs.stats.cagr(r, compounded=False),
+    'volatility': qs.stats.volatility,
+    'sharpe': qs.stats.sharpe,
+    'mdd': qs.stats.max_drawdown,
+    'sortino': qs.stats.sortino,
+    'hit_rate': qs.stats.win_rate,
+}
+WINDOWS = [('2005-11-01', None), ('2005-11-01', '2023-01-01'), ('2023-01-01', None)]
+
+
+def window(data, start, end):
+    data = data.loc[data.index >= start]
+    return data.loc[data.index < end] if end else data
+
+
+def check_random(n_series: int = 200):
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2005-01-31', periods=240, freq='ME')
+    returns = pd.DataFrame(rng.normal(0.005, 0.06, (240, n_series)), index=index)
+    returns[returns.abs() < 0.01] = 0.0
+    returns.iloc[rng.integers(0, 240, 30), rng.integers(0, n_series, 30)] = np.nan
+    returns.iloc[0, ::2] = -0.1
+    table = mt.stats_table(returns)
+    for metric, func in QS.items():
+        expected = np.array([func(returns[c]) for c in returns.columns], dtype=float)
+        np.testing.assert_allclose(table.loc[metric].to_numpy(), expected, rtol=1e-9, atol=1e-12, err_msg=metric)
+    print(f'{n_series} random series: {", ".join(QS)} match quantstats')
+
+
+def check_bt_stats():
+    df = dh.normalise_constituents(common.synthetic_constituents(240, 600))
+    returns = dh.industry_return(df)
+    periods = dh.get_regime(dh.REGIME_FILE_OPTION[0])
+    t_old = t_new = 0.0
+    for select in dh.INDUSTRY_GROUPS_OPTION:
+        result_incl, result_excl, _, _, market = bt.run_backtest(dh.industry_group_selection(select), periods, returns)
+        for start, end in WINDOWS:
+            args = (window(result_incl, start, end), window(result_excl, start, end), window(market, start, end))
+            t, new = common.timeit(bt.bt_stats, *args, repeat=1)
+            t_new += t
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                t, old = common.timeit(legacy.bt_stats, *args, repeat=1)
+            t_old += t
+            pd.testing.assert_frame_equal(new, old, check_dtype=False, rtol=1e-9)
+    n = len(dh.INDUSTRY_GROUPS_OPTION) * len(WINDOWS)
+    print(f'{n} bt_stats calls match; quantstats {t_old:.2f}s numpy {t_new:.2f}s speedup {t_old / t_new:.1f}x')
+
+
+if __name__ == '__main__':
+    check_random()
+    check_bt_stats()
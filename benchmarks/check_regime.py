@@ -0,0 +1,56 @@
+# Replay monthly econ releases through regime.update_all, appending to the regime files one month
+# at a time, and check every file against a full derive_regime over the final history.
+# Run from anywhere: python benchmarks/check_regime.py [months]
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+
+import common
+import datahandler as dh
+import regime as rg
+
+
+def release(source: str, folder: str, end: pd.Timestamp):
+    # the econ csvs as they stood when the month ending `end` was published
+    for file in glob.glob(source + '*' + dh.ECON_SUFFIX):
+        df = pd.read_csv(file)
+        df[pd.to_datetime(df['date']) <= end].to_csv(folder + os.path.basename(file), index=False)
+    dh.get_econ_panel.clear()
+
+
+def main():
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    source = dh.DATA_FOLDER
+    folder = tempfile.mkdtemp() + '/'
+    try:
+        dh.DATA_FOLDER = folder
+        dates = pd.to_datetime(pd.read_csv(glob.glob(source + '*' + dh.ECON_SUFFIX)[0])['date']).sort_values()
+        for end in dates.iloc[-months - 1:]:
+            release(source, folder, end)
+            rg.update_all()
+
+        econ = dh.get_econ_panel()
+        checked = 0
+        for region in dh.econ_regions():
+            for cpi in dh.ECON_CPI_OPTION:
+                for lookback in dh.ECON_LOOKBACK_OPTION:
+                    for freq in dh.ECON_FREQUENCY_OPTION:
+                        for zscore in (False, True):
+                            name = rg.regime_name(region, cpi, lookback, freq, zscore)
+                            got = pd.read_csv(folder + name + '.csv')
+                            expected = rg.derive_regime(econ.loc[region], cpi, lookback, freq, zscore).reset_index()
+                            expected = expected.rename(columns={'date': 'Period'})
+                            expected['Period'] = expected['Period'].dt.strftime('%d/%m/%Y')
+                            pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+                            checked += 1
+        print(f'{checked} regime files appended over {months} monthly releases match a full recompute')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
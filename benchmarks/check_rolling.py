@@ -0,0 +1,49 @@
+# Check metrics.rolling_stats against pandas rolling windows and full-sample stats, and time it
+# against recomputing the metrics window by window.
+# Run from anywhere: python benchmarks/check_rolling.py
+import numpy as np
+import pandas as pd
+
+import common
+import metrics as mt
+
+
+def per_window(returns: pd.DataFrame, window: int):
+    return [mt.stats_table(returns.iloc[t - window:t], ['volatility', 'sharpe', 'mdd']) for t in range(window, len(returns) + 1)]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2005-01-31', periods=240, freq='ME')
+    returns = pd.DataFrame(rng.normal(0.005, 0.06, (240, 300)), index=index)
+    factor = np.sqrt(mt.PERIODS)
+
+    for window in [12, 36]:
+        stats = mt.rolling_stats(returns, window)
+        rolling = returns.rolling(window)
+        np.testing.assert_allclose(stats['volatility'], rolling.std() * factor, rtol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(stats['sharpe'], rolling.mean() / rolling.std() * factor, rtol=1e-9, equal_nan=True)
+        # drawdown from the trailing window's peak, starting equity included
+        equity = np.vstack([np.ones((1, returns.shape[1])), (1 + returns).cumprod().to_numpy()])
+        expected = np.array([equity[t + 1] / equity[max(0, t + 1 - window):t + 2].max(axis=0) - 1 for t in range(len(returns))])
+        expected[:window - 1] = np.nan
+        np.testing.assert_allclose(stats['drawdown'], expected, rtol=1e-12, equal_nan=True)
+        # max drawdown of each window's own returns
+        windows = per_window(returns, window)
+        expected = np.vstack([np.full((window - 1, returns.shape[1]), np.nan)] + [w.loc['mdd'].to_numpy() for w in windows])
+        np.testing.assert_allclose(stats['mdd'], expected, rtol=1e-12, atol=1e-15, equal_nan=True)
+
+    expanding = mt.rolling_stats(returns)
+    full = mt.stats_table(returns, ['cagr', 'volatility', 'sharpe', 'mdd'])
+    for metric in full.index:
+        np.testing.assert_allclose(expanding[metric][-1], full.loc[metric], rtol=1e-9)
+    print(f'{returns.shape[1]} series: rolling 12/36M and expanding metrics match')
+
+    t_fast, _ = common.timeit(mt.rolling_stats, returns, 36)
+    t_slow, _ = common.timeit(per_window, returns, 36, repeat=1)
+    print(f'rolling 36M over {returns.shape[1]} series: per-window {t_slow:.2f}s rolling_stats {t_fast:.4f}s '
+          f'speedup {t_slow / t_fast:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Check the chunked constituents ingest against the in-memory path on a synthetic csv written in
+# shuffled row order (so every month is split across chunks): the return panels and the parquet
+# store must match. Also reports the peak memory of ingesting in one chunk against small chunks,
+# each in a fresh process.
+# Run from anywhere: python benchmarks/check_streaming.py [n_dates] [n_stocks]
+import os
+import resource
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import common
+import datahandler as dh
+
+
+def use_store(folder: str):
+    dh.CONSTITUENTS_STORE = folder + 'constituents/'
+    dh.PANEL_STORE = folder + 'panels/'
+
+
+def ingest(source: str, folder: str, chunksize: int):
+    use_store(folder)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    version = dh.ingest_constituents(source, force=True, chunksize=chunksize)
+    return version, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+
+
+def main():
+    n_dates = int(sys.argv[1]) if len(sys.argv) > 1 else 240
+    n_stocks = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    folder = tempfile.mkdtemp() + '/'
+    try:
+        source = folder + 'constituents.csv'
+        raw = common.synthetic_constituents(n_dates, n_stocks).sample(frac=1, random_state=0)
+        raw.to_csv(source, index=False)
+        print(f'{len(raw):,} rows, {os.path.getsize(source) / 2**20:.0f}MB csv')
+        del raw
+
+        runs = {}
+        for name, chunksize in [('one chunk', n_dates * n_stocks), ('100k-row chunks', 100_000), ('25k-row chunks', 25_000)]:
+            with ProcessPoolExecutor(1) as pool:
+                runs[name] = (folder + name.split()[0] + '/', *pool.submit(ingest, source, folder + name.split()[0] + '/', chunksize).result())
+            print(f'{name:<16} peak rss +{runs[name][2]:7.1f}MB')
+
+        expected = dh.compact_constituents(dh.normalise_constituents(pd.read_csv(source)))
+        panels = dh.build_return_panels(expected)
+        for name, (store, version, _) in runs.items():
+            use_store(store)
+            for level, panel in panels.items():
+                got = pd.read_parquet(dh.PANEL_STORE + version + '/' + level + '.parquet')
+                pd.testing.assert_frame_equal(got, panel, rtol=1e-12)
+            # each run unifies the chunks' categories in its own order, so compare on the labels
+            got = pd.read_parquet(dh.CONSTITUENTS_STORE).drop(columns='year')
+            for df in [got, expected]:
+                df[dh.LABEL_COLUMNS] = df[dh.LABEL_COLUMNS].astype(str)
+            pd.testing.assert_frame_equal(got.sort_values(['date', 'home_code'], ignore_index=True),
+                                          expected.sort_values(['date', 'home_code'], ignore_index=True))
+        print('every chunk size gives the in-memory panels (rtol 1e-12) and store')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Check evaluate_windows against per-window summary_table / bt_stats calls and time both.
+# Run from anywhere: python benchmarks/check_windows.py
+import time
+
+import pandas as pd
+
+import common
+import backtest as bt
+import datahandler as dh
+
+WINDOWS = dict(bt.WINDOWS, **{
+    'Up to 2023': (None, '2023-01-01'),
+    'Empty': ('2040-01-01', None),
+    **{f'{y}': (f'{y}-01-01', f'{y + 3}-01-01') for y in range(2006, 2022)},
+})
+
+
+def window(data, start, end):
+    if start:
+        data = data.loc[data.index >= start]
+    if end:
+        data = data.loc[data.index < end]
+    return data
+
+
+def main():
+    df = dh.normalise_constituents(common.synthetic_constituents(240, 600))
+    returns = dh.industry_return(df)
+    t_old = t_new = 0.0
+    for regime_file in dh.REGIME_FILE_OPTION:
+        periods = dh.get_regime(regime_file)
+        for select in dh.INDUSTRY_GROUPS_OPTION:
+            result_incl, result_excl, _, _, market = bt.run_backtest(dh.industry_group_selection(select), periods, returns)
+            start = time.perf_counter()
+            summaries, stats = bt.evaluate_windows(result_incl, result_excl, market, WINDOWS)
+            t_new += time.perf_counter() - start
+            for name, (s, e) in WINDOWS.items():
+                start = time.perf_counter()
+                summary = bt.summary_table(window(result_incl, s, e), window(result_excl, s, e), window(market, s, e).copy())
+                stat = bt.bt_stats(window(result_incl, s, e), window(result_excl, s, e), window(market, s, e))
+                t_old += time.perf_counter() - start
+                if len(summary):
+                    pd.testing.assert_frame_equal(summaries[name], summary, check_names=False, rtol=1e-9)
+                else:
+                    assert summaries[name].empty
+                pd.testing.assert_frame_equal(stats[name], stat, rtol=1e-9, atol=1e-12)
+    n = len(dh.REGIME_FILE_OPTION) * len(dh.INDUSTRY_GROUPS_OPTION)
+    print(f'{n} backtests x {len(WINDOWS)} windows match; per-window calls {t_old:.2f}s '
+          f'evaluate_windows {t_new:.2f}s speedup {t_old / t_new:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
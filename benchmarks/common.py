@@ -0,0 +1,20 @@
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'dashboard'))
+os.chdir(ROOT)
+
+# the generator lives in synthetic.py; kept here under its old name for the existing scripts
+from synthetic import constituents as synthetic_constituents
+
+
+def timeit(func, *args, repeat: int = 3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
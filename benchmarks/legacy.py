@@ -0,0 +1,280 @@
+# Reference copies of the original implementations, kept for equivalence checks and benchmarks.
+import numpy as np
+import pandas as pd
+from pandas.tseries.offsets import MonthEnd
+import quantstats as qs
+
+
+def universe_return(df: pd.DataFrame) -> pd.DataFrame:
+    returns = pd.DataFrame()
+    returns['cap_weighted_ret'] = df.groupby(['date']).apply(lambda x: np.average(x['FWD_RET_1M'], weights=x['MCAP_USD']))
+    returns['eq_weighted_ret'] = df.groupby(['date']).apply(lambda x: np.average(x['FWD_RET_1M']))
+    returns['count'] = df.groupby(['date'])['MCAP_USD'].count()
+    return returns
+
+
+def universe_return_by_country(df: pd.DataFrame) -> pd.DataFrame:
+    returns = pd.DataFrame()
+    returns['cap_weighted_ret'] = df.groupby(['date', 'country']).apply(lambda x: np.average(x['FWD_RET_1M'], weights=x['MCAP_USD']))
+    returns['eq_weighted_ret'] = df.groupby(['date', 'country']).apply(lambda x: np.average(x['FWD_RET_1M']))
+    returns['count'] = df.groupby(['date', 'country'])['country'].count()
+    return returns
+
+
+def sector_return(df: pd.DataFrame) -> pd.DataFrame:
+    sector_returns = pd.DataFrame()
+    sector_returns['cap_weighted_ret'] = df.groupby(['date', 'sector']).apply(lambda x: np.average(x['FWD_RET_1M'], weights=x['MCAP_USD']))
+    sector_returns['eq_weighted_ret'] = df.groupby(['date', 'sector']).apply(lambda x: np.average(x['FWD_RET_1M']))
+    sector_returns['count'] = df.groupby(['date', 'sector'])['sector'].count()
+    return sector_returns
+
+
+def industry_return(df: pd.DataFrame) -> pd.DataFrame:
+    industry_returns = pd.DataFrame()
+    industry_returns['cap_weighted_ret'] = df.groupby(['date', 'industry_adj']).apply(lambda x: np.average(x['FWD_RET_1M'], weights=x['MCAP_USD']))
+    industry_returns['eq_weighted_ret'] = df.groupby(['date', 'industry_adj']).apply(lambda x: np.average(x['FWD_RET_1M']))
+    industry_returns['count'] = df.groupby(['date', 'industry_adj'])['industry_adj'].count()
+    return industry_returns
+
+
+def run_backtest(selection: pd.DataFrame, periods: pd.DataFrame, returns: pd.DataFrame) -> pd.DataFrame:
+    indgp = returns.copy()
+    indgp.reset_index(inplace=True)
+    indgp['date'] = pd.to_datetime(indgp['date']) + MonthEnd(0)
+    indgp['industry_adj'] = indgp['industry_adj'].str.strip()
+    indgp.set_index(['date','industry_adj'], inplace=True)
+    indgp = indgp[['cap_weighted_ret']].unstack('industry_adj')
+    indgp = indgp.droplevel(0, axis=1)
+
+    # market return
+    market = indgp.mean(axis=1)
+
+    # Merge with cycle data
+    all_ds = periods.merge(selection, how='left', left_on='OECD_CH', right_index=True)
+    all_ds = all_ds.reset_index()
+    monthly_index = pd.date_range(start=all_ds['date'].min(), end=all_ds['date'].max(), freq='ME')
+    # Reindex with the monthly date range and forward-fill values
+    all_ds.set_index('date', inplace=True)
+    all_ds_monthly = all_ds.reindex(monthly_index, method='ffill')
+    
+    # calc return series
+    combine = all_ds_monthly.join(indgp, rsuffix='_r')
+    columns = indgp.columns
+    result_incl = combine[['OECD_CH']]
+    result_incl_ex_stag = result_incl.copy()
+    result_excl = combine[['OECD_CH']]
+    result_excl_ex_stag = result_excl.copy()
+
+    for c in columns:
+        result_incl[c] = np.where(((combine[c.strip()] == 1)), (combine[c.strip()] * combine[c.strip() + '_r']), np.nan)
+        result_excl[c] = np.where(((combine[c.strip()] == -1)), (combine[c.strip()] * combine[c.strip() + '_r']), np.nan)
+        result_incl_ex_stag[c] = np.where(((combine[c.strip()] == 1) & (combine['OECD_CH'] != 'Stagflation')), (combine[c.strip()] * combine[c.strip() + '_r']), np.nan)
+        result_excl_ex_stag[c] = np.where(((combine[c.strip()] == -1) & (combine['OECD_CH'] != 'Stagflation')), (combine[c.strip()] * combine[c.strip() + '_r']), np.nan)
+
+    result_incl.reset_index().set_index(['index','OECD_CH'], inplace=True)
+    result_excl.reset_index().set_index(['index','OECD_CH'], inplace=True)
+    result_incl_ex_stag.reset_index().set_index(['index','OECD_CH'], inplace=True)
+    result_excl_ex_stag.reset_index().set_index(['index','OECD_CH'], inplace=True)
+
+    result_incl['favour_mean'] = result_incl.iloc[:, 1:].mean(axis=1)
+    result_excl['avoid_mean'] = result_excl.iloc[:, 1:].mean(axis=1)
+    result_incl_ex_stag['favour_mean'] = result_incl_ex_stag.iloc[:, 1:].mean(axis=1)
+    result_excl_ex_stag['avoid_mean'] = result_excl_ex_stag.iloc[:, 1:].mean(axis=1)
+
+    result_incl['favour_mean'] = result_incl['favour_mean'].fillna(0)
+    result_excl['avoid_mean'] = result_excl['avoid_mean'].fillna(0)
+    result_incl_ex_stag['favour_mean'] = result_incl_ex_stag['favour_mean'].fillna(0)
+    result_excl_ex_stag['avoid_mean'] = result_excl_ex_stag['avoid_mean'].fillna(0)
+
+    return result_incl, result_excl, result_incl_ex_stag, result_excl_ex_stag, market
+
+
+def bt_stats(result_incl: pd.DataFrame, result_excl: pd.DataFrame, market: pd.DataFrame) -> pd.DataFrame:
+    stats = {'cagr': qs.stats.cagr(result_incl['favour_mean'], compounded=False),
+             'volatility': qs.stats.volatility(result_incl['favour_mean']),
+             'sharpe': qs.stats.sharpe(result_incl['favour_mean']),
+             'mdd': qs.stats.max_drawdown(result_incl['favour_mean'])
+            }
+    stats_a = {'cagr': qs.stats.cagr(result_excl['avoid_mean'], compounded=False),
+             'volatility': qs.stats.volatility(result_excl['avoid_mean']),
+             'sharpe': qs.stats.sharpe(result_excl['avoid_mean']),
+             'mdd': qs.stats.max_drawdown(result_excl['avoid_mean'])
+            }
+    # Add in market
+    stats_m = {'cagr': qs.stats.cagr(market, compounded=False),
+                'volatility': qs.stats.volatility(market),
+                'sharpe': qs.stats.sharpe(market),
+                'mdd': qs.stats.max_drawdown(market)
+                }
+    return pd.DataFrame([stats_m, stats, stats_a], index=['Market', 'Favour', 'Avoid']).transpose()
+
+
+COLOUR_MAP = {'Stagflation': '#E6A8D7', 'Overheat': '#B3CDE0', 'Reccesion': '#B7D7B5', 'Recovery': '#F4C7A1'}
+
+
+def plot_multi(to_plot):
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    fig = px.line(to_plot, x='date' , y='value', color='label')
+
+    # Apply background color dynamically based on OECD_CH values
+    legend_patches = []
+    seen_colors = set()  # To track which colors have already been added to the legend
+
+    # Apply background color dynamically based on OECD_CH values
+    previous_oecd_value = None
+    start_date = None
+
+    cycle = to_plot[to_plot['label'] == 'market']
+    cycle.set_index('date', inplace=True)
+    for date in cycle.index:
+        oecd_value = cycle.loc[date, 'OECD_CH']  # Get the OECD_CH value at each date
+        if oecd_value != previous_oecd_value:
+            if start_date is not None:
+                # Add a 'rect' shape for background coloring in Plotly
+                bg_color = COLOUR_MAP.get(previous_oecd_value, 'white')
+                fig.add_shape(type="rect", 
+                            x0=start_date, x1=date, 
+                            y0=0, y1=1, 
+                            xref="x", yref="paper", 
+                            fillcolor=bg_color, opacity=0.3,
+                            line=dict(color='rgba(0,0,0,0)', width=0))
+
+                # Create a dummy trace for the background color to appear in the legend, if not already added
+                if bg_color not in seen_colors:
+                    legend_patches.append(go.Scatter(
+                        x=[None], y=[None], mode='markers',
+                        marker=dict(color=bg_color, size=10),
+                        name=f"OECD_CH {previous_oecd_value}"  # Add to legend
+                    ))
+                    seen_colors.add(bg_color)  # Mark the color as seen
+
+            start_date = date  # Update the start date for the new period
+        previous_oecd_value = oecd_value
+
+    # Ensure the last region gets colored for background color
+    if previous_oecd_value is not None:
+        bg_color = COLOUR_MAP.get(previous_oecd_value, 'white')
+        fig.add_shape(type="rect", 
+                    x0=start_date, x1=cycle.index[-1], 
+                    y0=0, y1=1, 
+                    xref="x", yref="paper", 
+                    fillcolor=bg_color, opacity=0.3,
+                            line=dict(color='rgba(0,0,0,0)', width=0))
+
+        # Create a dummy trace for the last background color to appear in the legend, if not already added
+        if bg_color not in seen_colors:
+            legend_patches.append(go.Scatter(
+                x=[None], y=[None], mode='markers',
+                marker=dict(color=bg_color, size=10),
+                name=f"{previous_oecd_value}"  # Add to legend
+            ))
+            seen_colors.add(bg_color)  # Mark the color as seen
+
+    # Add the dummy traces for background color to the figure to show in the legend
+    fig.add_traces(legend_patches)
+
+    # Add title and labels
+    fig.update_layout(
+        xaxis_title="Date",
+        yaxis_title="Cum Sum Return",
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        )
+    )
+
+    return fig
+
+
+def plot(result_incl, result_excl, market):
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+
+    # Add the first line plot (Favour, Avoid, and Market) for the first subplot
+    fig.add_trace(go.Scatter(x=result_incl.loc[result_incl.index >= '2005-11-01'].index, 
+                            y=result_incl.loc[result_incl.index >= '2005-11-01']['favour_mean'].cumsum(),
+                            mode='lines', name='Favour'))
+
+    fig.add_trace(go.Scatter(x=result_excl.loc[result_excl.index >= '2005-11-01'].index, 
+                            y=result_excl.loc[result_excl.index >= '2005-11-01']['avoid_mean'].cumsum(),
+                            mode='lines', name='Avoid'))
+
+    fig.add_trace(go.Scatter(x=market.loc[market.index >= '2005-11-01'].index, 
+                            y=market.loc[market.index >= '2005-11-01'].cumsum(),
+                            mode='lines', name='Market'))  
+    
+    # Apply background color dynamically based on OECD_CH values
+    legend_patches = []
+    seen_colors = set()  # To track which colors have already been added to the legend
+
+    # Apply background color dynamically based on OECD_CH values
+    previous_oecd_value = None
+    start_date = None
+
+    for date in result_incl.index:
+        oecd_value = result_incl.loc[date, 'OECD_CH']  # Get the OECD_CH value at each date
+        if oecd_value != previous_oecd_value:
+            if start_date is not None:
+                # Add a 'rect' shape for background coloring in Plotly
+                bg_color = COLOUR_MAP.get(previous_oecd_value, 'white')
+                fig.add_shape(type="rect", 
+                            x0=start_date, x1=date, 
+                            y0=0, y1=1, 
+                            xref="x", yref="paper", 
+                            fillcolor=bg_color, opacity=0.3,
+                            line=dict(color='rgba(0,0,0,0)', width=0))
+
+                # Create a dummy trace for the background color to appear in the legend, if not already added
+                if bg_color not in seen_colors:
+                    legend_patches.append(go.Scatter(
+                        x=[None], y=[None], mode='markers',
+                        marker=dict(color=bg_color, size=10),
+                        name=f"OECD_CH {previous_oecd_value}"  # Add to legend
+                    ))
+                    seen_colors.add(bg_color)  # Mark the color as seen
+
+            start_date = date  # Update the start date for the new period
+        previous_oecd_value = oecd_value
+
+    # Ensure the last region gets colored for background color
+    if previous_oecd_value is not None:
+        bg_color = COLOUR_MAP.get(previous_oecd_value, 'white')
+        fig.add_shape(type="rect", 
+                    x0=start_date, x1=result_incl.index[-1], 
+                    y0=0, y1=1, 
+                    xref="x", yref="paper", 
+                    fillcolor=bg_color, opacity=0.3,
+                            line=dict(color='rgba(0,0,0,0)', width=0))
+
+        # Create a dummy trace for the last background color to appear in the legend, if not already added
+        if bg_color not in seen_colors:
+            legend_patches.append(go.Scatter(
+                x=[None], y=[None], mode='markers',
+                marker=dict(color=bg_color, size=10),
+                name=f"{previous_oecd_value}"  # Add to legend
+            ))
+            seen_colors.add(bg_color)  # Mark the color as seen
+
+    # Add the dummy traces for background color to the figure to show in the legend
+    fig.add_traces(legend_patches)
+
+    # Add title and labels
+    fig.update_layout(
+        xaxis_title="Date",
+        yaxis_title="Cum Sum Return",
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        )
+    )
+
+    return fig
@@ -0,0 +1,183 @@
+# Timed and memory-tracked benchmarks of the main dashboard computations on a seeded synthetic
+# universe, written as JSON per commit so runs can be compared across commits.
+#   python benchmarks/suite.py [--scale small|medium|large] [--repeat N]   run, save results/<commit>-<scale>.json
+#   python benchmarks/suite.py --compare BASE.json [NEW.json]             compare (runs now if NEW is omitted;
+#                                                                        exits 1 on a regression)
+# Timings are the best of --repeat runs after a warm-up; peak_mb is the tracemalloc peak of one more run.
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import common
+import synthetic
+import backtest as bt
+import datahandler as dh
+import plots as pt
+from bench_plots import compare_frame
+
+SCALES = {
+    'small': {'n_dates': 120, 'n_stocks': 1000},
+    'medium': {'n_dates': 240, 'n_stocks': 5000},
+    'large': {'n_dates': 240, 'n_stocks': 20000},
+}
+RESULTS_FOLDER = os.path.join(common.ROOT, 'benchmarks', 'results')
+
+
+def git(*args) -> str:
+    return subprocess.run(['git', *args], cwd=common.ROOT, capture_output=True, text=True).stdout.strip()
+
+
+def prepare(folder: str, scale: dict, seed: int) -> dict:
+    # write the synthetic files, then load them through the dashboard's own readers
+    names = synthetic.write_data(folder, **scale, seed=seed)
+    dh.DATA_FOLDER = folder
+    df = pd.concat(dh.read_constituents(folder + dh.CONSTITUENTS_FILE), ignore_index=True)
+    returns = dh.industry_return(df)
+    periods = dh.get_regime(names['regimes'][0])
+    selections = {name: dh.industry_group_selection(name) for name in names['selections']}
+    incl, excl, _, _, market = bt.run_backtest(selections[names['selections'][0]], periods, returns)
+    results = bt.run_backtests(selections, periods, returns)
+
+    # the frames compare_backtest.py hands to plot_multi and plot_summary
+    summary = pd.concat([bt.summary_table(r.set_index('date'), r.set_index('date'), market.copy()).assign(BT=name)
+                         for name, r in results.groupby('BT', sort=False)])
+    summary = summary.reset_index().set_index(['BT', 'OECD_CH']).unstack('BT')
+    summary = (summary.iloc[:, len(selections) - 1:] * 100).transpose()
+    return {'df': df, 'returns': returns, 'periods': periods, 'selections': selections,
+            'selection': selections[names['selections'][0]], 'incl': incl, 'excl': excl, 'market': market,
+            'to_plot': compare_frame(results, market), 'summary': summary}
+
+
+def monthly_returns(returns: pd.Series):
+    import matplotlib.pyplot as plt
+    # quantstats asks for Arial, which headless machines rarely have
+    logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+    plt.close(pt.monthly_returns(returns))
+
+
+def cases(inputs: dict) -> dict:
+    i = inputs
+    return {
+        'industry_return': (dh.industry_return, i['df']),
+        'run_backtest': (bt.run_backtest, i['selection'], i['periods'], i['returns']),
+        'run_backtests': (bt.run_backtests, i['selections'], i['periods'], i['returns']),
+        'summary_table': (bt.summary_table, i['incl'], i['excl'], i['market']),
+        'bt_stats': (bt.bt_stats, i['incl'], i['excl'], i['market']),
+        'plot': (pt.plot, i['incl'], i['excl'], i['market']),
+        'plot_multi': (pt.plot_multi, i['to_plot']),
+        'plot_summary': (pt.plot_summary, i['summary'], 'favour'),
+        'monthly_returns': (monthly_returns, i['incl']['favour_mean']),
+    }
+
+
+def measure(func, *args, repeat: int = 3) -> dict:
+    func(*args)  # warm-up: lazy imports, caches
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'best_s': min(times), 'median_s': statistics.median(times), 'peak_mb': peak / 2**20, 'runs': repeat}
+
+
+def run(scale: str, repeat: int, seed: int, only: list = None) -> dict:
+    folder = tempfile.mkdtemp() + '/'
+    try:
+        inputs = prepare(folder, SCALES[scale], seed)
+        results = {}
+        for name, (func, *args) in cases(inputs).items():
+            if only and name not in only:
+                continue
+            results[name] = measure(func, *args, repeat=repeat)
+            r = results[name]
+            print(f'{name:<16} best {r["best_s"] * 1000:9.2f}ms  median {r["median_s"] * 1000:9.2f}ms  '
+                  f'peak {r["peak_mb"]:8.2f}MB')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'scale': scale, 'params': SCALES[scale], 'seed': seed, 'rows': len(inputs['df']),
+        'machine': {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+                    'cpus': os.cpu_count(), 'platform': platform.platform()},
+        'results': results,
+    }
+
+
+def save(report: dict) -> str:
+    os.makedirs(RESULTS_FOLDER, exist_ok=True)
+    name = f'{report["commit"]}{"-dirty" if report["dirty"] else ""}-{report["scale"]}.json'
+    path = os.path.join(RESULTS_FOLDER, name)
+    if os.path.exists(path):
+        # a partial (--only) run updates the commit's results rather than replacing them
+        with open(path) as f:
+            report = dict(report, results=dict(json.load(f)['results'], **report['results']))
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1)
+    return path
+
+
+def compare(base: dict, new: dict, threshold: float) -> list:
+    # benchmarks whose best time grew by more than threshold (a fraction)
+    if base['scale'] != new['scale'] or base['seed'] != new['seed']:
+        print(f'warning: comparing {base["scale"]}/seed {base["seed"]} against {new["scale"]}/seed {new["seed"]}')
+    print(f'{"":<16} {base["commit"]:>12} {new["commit"]:>12}   time    memory')
+    regressions = []
+    for name, old in base['results'].items():
+        if name not in new['results']:
+            continue
+        cur = new['results'][name]
+        ratio = cur['best_s'] / old['best_s']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:<16} {old["best_s"] * 1000:10.2f}ms {cur["best_s"] * 1000:10.2f}ms  {ratio:5.2f}x  '
+              f'{cur["peak_mb"] / max(old["peak_mb"], 1e-9):5.2f}x{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run or compare the dashboard benchmark suite.')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help='run only these benchmarks')
+    parser.add_argument('--compare', nargs='+', metavar='JSON', help='BASE.json [NEW.json]')
+    parser.add_argument('--threshold', type=float, default=0.10, help='slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        if len(args.compare) > 1:
+            with open(args.compare[1]) as f:
+                new = json.load(f)
+        else:
+            new = run(base['scale'], args.repeat, base['seed'], args.only)
+        sys.exit(1 if compare(base, new, args.threshold) else 0)
+
+    report = run(args.scale, args.repeat, args.seed, args.only)
+    print(f'{report["rows"]:,} rows at scale {args.scale}; saved {save(report)}')
+
+
+if __name__ == '__main__':
+    main()
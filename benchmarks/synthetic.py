@@ -0,0 +1,105 @@
+# Seeded synthetic inputs at any scale, in the formats the dashboard reads: the constituents csv
+# (the get_constituents schema), regime files (Period, OECD_CH) and selection files (indgp x regime).
+import os
+
+import numpy as np
+import pandas as pd
+
+SECTORS = {
+    'Communication Services': ['Media & Entertainment', 'Telecommunication Services'],
+    'Consumer Discretionary': ['Automobiles & Components', 'Consumer Services', 'Consumer Durables & Apparel',
+                               'Consumer Discretionary Distribution & Retail'],
+    'Consumer Staples': ['Consumer Staples Distribution & Retail', 'Food Beverage & Tobacco', 'Household & Personal Products'],
+    'Energy': ['Energy'],
+    'Financials': ['Banks', 'Financial Services', 'Insurance'],
+    'Health Care': ['Health Care Equipment & Services', 'Pharmaceuticals, Biotechnology & Life Sciences'],
+    'Industrials': ['Capital Goods', 'Commercial & Professional Services', 'Transportation'],
+    'Information Technology': ['Software & Services', 'Semiconductors & Semiconductor Equipment', 'Technology Hardware & Equipment'],
+    'Materials': ['Materials'],
+    'Real Estate': ['Real Estate Management & Development'],
+    'Utilities': ['Utilities'],
+}
+# column order of the checked-in selection files
+REGIMES = ['Recovery', 'Stagflation', 'Reccesion', 'Overheat']
+START = '2005-01-31'
+
+
+def constituents(n_dates: int = 240, n_stocks: int = 2000, seed: int = 0) -> pd.DataFrame:
+    # n_stocks tickers on each of n_dates month ends, each with a fixed sector and industry
+    rng = np.random.default_rng(seed)
+    industries = [(s, i) for s, inds in SECTORS.items() for i in inds]
+    stock_ind = rng.integers(0, len(industries), n_stocks)
+    suffix = rng.choice(['CN', 'HK', 'US'], n_stocks, p=[0.6, 0.35, 0.05])
+    codes = np.array([f'{k:06d}-{c}' for k, c in enumerate(suffix)])
+    dates = pd.date_range(START, periods=n_dates, freq='ME').strftime('%Y-%m-%d')
+    df = pd.DataFrame({
+        'date': np.repeat(dates, n_stocks),
+        'home_code': np.tile(codes, n_dates),
+        'sector': np.tile(np.array([industries[k][0] for k in stock_ind]), n_dates),
+        'industry': np.tile(np.array([industries[k][1] for k in stock_ind]), n_dates),
+        'MCAP_USD': rng.lognormal(20, 1.5, n_dates * n_stocks),
+        'FWD_RET_1M': rng.normal(0.005, 0.08, n_dates * n_stocks),
+    })
+    df['MCAP_LOCAL'] = df['MCAP_USD'] * 7.0
+    return df
+
+
+def regime(n_dates: int = 240, mean_run: float = 6, seed: int = 0) -> pd.DataFrame:
+    # month-end OECD_CH labels in runs of geometric length (mean mean_run months), each run a
+    # different regime from the one before, dated like the checked-in files
+    rng = np.random.default_rng(seed)
+    runs = rng.geometric(1 / mean_run, n_dates)
+    steps = rng.integers(1, len(REGIMES), len(runs))
+    labels = np.repeat(np.cumsum(steps) % len(REGIMES), runs)[:n_dates]
+    dates = pd.date_range(START, periods=n_dates, freq='ME')
+    return pd.DataFrame({'Period': dates.strftime('%d/%m/%Y'), 'OECD_CH': np.array(REGIMES)[labels]})
+
+
+def industries() -> list:
+    # the industry_adj labels the dashboard derives from the generated industries, stripped as the
+    # backtest matches them against selection files
+    import datahandler as dh
+    raw = pd.DataFrame({'home_code': '000000-CN', 'industry': [i for inds in SECTORS.values() for i in inds]})
+    return sorted(dh.normalise_constituents(raw)['industry_adj'].str.strip().unique())
+
+
+def selection(density: float = 0.3, seed: int = 0) -> pd.DataFrame:
+    # favour (1) / avoid (-1) / blank per industry and regime
+    rng = np.random.default_rng(seed)
+    names = industries()
+    picks = rng.choice([1.0, -1.0], (len(names), len(REGIMES)))
+    picks[rng.random(picks.shape) >= density] = np.nan
+    return pd.DataFrame(picks, index=pd.Index(names, name='indgp'), columns=REGIMES).reset_index()
+
+
+def write_data(folder: str, n_dates: int = 240, n_stocks: int = 2000, n_regimes: int = 3, n_selections: int = 29,
+               seed: int = 0) -> dict:
+    # a DATA_FOLDER's worth of inputs: the constituents csv, regime-<k>.csv and selection-<k>.csv.
+    # Returns the regime and selection names, as passed to get_regime and industry_group_selection
+    import datahandler as dh
+    os.makedirs(folder, exist_ok=True)
+    constituents(n_dates, n_stocks, seed).to_csv(os.path.join(folder, dh.CONSTITUENTS_FILE), index=False)
+    names = {'regimes': [f'regime-{k}' for k in range(n_regimes)],
+             'selections': [f'selection-{k}' for k in range(n_selections)]}
+    for k, name in enumerate(names['regimes']):
+        regime(n_dates, seed=seed + k).to_csv(os.path.join(folder, name + '.csv'), index=False)
+    for k, name in enumerate(names['selections']):
+        selection(seed=seed + k).to_csv(os.path.join(folder, name + '.csv'), index=False)
+    return names
+
+
+def use_folder(folder: str):
+    # point datahandler's data folder, and the stores it builds, at folder
+    import datahandler as dh
+    dh.DATA_FOLDER = folder
+    dh.CACHE_FOLDER = folder + 'cache/'
+    dh.CONSTITUENTS_STORE = dh.CACHE_FOLDER + 'constituents/'
+    dh.PANEL_STORE = dh.CACHE_FOLDER + 'panels/'
+
+
+def load_data(folder: str, n_dates: int = 240, n_stocks: int = 2000, seed: int = 0, **kwargs) -> dict:
+    # write_data into folder and point datahandler at it, so get_return_panel, get_regime and
+    # industry_group_selection serve the synthetic files; returns write_data's names
+    names = write_data(folder, n_dates, n_stocks, seed=seed, **kwargs)
+    use_folder(folder)
+    return names
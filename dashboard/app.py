@@ -1,5 +1,3 @@
 import streamlit as st
-import numpy as np
-import pandas as pd
 
 st.title('AIG dashboard')
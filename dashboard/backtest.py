@@ -1,59 +1,196 @@
+import hashlib
+import io
+import os
+import zipfile
 import pandas as pd
 import numpy as np
 from pandas.tseries.offsets import MonthEnd
-import quantstats as qs
+import metrics as mt
+import instrument as ins
+import paths
 
-def run_backtest(selection: pd.DataFrame, periods: pd.DataFrame, returns: pd.DataFrame) -> pd.DataFrame:
-    indgp = returns.copy()
-    indgp.reset_index(inplace=True)
+STAGFLATION = 'Stagflation'
+# name -> (start inclusive, end exclusive); either bound may be None
+WINDOWS = {
+    'ALL': ('2005-11-01', None),
+    'Prior 2023': ('2005-11-01', '2023-01-01'),
+    '2023 onwards': ('2023-01-01', None),
+}
+# run_backtest results by content hash, next to datahandler's cache
+RESULT_STORE = paths.CACHE_FOLDER + 'results/'
+RESULT_LIMIT = 128 << 20
+
+def industry_matrix(returns: pd.DataFrame) -> pd.DataFrame:
+    # date x industry matrix of cap-weighted returns, dates moved to month end
+    indgp = returns[['cap_weighted_ret']].reset_index()
     indgp['date'] = pd.to_datetime(indgp['date']) + MonthEnd(0)
-    indgp['industry_adj'] = indgp['industry_adj'].str.strip()
-    indgp.set_index(['date','industry_adj'], inplace=True)
-    indgp = indgp[['cap_weighted_ret']].unstack('industry_adj')
-    indgp = indgp.droplevel(0, axis=1)
+    indgp['industry_adj'] = indgp['industry_adj'].astype(str).str.strip()
+    indgp = indgp.set_index(['date', 'industry_adj'])['cap_weighted_ret'].unstack('industry_adj')
+    indgp.columns = list(indgp.columns)
+    return indgp
+
+def monthly_periods(periods: pd.DataFrame) -> pd.DataFrame:
+    # regime per month end, forward-filled between regime dates
+    monthly_index = pd.date_range(start=periods.index.min(), end=periods.index.max(), freq='ME')
+    return periods[['OECD_CH']].reindex(monthly_index, method='ffill')
+
+def selection_matrix(selection: pd.DataFrame, regime: np.ndarray, columns: list) -> np.ndarray:
+    # expand the regime x industry selection to a month x industry matrix
+    sel = selection[columns].to_numpy(dtype=float)
+    pos = selection.index.get_indexer(regime)
+    expanded = np.full((len(regime), len(columns)), np.nan)
+    expanded[pos >= 0] = sel[pos[pos >= 0]]
+    return expanded
+
+def apply_selection(sel: np.ndarray, ret: np.ndarray, regime: np.ndarray):
+    # favour/avoid legs (and ex-Stagflation variants) as signed returns, NaN where not held
+    signed = sel * ret
+    favour = np.where(sel == 1, signed, np.nan)
+    avoid = np.where(sel == -1, signed, np.nan)
+    keep = (regime != STAGFLATION)[..., None]
+    return favour, avoid, np.where(keep, favour, np.nan), np.where(keep, avoid, np.nan)
+
+def leg_mean(leg: np.ndarray) -> np.ndarray:
+    # equal-weighted mean of the held industries, 0 when nothing is held
+    held = ~np.isnan(leg)
+    count = held.sum(axis=-1)
+    total = np.where(held, leg, 0).sum(axis=-1)
+    return np.divide(total, count, out=np.zeros(total.shape), where=count > 0)
+
+def _result_frame(values: np.ndarray, regime: pd.Series, columns: list, mean_name: str) -> pd.DataFrame:
+    result = pd.DataFrame(values, index=regime.index, columns=columns)
+    result.insert(0, 'OECD_CH', regime)
+    result[mean_name] = leg_mean(values)
+    return result
+
+def market_return(returns: pd.DataFrame) -> pd.Series:
+    return industry_matrix(returns).mean(axis=1)
+
+@ins.timed
+def run_backtest(selection: pd.DataFrame, periods: pd.DataFrame, returns: pd.DataFrame) -> pd.DataFrame:
+    indgp = industry_matrix(returns)
 
     # market return
     market = indgp.mean(axis=1)
 
-    # Merge with cycle data
-    all_ds = periods.merge(selection, how='left', left_on='OECD_CH', right_index=True)
-    all_ds = all_ds.reset_index()
-    monthly_index = pd.date_range(start=all_ds['date'].min(), end=all_ds['date'].max(), freq='ME')
-    # Reindex with the monthly date range and forward-fill values
-    all_ds.set_index('date', inplace=True)
-    all_ds_monthly = all_ds.reindex(monthly_index, method='ffill')
-    
-    # calc return series
-    combine = all_ds_monthly.join(indgp, rsuffix='_r')
-    columns = indgp.columns
-    result_incl = combine[['OECD_CH']]
-    result_incl_ex_stag = result_incl.copy()
-    result_excl = combine[['OECD_CH']]
-    result_excl_ex_stag = result_excl.copy()
-
-    for c in columns:
-        result_incl[c] = np.where(((combine[c.strip()] == 1)), (combine[c.strip()] * combine[c.strip() + '_r']), np.nan)
-        result_excl[c] = np.where(((combine[c.strip()] == -1)), (combine[c.strip()] * combine[c.strip() + '_r']), np.nan)
-        result_incl_ex_stag[c] = np.where(((combine[c.strip()] == 1) & (combine['OECD_CH'] != 'Stagflation')), (combine[c.strip()] * combine[c.strip() + '_r']), np.nan)
-        result_excl_ex_stag[c] = np.where(((combine[c.strip()] == -1) & (combine['OECD_CH'] != 'Stagflation')), (combine[c.strip()] * combine[c.strip() + '_r']), np.nan)
-
-    result_incl.reset_index().set_index(['index','OECD_CH'], inplace=True)
-    result_excl.reset_index().set_index(['index','OECD_CH'], inplace=True)
-    result_incl_ex_stag.reset_index().set_index(['index','OECD_CH'], inplace=True)
-    result_excl_ex_stag.reset_index().set_index(['index','OECD_CH'], inplace=True)
-
-    result_incl['favour_mean'] = result_incl.iloc[:, 1:].mean(axis=1)
-    result_excl['avoid_mean'] = result_excl.iloc[:, 1:].mean(axis=1)
-    result_incl_ex_stag['favour_mean'] = result_incl_ex_stag.iloc[:, 1:].mean(axis=1)
-    result_excl_ex_stag['avoid_mean'] = result_excl_ex_stag.iloc[:, 1:].mean(axis=1)
-
-    result_incl['favour_mean'] = result_incl['favour_mean'].fillna(0)
-    result_excl['avoid_mean'] = result_excl['avoid_mean'].fillna(0)
-    result_incl_ex_stag['favour_mean'] = result_incl_ex_stag['favour_mean'].fillna(0)
-    result_excl_ex_stag['avoid_mean'] = result_excl_ex_stag['avoid_mean'].fillna(0)
+    regime = monthly_periods(periods)['OECD_CH']
+    columns = list(indgp.columns)
+    sel = selection_matrix(selection, regime.to_numpy(), columns)
+    ret = indgp.reindex(regime.index).to_numpy(dtype=float)
+    incl, excl, incl_ex_stag, excl_ex_stag = apply_selection(sel, ret, regime.to_numpy())
+
+    result_incl = _result_frame(incl, regime, columns, 'favour_mean')
+    result_excl = _result_frame(excl, regime, columns, 'avoid_mean')
+    result_incl_ex_stag = _result_frame(incl_ex_stag, regime, columns, 'favour_mean')
+    result_excl_ex_stag = _result_frame(excl_ex_stag, regime, columns, 'avoid_mean')
 
     return result_incl, result_excl, result_incl_ex_stag, result_excl_ex_stag, market
 
+def _digest(frame: pd.DataFrame) -> bytes:
+    sha = hashlib.sha256(repr(list(frame.columns)).encode())
+    sha.update(pd.util.hash_pandas_object(frame.index).to_numpy().tobytes())
+    values = frame.to_numpy()
+    if values.dtype == object:
+        values = pd.util.hash_array(values.ravel())
+    sha.update(np.ascontiguousarray(values).tobytes())
+    return sha.digest()
+
+def result_key(selection: pd.DataFrame, periods: pd.DataFrame, returns: pd.DataFrame) -> str:
+    # content hash of the selection matrix, the regime series and the return panel
+    parts = [_digest(selection), _digest(periods[['OECD_CH']]), _digest(returns[['cap_weighted_ret']])]
+    return hashlib.sha256(b''.join(parts)).hexdigest()
+
+def _encode_result(regime: pd.Series, columns: list, favour: np.ndarray, avoid: np.ndarray, market: pd.Series) -> bytes:
+    # favour/avoid legs as float32 on one shared date index; the ex-Stagflation legs and the leg means
+    # are rebuilt from these on load
+    codes, labels = pd.factorize(regime)
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        dates=regime.index.to_numpy(), columns=np.array(columns, dtype=str),
+        regime=codes.astype(np.int8), labels=np.array(labels, dtype=str),
+        favour=favour.astype(np.float32), avoid=avoid.astype(np.float32),
+        market_dates=market.index.to_numpy(), market=market.to_numpy(dtype=np.float32),
+    )
+    return buffer.getvalue()
+
+def _decode_result(file) -> dict:
+    with np.load(file) as data:
+        result = {name: data[name] for name in data.files}
+    labels = np.append(result.pop('labels').astype(object), np.nan)
+    result['regime'] = pd.Series(labels[result['regime']], index=pd.DatetimeIndex(result.pop('dates')), name='OECD_CH')
+    result['columns'] = list(result['columns'])
+    result['market'] = pd.Series(result['market'].astype(float), index=pd.DatetimeIndex(result.pop('market_dates'), name='date'))
+    keep = (result['regime'].to_numpy() != STAGFLATION)[:, None]
+    favour, avoid = result['favour'].astype(float), result['avoid'].astype(float)
+    result['legs'] = favour, avoid, np.where(keep, favour, np.nan), np.where(keep, avoid, np.nan)
+    return result
+
+def _read_result(path: str):
+    try:
+        result = _decode_result(path)
+        os.utime(path)
+        return result
+    except (FileNotFoundError, ValueError, EOFError, zipfile.BadZipFile):
+        return None  # not cached yet, or evicted while being read
+
+def _write_result(path: str, payload: bytes):
+    # written under a per-process name and renamed into place, so other workers never see half a file
+    os.makedirs(RESULT_STORE, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp, path)
+    paths.evict_lru(RESULT_STORE, RESULT_LIMIT, ('.npz',))
+
+@ins.timed
+def cached_backtest(selection: pd.DataFrame, periods: pd.DataFrame, returns: pd.DataFrame):
+    # run_backtest through a store shared by every process on the host; leg returns come back at
+    # float32 precision
+    path = RESULT_STORE + result_key(selection, periods, returns) + '.npz'
+    result = _read_result(path)
+    ins.count('backtest.cached_backtest', result is not None)
+    if result is None:
+        result_incl, result_excl, _, _, market = run_backtest(selection, periods, returns)
+        columns = list(result_incl.columns[1:-1])
+        payload = _encode_result(result_incl['OECD_CH'], columns, result_incl[columns].to_numpy(),
+                                 result_excl[columns].to_numpy(), market)
+        _write_result(path, payload)
+        result = _decode_result(io.BytesIO(payload))
+
+    regime, columns = result['regime'], result['columns']
+    incl, excl, incl_ex_stag, excl_ex_stag = result['legs']
+    return (
+        _result_frame(incl, regime, columns, 'favour_mean'),
+        _result_frame(excl, regime, columns, 'avoid_mean'),
+        _result_frame(incl_ex_stag, regime, columns, 'favour_mean'),
+        _result_frame(excl_ex_stag, regime, columns, 'avoid_mean'),
+        result['market'],
+    )
+
+@ins.timed
+def run_backtests(selections: dict, periods: pd.DataFrame, returns: pd.DataFrame) -> pd.DataFrame:
+    # Backtest many selections against one regime; long format with one row per (BT, date)
+    indgp = industry_matrix(returns)
+    regime = monthly_periods(periods)['OECD_CH']
+    labels = regime.to_numpy()
+    columns = list(indgp.columns)
+    ret = indgp.reindex(regime.index).to_numpy(dtype=float)
+    sel = np.stack([selection_matrix(s, labels, columns) for s in selections.values()])
+    incl, excl, incl_ex_stag, excl_ex_stag = apply_selection(sel, ret, labels)
+
+    n = len(selections)
+    return pd.DataFrame({
+        'BT': np.repeat(list(selections.keys()), len(regime)),
+        'date': np.tile(regime.index.to_numpy(), n),
+        'OECD_CH': np.tile(labels, n),
+        'favour_mean': leg_mean(incl).ravel(),
+        'avoid_mean': leg_mean(excl).ravel(),
+        'favour_mean_ex_stag': leg_mean(incl_ex_stag).ravel(),
+        'avoid_mean_ex_stag': leg_mean(excl_ex_stag).ravel(),
+    })
+
+@ins.timed
 def summary_table(result_incl: pd.DataFrame, result_excl: pd.DataFrame, market: pd.DataFrame) -> pd.DataFrame:
     market.rename('market', inplace=True)
     result_incl = result_incl.join(market, how='left')
@@ -65,21 +202,62 @@ def summary_table(result_incl: pd.DataFrame, result_excl: pd.DataFrame, market:
 
     return summary
 
+@ins.timed
 def bt_stats(result_incl: pd.DataFrame, result_excl: pd.DataFrame, market: pd.DataFrame) -> pd.DataFrame:
-    stats = {'cagr': qs.stats.cagr(result_incl['favour_mean'], compounded=False),
-             'volatility': qs.stats.volatility(result_incl['favour_mean']),
-             'sharpe': qs.stats.sharpe(result_incl['favour_mean']),
-             'mdd': qs.stats.max_drawdown(result_incl['favour_mean'])
-            }
-    stats_a = {'cagr': qs.stats.cagr(result_excl['avoid_mean'], compounded=False),
-             'volatility': qs.stats.volatility(result_excl['avoid_mean']),
-             'sharpe': qs.stats.sharpe(result_excl['avoid_mean']),
-             'mdd': qs.stats.max_drawdown(result_excl['avoid_mean'])
-            }
-    # Add in market
-    stats_m = {'cagr': qs.stats.cagr(market, compounded=False),
-                'volatility': qs.stats.volatility(market),
-                'sharpe': qs.stats.sharpe(market),
-                'mdd': qs.stats.max_drawdown(market)
-                }
-    return pd.DataFrame([stats_m, stats, stats_a], index=['Market', 'Favour', 'Avoid']).transpose()
\ No newline at end of file
+    returns = pd.concat([market, result_incl['favour_mean'], result_excl['avoid_mean']], axis=1, keys=['Market', 'Favour', 'Avoid'])
+    return mt.stats_table(returns, ['cagr', 'volatility', 'sharpe', 'mdd'])
+
+@ins.timed
+def rolling_bt_stats(result_incl: pd.DataFrame, result_excl: pd.DataFrame, market: pd.Series, window: int = None) -> pd.DataFrame:
+    # rolling (expanding when window is None) Market/Favour/Avoid metrics over their common months,
+    # indexed by (metric, date)
+    returns = pd.concat([market, result_incl['favour_mean'], result_excl['avoid_mean']], axis=1, keys=['Market', 'Favour', 'Avoid']).dropna()
+    stats = mt.rolling_stats(returns, window)
+    return pd.concat({metric: pd.DataFrame(values, index=returns.index, columns=returns.columns) for metric, values in stats.items()},
+                     names=['metric', 'date'])
+
+def _window_bounds(index: pd.Index, windows: dict):
+    starts = [0 if start is None else index.searchsorted(pd.Timestamp(start)) for start, _ in windows.values()]
+    ends = [len(index) if end is None else index.searchsorted(pd.Timestamp(end)) for _, end in windows.values()]
+    return np.array(starts), np.array(ends)
+
+@ins.timed
+def evaluate_windows(result_incl: pd.DataFrame, result_excl: pd.DataFrame, market: pd.Series,
+                     windows: dict = WINDOWS):
+    # summary_table and bt_stats for every window at once, as {window name: table} dicts
+    result_incl = result_incl.sort_index()
+    result_excl = result_excl.reindex(result_incl.index)
+    market = market.sort_index()
+    index = result_incl.index
+    names = list(windows)
+
+    # summary: per-regime means over the result index, market joined onto it as in summary_table
+    values = np.column_stack([
+        market.reindex(index).to_numpy(dtype=float),
+        result_incl['favour_mean'].to_numpy(dtype=float),
+        result_excl['avoid_mean'].to_numpy(dtype=float),
+    ])
+    codes, regimes = pd.factorize(result_incl['OECD_CH'], sort=True)
+    onehot = codes[:, None] == np.arange(len(regimes))
+    starts, ends = _window_bounds(index, windows)
+    total, _, count = mt.window_moments(np.where(onehot[:, :, None], values[:, None, :], np.nan), starts, ends)
+    present = np.concatenate([np.zeros((1, len(regimes))), np.cumsum(onehot, axis=0)])
+    present = present[ends] - present[starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = total / count
+    summaries = {}
+    for name, window_means, window_present in zip(names, means, present > 0):
+        summary = pd.DataFrame(window_means, index=pd.Index(regimes, name='OECD_CH'), columns=['market', 'favour', 'avoid'])
+        summaries[name] = summary[window_present]
+
+    # stats: market on its own index, favour/avoid on the result index
+    stats = []
+    for series, idx in [(market.to_numpy(dtype=float)[:, None], market.index), (values[:, 1:], index)]:
+        starts, ends = _window_bounds(idx, windows)
+        moments = mt.moment_stats(*mt.window_moments(series, starts, ends))
+        moments['mdd'] = np.array([mt.max_drawdown(series[s:e]) for s, e in zip(starts, ends)])
+        stats.append(np.stack([moments[m] for m in ['cagr', 'volatility', 'sharpe', 'mdd']], axis=1))
+    stats = np.concatenate(stats, axis=2)
+    stats = {name: pd.DataFrame(window_stats, index=['cagr', 'volatility', 'sharpe', 'mdd'], columns=['Market', 'Favour', 'Avoid'])
+             for name, window_stats in zip(names, stats)}
+    return summaries, stats
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+
+def rolling_zscore(series: pd.Series, window: int) -> pd.Series:
+    # z-score of the latest value against its trailing window (population std, as np.std)
+    rolling = series.rolling(window=window)
+    return (series - rolling.mean()) / rolling.std(ddof=0)
+
+def clock_distances(df: pd.DataFrame, cpi: str, lookback: int, freq: str) -> pd.DataFrame:
+    # CPI / OECD moving averages and the distances from them that place each period on the clock
+    df = df.copy()
+    df['CPI_MA'] = df[cpi].rolling(window=lookback).mean()
+    df['OECD_MA'] = df['OECD'].rolling(window=lookback).mean()
+    df['dist_CPI'] = df[cpi] - df['CPI_MA']
+    df['dist_OECD'] = df['OECD'] - df['OECD_MA']
+
+    if freq == 'quarterly':
+        df = df.resample('QE').last()
+    return df
+
+def clock_zscore(df: pd.DataFrame, lookback: int) -> pd.DataFrame:
+    df = df.copy()
+    df['dist_CPI'] = rolling_zscore(df['dist_CPI'], lookback)
+    df['dist_OECD'] = rolling_zscore(df['dist_OECD'], lookback)
+    return df
+
+def clock_data(df: pd.DataFrame, cpi: str, lookback: int, freq: str, zscore: bool) -> pd.DataFrame:
+    df = clock_distances(df, cpi, lookback, freq)
+    return clock_zscore(df, lookback) if zscore else df
+
+def clock_frames(x_values: np.ndarray, y_values: np.ndarray, points: int) -> list:
+    # one animation frame per period showing the trailing `points` periods, latest in red
+    colours = [['lightblue'] * n + ['red'] for n in range(points + 1)]
+    return [
+        {
+            'data': [{
+                'type': 'scatter',
+                'x': x_values[max(0, k - points):k+1],
+                'y': y_values[max(0, k - points):k+1],
+                'mode': 'lines+markers',
+                'marker': {'size': 10, 'color': colours[min(k, points)]},
+            }],
+            'name': str(k),
+        } for k in range(len(x_values))
+    ]
+
+def clock_figure(to_plot: pd.DataFrame, points: int):
+    import plotly.graph_objects as go
+
+    time_points = to_plot['date'].to_numpy()
+    x_values = to_plot['dist_CPI'].to_numpy()
+    y_values = to_plot['dist_OECD'].to_numpy()
+    frames = clock_frames(x_values, y_values, points)
+
+    # Create the initial scatter plot with no points
+    scatter = go.Scatter(
+        x=[], y=[], mode='lines+markers', marker=dict(size=10)
+    )
+
+    # Layout with play button and a slider to control the lookback
+    layout = go.Layout(
+        title='Clock history',
+        yaxis=dict(range=[to_plot['dist_OECD'].min(), to_plot['dist_OECD'].max() + 5]),
+        xaxis=dict(range=[to_plot['dist_CPI'].min(), to_plot['dist_CPI'].max()]),
+        updatemenus=[{
+            'buttons': [
+                {
+                    'args': [None, {'frame': {'duration': 300, 'redraw': True}, 'fromcurrent': True}],
+                    'label': 'Play',
+                    'method': 'animate'
+                },
+                {
+                    'args': [[None], {'frame': {'duration': 0, 'redraw': True}, 'mode': 'immediate', 'transition': {'duration': 0}}],
+                    'label': 'Pause',
+                    'method': 'animate'
+                }
+            ],
+            'direction': 'left',
+            'pad': {'r': 0, 't': 90},
+            'showactive': False,
+            'type': 'buttons',
+            'x': 0.1,
+            'xanchor': 'right',
+            'y': 0,
+            'yanchor': 'top'
+        }],
+        sliders=[{
+            'active': 0,
+            'yanchor': 'top',
+            'xanchor': 'left',
+            'currentvalue': {
+                'font': {'size': 15},
+                'visible': True,
+                'xanchor': 'center',
+                'prefix': 'Period: ',
+                'visible': True
+            },
+            'transition': {'duration': 300, 'easing': 'cubic-in-out'},
+            'pad': {'r': 50, 't': 30},
+            'len': 0.9,
+            'x': 0.1,
+            'y': 0.0,
+            'steps': [{
+                'args': [
+                    [str(k)],
+                    {
+                        'frame': {'duration': 0, 'redraw': True},
+                        'mode': 'immediate',
+                        'transition': {'duration': 0}
+                    }
+                ],
+                'label': f"{time_points[max(0, k-points)]} - {time_points[k]}",
+                'method': 'animate'
+            } for k in range(len(time_points))]
+        }]
+    )
+
+    # Create the figure
+    fig = go.Figure(
+        data=[scatter],
+        layout=layout,
+        frames=frames
+    )
+
+    fig.add_shape(
+        type="line",
+        x0=to_plot['dist_CPI'].min(), x1=to_plot['dist_CPI'].max() + 5,  # Extend across the entire x-axis
+        y0=0, y1=0,
+        line=dict(color="grey", width=2)
+    )
+
+    fig.add_shape(
+        type="line",
+        x0=0, x1=0,  # Extend from the bottom to the top of the y-axis
+        y0=to_plot['dist_OECD'].min(), y1=to_plot['dist_OECD'].max() + 5,
+        line=dict(color="grey", width=2)
+    )
+
+    fig.update_layout(
+        annotations=[
+            # Top-left corner
+            dict(
+                x=to_plot['dist_CPI'].min()/2, y=to_plot['dist_OECD'].max() + 5,
+                xref="x", yref="y",
+                text="Recovery",
+                showarrow=False,
+                # font=dict(size=12, color="black"),
+                align="right"
+            ),
+            # Top-right corner
+            dict(
+                x=to_plot['dist_CPI'].max()/2, y=to_plot['dist_OECD'].max() + 5,
+                xref="x", yref="y",
+                text="Overheat",
+                showarrow=False,
+                # font=dict(size=12, color="black"),
+                align="left"
+            ),
+            # Bottom-left corner
+            dict(
+                x=to_plot['dist_CPI'].min()/2, y=to_plot['dist_OECD'].min(),
+                xref="x", yref="y",
+                text="Reflation",
+                showarrow=False,
+                # font=dict(size=12, color="black"),
+                align="right"
+            ),
+            # Bottom-right corner
+            dict(
+                x=to_plot['dist_CPI'].max()/2, y=to_plot['dist_OECD'].min(),
+                xref="x", yref="y",
+                text="Stagflation",
+                showarrow=False,
+                # font=dict(size=12, color="black"),
+                align="left"
+            )
+        ]
+    )
+
+    return fig
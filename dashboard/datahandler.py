@@ -1,9 +1,44 @@
+import contextlib
+import functools
+import glob
+import hashlib
+import json
+import os
+import shutil
 import pandas as pd
 import numpy as np
-import streamlit as st
+import clock
+import instrument as ins
+import paths
 
-DATA_FOLDER = './dashboard/data/'
+DATA_FOLDER = paths.DATA_FOLDER
 CONSTITUENTS_FILE = 'broad_china_consituents.csv'
+CACHE_FOLDER = paths.CACHE_FOLDER
+CONSTITUENTS_STORE = CACHE_FOLDER + 'constituents/'
+PANEL_STORE = CACHE_FOLDER + 'panels/'
+REGIME_FOLDER = 'regimes/'
+SELECTION_FOLDER = 'selections/'
+CATEGORY_COLUMNS = ['sector', 'industry', 'industry_adj', 'country']
+# tickers are stored like the group labels: integer codes plus a lookup table of the distinct codes
+LABEL_COLUMNS = ['home_code'] + CATEGORY_COLUMNS
+# bumped whenever the stored layout changes, so existing stores (and the panels and caches keyed on
+# their version) are rebuilt
+STORE_FORMAT = 2
+CHUNK_ROWS = 500_000
+# the columns the return panels are computed from
+PANEL_COLUMNS = ['date', 'country', 'sector', 'industry_adj', 'MCAP_USD', 'FWD_RET_1M']
+# processes materialise_return_panels spreads the panel aggregation over
+PANEL_WORKERS = 1
+PANEL_LEVELS = {
+    'universe': ['date'],
+    'country': ['date', 'country'],
+    'sector': ['date', 'sector'],
+    'industry': ['date', 'industry_adj'],
+}
+ECON_SUFFIX = '_econ_data.csv'
+ECON_CPI_OPTION = ['CPI', 'Core CPI']
+ECON_LOOKBACK_OPTION = [12, 24, 36]
+ECON_FREQUENCY_OPTION = ['monthly', 'quarterly']
 REGIME_FILE_OPTION = ['CPI & OECD_CH (Month End)', 'CI & OECD_CH (Month End)', 'CI & OECD_CH (Monthly)']
 INDUSTRY_GROUPS_OPTION = [
     # OECD CLI-based Quadrants (Ind Gp)
@@ -47,9 +82,7 @@ INDUSTRY_GROUPS_OPTION = [
     'OECD-MEND_M_CI-PosNegRetNoStag-1-NO-2022'
 ]
 
-@st.cache_data
-def get_constituents() -> pd.DataFrame:
-    df = pd.read_csv(DATA_FOLDER + CONSTITUENTS_FILE)
+def normalise_constituents(df: pd.DataFrame) -> pd.DataFrame:
     df = df.dropna()
     # adjust industry
     df['industry_adj'] = np.where(df['industry'] == 'Media & Entertainment', 'Media', df['industry'])
@@ -58,42 +91,297 @@ def get_constituents() -> pd.DataFrame:
     df['country'] = np.where(df['country'].isin(['HK', 'CN']), df['country'], 'CN')
     return df
 
-def universe_return(df: pd.DataFrame) -> pd.DataFrame:
-    returns = pd.DataFrame()
-    returns['cap_weighted_ret'] = df.groupby(['date']).apply(lambda x: np.average(x['FWD_RET_1M'], weights=x['MCAP_USD']))
-    returns['eq_weighted_ret'] = df.groupby(['date']).apply(lambda x: np.average(x['FWD_RET_1M']))
-    returns['count'] = df.groupby(['date'])['MCAP_USD'].count()
+def compact_constituents(df: pd.DataFrame) -> pd.DataFrame:
+    # datetime64 dates, categorical labels and float32 numbers; sums over these are taken in float64
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date'])
+    df[LABEL_COLUMNS] = df[LABEL_COLUMNS].astype('category')
+    numeric = df.select_dtypes('float64').columns
+    df[numeric] = df[numeric].astype('float32')
+    return df
+
+def file_hash(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def read_manifest() -> dict:
+    manifest_file = CONSTITUENTS_STORE + '_manifest.json'
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file) as f:
+        return json.load(f)
+
+def constituents_version(source: str = None) -> str:
+    # Content hash of the source file and the store format; only rehashed when its mtime or size changes
+    source = source or DATA_FOLDER + CONSTITUENTS_FILE
+    stat = os.stat(source)
+    manifest = read_manifest()
+    if manifest.get('format') == STORE_FORMAT and manifest.get('mtime') == stat.st_mtime_ns and manifest.get('size') == stat.st_size:
+        return manifest['hash']
+    return hashlib.sha256(f'{file_hash(source)}:{STORE_FORMAT}'.encode()).hexdigest()
+
+@contextlib.contextmanager
+def build_lock():
+    # serialises store and panel builds across the server's processes, so processes cold-starting
+    # together build once and never remove each other's output; a no-op where flock is unavailable
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    with open(CACHE_FOLDER + 'build.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def read_constituents(source: str, chunksize: int = CHUNK_ROWS):
+    # the normalised, compacted constituents csv, chunksize rows at a time
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        yield compact_constituents(normalise_constituents(chunk))
+
+@ins.timed
+def ingest_constituents(source: str = None, force: bool = False, chunksize: int = CHUNK_ROWS) -> str:
+    # Convert the constituents csv into a parquet store partitioned by year, unless it is already current.
+    # The csv is streamed in chunks, each appended to the store and folded into the return panels, so
+    # peak memory is bounded by the chunk size rather than the file. source defaults to the csv in
+    # DATA_FOLDER as it is when called
+    source = source or DATA_FOLDER + CONSTITUENTS_FILE
+    version = constituents_version(source)
+    if not force and read_manifest().get('hash') == version:
+        _refresh_signature(source, version)
+        return version
+    with build_lock():
+        # another process may have built it while this one waited
+        if not force and read_manifest().get('hash') == version:
+            return version
+        _build_store(source, version, chunksize)
+    return version
+
+def _refresh_signature(source: str, version: str):
+    # touched but unchanged: just refresh the manifest's mtime and size
+    manifest = read_manifest()
+    stat = os.stat(source)
+    if manifest.get('mtime') != stat.st_mtime_ns or manifest.get('size') != stat.st_size:
+        manifest.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+        tmp = f'{CONSTITUENTS_STORE}_manifest.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, CONSTITUENTS_STORE + '_manifest.json')
+
+def _build_store(source: str, version: str, chunksize: int):
+    # built under a per-process name and swapped in; callers hold build_lock
+    stat = os.stat(source)
+    signature = {'hash': version, 'format': STORE_FORMAT, 'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+    tmp = f'{CONSTITUENTS_STORE.rstrip("/")}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    sums = {}
+    rows = 0
+    for i, df in enumerate(read_constituents(source, chunksize)):
+        sums = merge_panel_sums(sums, panel_sums(df))
+        rows += len(df)
+        # zero-padded so the store reads back in file order
+        df.assign(year=df['date'].dt.year).to_parquet(tmp, partition_cols=['year'], index=False,
+                                                       basename_template=f'part-{i:06d}-{{i}}.parquet')
+    with open(os.path.join(tmp, '_manifest.json'), 'w') as f:
+        json.dump(dict(signature, rows=rows), f)
+    shutil.rmtree(CONSTITUENTS_STORE, ignore_errors=True)
+    os.replace(tmp, CONSTITUENTS_STORE)
+    write_return_panels(version, finish_panels(sums))
+
+@ins.cache_data
+def load_constituents(version: str, columns: list = None, start=None, end=None) -> pd.DataFrame:
+    filters = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters += [('year', '>=', start.year), ('date', '>=', start)]
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters += [('year', '<=', end.year), ('date', '<=', end)]
+    df = pd.read_parquet(CONSTITUENTS_STORE, columns=columns, filters=filters or None)
+    if 'year' in df.columns:
+        df = df.drop(columns='year')
+    return df
+
+def get_constituents(columns: list = None, start=None, end=None) -> pd.DataFrame:
+    version = ingest_constituents()
+    return load_constituents(version, columns, start, end)
+
+def group_sums(df: pd.DataFrame, keys: list) -> pd.DataFrame:
+    # per-group sums behind the returns, in float64 whatever the stored precision; sums of disjoint
+    # row sets add up, so chunks can be aggregated separately and merged
+    ret = df['FWD_RET_1M'].astype('float64')
+    mcap = df['MCAP_USD'].astype('float64')
+    grouped = df[keys].assign(wret=ret * mcap, mcap=mcap, ret=ret).groupby(keys, observed=True)
+    sums = grouped.sum()
+    sums['count'] = grouped.size()
+    return sums
+
+def returns_from_sums(sums: pd.DataFrame) -> pd.DataFrame:
+    returns = pd.DataFrame(index=sums.index)
+    returns['cap_weighted_ret'] = sums['wret'] / sums['mcap']
+    returns['eq_weighted_ret'] = sums['ret'] / sums['count']
+    returns['count'] = sums['count']
     return returns
 
+@ins.timed
+def group_return(df: pd.DataFrame, keys: list) -> pd.DataFrame:
+    # cap-weighted return, equal-weighted return and count per group in one pass
+    return returns_from_sums(group_sums(df, keys))
+
+def universe_return(df: pd.DataFrame) -> pd.DataFrame:
+    return group_return(df, ['date'])
+
 def universe_return_by_country(df: pd.DataFrame) -> pd.DataFrame:
     df['country'] = df['home_code'].str[-2:]
     df['country'] = np.where(df['country'].isin(['HK', 'CN']), df['country'], 'CN')
-    returns = pd.DataFrame()
-    returns['cap_weighted_ret'] = df.groupby(['date', 'country']).apply(lambda x: np.average(x['FWD_RET_1M'], weights=x['MCAP_USD']))
-    returns['eq_weighted_ret'] = df.groupby(['date', 'country']).apply(lambda x: np.average(x['FWD_RET_1M']))
-    returns['count'] = df.groupby(['date', 'country'])['country'].count()
-    return returns
+    return group_return(df, ['date', 'country'])
 
 def sector_return(df: pd.DataFrame) -> pd.DataFrame:
     # return by sector
-    sector_returns = pd.DataFrame()
-    sector_returns['cap_weighted_ret'] = df.groupby(['date', 'sector']).apply(lambda x: np.average(x['FWD_RET_1M'], weights=x['MCAP_USD']))
-    sector_returns['eq_weighted_ret'] = df.groupby(['date', 'sector']).apply(lambda x: np.average(x['FWD_RET_1M']))
-    sector_returns['count'] = df.groupby(['date', 'sector'])['sector'].count()
-    return sector_returns
+    return group_return(df, ['date', 'sector'])
 
 
 def industry_return(df: pd.DataFrame) -> pd.DataFrame:
     # return by industry
-    industry_returns = pd.DataFrame()
-    industry_returns['cap_weighted_ret'] = df.groupby(['date', 'industry_adj']).apply(lambda x: np.average(x['FWD_RET_1M'], weights=x['MCAP_USD']))
-    industry_returns['eq_weighted_ret'] = df.groupby(['date', 'industry_adj']).apply(lambda x: np.average(x['FWD_RET_1M']))
-    industry_returns['count'] = df.groupby(['date', 'industry_adj'])['industry_adj'].count()
-    return industry_returns
+    return group_return(df, ['date', 'industry_adj'])
+
+def panel_sums(df: pd.DataFrame) -> dict:
+    return {level: group_sums(df, keys) for level, keys in PANEL_LEVELS.items()}
+
+def merge_panel_sums(left: dict, right: dict) -> dict:
+    merged = {}
+    for level, keys in PANEL_LEVELS.items():
+        if level not in left:
+            merged[level] = right[level]
+            continue
+        sums = pd.concat([left[level], right[level]])
+        if len(keys) > 1:
+            # chunks have their own categories; group on the plain labels
+            sums.index = sums.index.set_levels(sums.index.levels[1].astype(str), level=1)
+        merged[level] = sums.groupby(level=keys).sum()
+    return merged
+
+def finish_panels(sums: dict) -> dict:
+    panels = {}
+    for level, keys in PANEL_LEVELS.items():
+        panel = returns_from_sums(sums[level])
+        if len(keys) > 1:
+            # plain string labels, so downstream string ops behave as before, in label order whatever
+            # order the categories came in
+            panel = panel.reset_index()
+            panel[keys[1]] = panel[keys[1]].astype(str)
+            panel = panel.set_index(keys).sort_index()
+        panels[level] = panel
+    return panels
+
+def write_arrow(df: pd.DataFrame, path: str) -> str:
+    # the panel columns sorted by date (stable, so each group keeps its row order) as an uncompressed
+    # Arrow file that worker processes can memory-map instead of being sent pickled frames
+    import pyarrow.feather as feather
+    feather.write_feather(df[PANEL_COLUMNS].sort_values('date', kind='stable', ignore_index=True), path,
+                          compression='uncompressed')
+    return path
+
+def read_arrow(path: str, lo: int = 0, hi: int = None) -> pd.DataFrame:
+    import pyarrow as pa
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        hi = table.num_rows if hi is None else hi
+        # the slice is zero-copy; only its rows are converted
+        return table.slice(lo, hi - lo).to_pandas()
+
+def date_partitions(dates: np.ndarray, parts: int) -> list:
+    # [lo, hi) row ranges of about equal size over sorted dates, cut only where the date changes so
+    # no (date, group) is split between partitions
+    starts = np.r_[0, np.flatnonzero(dates[1:] != dates[:-1]) + 1]
+    targets = np.linspace(0, len(dates), parts + 1)[1:-1]
+    cuts = np.unique(np.r_[0, starts[np.minimum(np.searchsorted(starts, targets), len(starts) - 1)], len(dates)])
+    return list(zip(cuts[:-1].tolist(), cuts[1:].tolist()))
+
+def arrow_panel_sums(path: str, lo: int, hi: int) -> dict:
+    return panel_sums(read_arrow(path, lo, hi))
+
+def parallel_return_panels(path: str, workers: int) -> dict:
+    # panels from an Arrow file written by write_arrow, one date range per task. Partitions hold whole
+    # dates, so every group is summed in one worker in its original row order and the merge is exact
+    from concurrent.futures import ProcessPoolExecutor
+    import pyarrow as pa
+    with pa.memory_map(path) as source:
+        dates = pa.ipc.open_file(source).read_all().column('date').to_numpy()
+    bounds = date_partitions(dates, workers)
+    with ProcessPoolExecutor(workers) as pool:
+        parts = list(pool.map(arrow_panel_sums, [path] * len(bounds), *zip(*bounds)))
+    return finish_panels(functools.reduce(merge_panel_sums, parts, {}))
+
+@ins.timed
+def build_return_panels(df: pd.DataFrame, workers: int = 1) -> dict:
+    if workers <= 1:
+        return finish_panels(panel_sums(df))
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    path = f'{CACHE_FOLDER}panels.{os.getpid()}.arrow'
+    try:
+        return parallel_return_panels(write_arrow(df, path), workers)
+    finally:
+        os.remove(path)
+
+def write_return_panels(version: str, panels: dict) -> str:
+    # Persist the return panels for one data version, dropping those of other versions; callers
+    # hold build_lock
+    folder = PANEL_STORE + version + '/'
+    tmp = f'{PANEL_STORE}{version}.{os.getpid()}.tmp/'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for level, panel in panels.items():
+        panel.to_parquet(tmp + level + '.parquet')
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(tmp, folder)
+    for old in os.listdir(PANEL_STORE):
+        if not old.startswith(version):
+            shutil.rmtree(PANEL_STORE + old, ignore_errors=True)
+    return folder
+
+def _panels_exist(folder: str) -> bool:
+    return all(os.path.exists(folder + level + '.parquet') for level in PANEL_LEVELS)
+
+@ins.timed
+def materialise_return_panels(version: str) -> str:
+    # the panels are written at ingest; rebuilt from the store if they have gone missing
+    folder = PANEL_STORE + version + '/'
+    if _panels_exist(folder):
+        return folder
+    with build_lock():
+        if _panels_exist(folder):
+            return folder
+        df = load_constituents(version, PANEL_COLUMNS)
+        return write_return_panels(version, build_return_panels(df, PANEL_WORKERS))
+
+@ins.cache_data
+def load_return_panel(version: str, level: str) -> pd.DataFrame:
+    return pd.read_parquet(materialise_return_panels(version) + level + '.parquet')
+
+def get_return_panel(level: str) -> pd.DataFrame:
+    # date x group cap-weighted / equal-weighted returns and counts for 'universe', 'country', 'sector' or 'industry'
+    return load_return_panel(ingest_constituents(), level)
+
+def get_return_matrix(level: str, field: str = 'cap_weighted_ret') -> pd.DataFrame:
+    panel = get_return_panel(level)
+    if level == 'universe':
+        return panel[[field]]
+    return panel[field].unstack(PANEL_LEVELS[level][1])
 
-@st.cache_data
 def get_regime(type: str) -> pd.DataFrame:
     file = DATA_FOLDER + type + '.csv'
+    # keyed on mtime so regime files regenerated in place are picked up
+    return load_regime(file, os.stat(file).st_mtime_ns)
+
+@ins.cache_data
+def load_regime(file: str, mtime: int) -> pd.DataFrame:
     periods = pd.read_csv(file)
     periods.Period = pd.to_datetime(periods.Period)
     periods.rename(columns={'Period': 'date'}, inplace=True)
@@ -101,10 +389,57 @@ def get_regime(type: str) -> pd.DataFrame:
     
     return periods
 
-@st.cache_data
+def regime_options() -> list:
+    # the hand-made regime files followed by any generated under DATA_FOLDER/regimes/
+    generated = sorted(glob.glob(DATA_FOLDER + REGIME_FOLDER + '*.csv'))
+    return REGIME_FILE_OPTION + [REGIME_FOLDER + os.path.basename(f)[:-len('.csv')] for f in generated]
+
+def selection_options() -> list:
+    # the hand-made selection files followed by any written by optimise.py under DATA_FOLDER/selections/
+    generated = sorted(glob.glob(DATA_FOLDER + SELECTION_FOLDER + '*.csv'))
+    return INDUSTRY_GROUPS_OPTION + [SELECTION_FOLDER + os.path.basename(f)[:-len('.csv')] for f in generated]
+
 def industry_group_selection(select: str) -> pd.DataFrame:
-    selection = pd.read_csv(f"{DATA_FOLDER}{select}.csv")
+    file = f"{DATA_FOLDER}{select}.csv"
+    # keyed on mtime so selection files optimise.py rewrites in place are picked up
+    return load_selection(file, os.stat(file).st_mtime_ns)
+
+@ins.cache_data
+def load_selection(file: str, mtime: int) -> pd.DataFrame:
+    selection = pd.read_csv(file)
     selection.set_index('indgp', inplace=True)
     selection = selection.transpose()
 
     return selection
+
+@ins.cache_data
+def get_econ_panel() -> pd.DataFrame:
+    # every region's <region>_econ_data.csv in one panel indexed by (region, date_idx)
+    frames = {}
+    for file in sorted(glob.glob(DATA_FOLDER + '*' + ECON_SUFFIX)):
+        df = pd.read_csv(file, usecols=['date'] + ECON_CPI_OPTION + ['OECD'])
+        df['date_idx'] = pd.to_datetime(df['date'])
+        df[ECON_CPI_OPTION + ['OECD']] = df[ECON_CPI_OPTION + ['OECD']].astype(float)
+        frames[os.path.basename(file)[:-len(ECON_SUFFIX)]] = df.set_index('date_idx').sort_index()
+    return pd.concat(frames, names=['region', 'date_idx'])
+
+def econ_regions() -> list:
+    return list(get_econ_panel().index.unique('region'))
+
+@ins.cache_resource
+def econ_distances() -> dict:
+    # moving averages and distances for every region, cpi measure, lookback and frequency, built once
+    panel = get_econ_panel()
+    distances = {}
+    for region in panel.index.unique('region'):
+        df = panel.loc[region]
+        for cpi in ECON_CPI_OPTION:
+            for lookback in ECON_LOOKBACK_OPTION:
+                for freq in ECON_FREQUENCY_OPTION:
+                    distances[(region, cpi, lookback, freq)] = clock.clock_distances(df, cpi, lookback, freq)
+    return distances
+
+@ins.cache_data(max_entries=128)
+def get_econ_indicators(region: str, cpi: str, lookback: int, freq: str, zscore: bool) -> pd.DataFrame:
+    df = econ_distances()[(region, cpi, lookback, freq)]
+    return clock.clock_zscore(df, lookback) if zscore else df
@@ -0,0 +1,115 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+import datahandler as dh
+import instrument as ins
+import paths
+
+FIGURE_STORE = dh.CACHE_FOLDER + 'figures/'
+MEMORY_LIMIT = 64 << 20
+DISK_LIMIT = 256 << 20
+# serialised form of each kind of figure on disk
+SUFFIX = {'plotly': '.json', 'pyplot': '.png'}
+# bumped whenever the cached form of figures changes; edits to the figures themselves are picked
+# up from the contents of PLOT_CODE
+FIGURE_FORMAT = 1
+PLOT_CODE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plots.py')
+
+# key -> (kind, figure, payload size); plotly figures are kept as objects, pyplot ones as png bytes.
+# Shared by every session of the server process, most recently used last
+_memory = OrderedDict()
+_memory_size = 0
+_lock = threading.Lock()
+# path -> (mtime, size, sha256), so unchanged input files are not rehashed on every rerun
+_hashes = {}
+
+def content_hash(path: str) -> str:
+    stat = os.stat(path)
+    cached = _hashes.get(path)
+    if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+        cached = (stat.st_mtime_ns, stat.st_size, dh.file_hash(path))
+        _hashes[path] = cached
+    return cached[2]
+
+def figure_key(name: str, regime: str, selections: list, *params) -> str:
+    # content hash of a figure's inputs: the regime and selection files, the constituents data
+    # version and any other parameters (window, pick, ...), and of the code that draws it
+    sha = hashlib.sha256()
+    parts = [name, str(FIGURE_FORMAT), content_hash(PLOT_CODE), dh.ingest_constituents(),
+             content_hash(dh.DATA_FOLDER + regime + '.csv')]
+    parts += [content_hash(f'{dh.DATA_FOLDER}{s}.csv') for s in selections]
+    for part in parts + [repr(p) for p in params]:
+        sha.update(part.encode())
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+@ins.timed
+def _serialise(kind: str, figure) -> bytes:
+    if kind == 'plotly':
+        return figure.to_json().encode()
+    # as st.pyplot would render it
+    png = io.BytesIO()
+    figure.savefig(png, format='png', bbox_inches='tight', dpi=200)
+    import matplotlib.pyplot as plt
+    plt.close(figure)
+    return png.getvalue()
+
+def _deserialise(kind: str, payload: bytes):
+    if kind == 'plotly':
+        import plotly.io as pio
+        return pio.from_json(payload.decode())
+    return payload
+
+def _remember(key: str, kind: str, figure, size: int):
+    global _memory_size
+    with _lock:
+        if key in _memory:
+            _memory_size -= _memory.pop(key)[2]
+        _memory[key] = (kind, figure, size)
+        _memory_size += size
+        while _memory_size > MEMORY_LIMIT and len(_memory) > 1:
+            _memory_size -= _memory.popitem(last=False)[1][2]
+
+@ins.timed
+def cached_figure(key: str, build, *args, kind: str = 'plotly', **kwargs):
+    # figure for `key` from memory, then disk, else built with build(*args, **kwargs) and stored in both.
+    # pyplot figures come back as png bytes, for st.image
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            ins.count('figcache.cached_figure', True)
+            return _memory[key][1]
+
+    path = FIGURE_STORE + key + SUFFIX[kind]
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+            os.utime(path)
+            figure = _deserialise(kind, payload)
+            _remember(key, kind, figure, len(payload))
+            ins.count('figcache.cached_figure', True)
+            return figure
+        except (FileNotFoundError, ValueError):
+            pass  # evicted or half-written by another process; rebuild
+
+    ins.count('figcache.cached_figure', False)
+    figure = build(*args, **kwargs)
+    payload = _serialise(kind, figure)
+    os.makedirs(FIGURE_STORE, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp, path)
+    paths.evict_lru(FIGURE_STORE, DISK_LIMIT, tuple(SUFFIX.values()))
+    figure = figure if kind == 'plotly' else payload
+    _remember(key, kind, figure, len(payload))
+    return figure
+
+def clear():
+    global _memory_size
+    with _lock:
+        _memory.clear()
+        _memory_size = 0
@@ -0,0 +1,201 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from pandas.tseries.offsets import MonthEnd
+import datahandler as dh
+import backtest as bt
+import metrics as mt
+
+STATE_FOLDER = dh.CACHE_FOLDER + 'incremental/'
+# run_backtest leg means kept per (regime, selection) config, in apply_selection's order
+LEGS = ['favour_mean', 'avoid_mean', 'favour_mean_ex_stag', 'avoid_mean_ex_stag']
+STATS = ['cagr', 'volatility', 'sharpe', 'mdd']
+
+# State kept between monthly updates:
+#   industry.parquet      the industry return panel, as get_return_panel('industry')
+#   portfolios.parquet    leg means per (regime, selection, date)
+#   accumulators.parquet  metrics.accumulate state per (regime, selection, series), with the
+#                         last date folded in
+
+def default_configs() -> list:
+    return [(r, s) for r in dh.REGIME_FILE_OPTION for s in dict.fromkeys(dh.INDUSTRY_GROUPS_OPTION)]
+
+def _path(name: str) -> str:
+    return STATE_FOLDER + name + '.parquet'
+
+def load_state():
+    industry, portfolios, accumulators = [pd.read_parquet(_path(name)) if os.path.exists(_path(name)) else None
+                                          for name in ['industry', 'portfolios', 'accumulators']]
+    return industry, portfolios, accumulators
+
+def save_state(industry: pd.DataFrame, portfolios: pd.DataFrame, accumulators: pd.DataFrame):
+    os.makedirs(STATE_FOLDER, exist_ok=True)
+    for name, frame in [('industry', industry), ('portfolios', portfolios), ('accumulators', accumulators)]:
+        frame.to_parquet(_path(name) + '.tmp')
+        os.replace(_path(name) + '.tmp', _path(name))
+
+def industry_panel(constituents: pd.DataFrame) -> pd.DataFrame:
+    # industry return panel rows for raw constituent rows, labelled as in the panel store
+    df = dh.normalise_constituents(constituents)
+    df['date'] = pd.to_datetime(df['date'])
+    panel = dh.industry_return(df).reset_index()
+    panel['industry_adj'] = panel['industry_adj'].astype(str)
+    return panel.set_index(['date', 'industry_adj'])
+
+def _unpack(accumulators: pd.DataFrame) -> dict:
+    # {(regime, selection, series): (accumulate state, last date folded in)} from the stored frame
+    if accumulators is None:
+        return {}
+    values = accumulators[mt.ACCUMULATORS].to_numpy(dtype=float)
+    through = accumulators['through'].tolist()
+    return {key: ({name: values[i, j:j + 1] for j, name in enumerate(mt.ACCUMULATORS)}, through[i])
+            for i, key in enumerate(accumulators.index)}
+
+def _combine(states: list):
+    # one multi-column state from single-series states folded in through the same date
+    if any(state is None for state in states):
+        return None
+    return {name: np.concatenate([state[0][name] for state in states]) for name in mt.ACCUMULATORS}, states[0][1]
+
+def _extend(prev: tuple, full, start: pd.Timestamp) -> tuple:
+    # fold the months of `full` from `start` into the accumulated state, or rebuild it when months
+    # already folded in have changed
+    if prev is None or start <= prev[1]:
+        state, rows, through = None, full, pd.NaT
+    else:
+        state, rows, through = prev[0], full[full.index >= start], prev[1]
+    if len(rows):
+        through = rows.index.max()
+    return mt.accumulate(rows.to_numpy(dtype=float), state), through
+
+def update(new_constituents: pd.DataFrame = None, configs: list = None, returns: pd.DataFrame = None) -> pd.Series:
+    # Fold new months of constituents, and regime months added since the last update, into the stored
+    # state, recomputing only the months they affect; returns the months rewritten per config.
+    # Without stored state it starts from `returns`, by default the full industry panel
+    configs = configs or default_configs()
+    industry, portfolios, accumulators = load_state()
+    if industry is None:
+        industry = dh.get_return_panel('industry') if returns is None else returns
+    dirty = pd.Timestamp.max
+    if new_constituents is not None:
+        rows = industry_panel(new_constituents)
+        dates = rows.index.unique('date')
+        industry = pd.concat([industry[~industry.index.get_level_values('date').isin(dates)], rows]).sort_index()
+        dirty = (dates + MonthEnd(0)).min()
+
+    acc = _unpack(accumulators)
+    last = {} if portfolios is None else portfolios.groupby(['regime', 'selection'], sort=False)['date'].max().to_dict()
+
+    # first month each config needs: the first changed industry month or the first new regime month
+    regimes = {r: bt.monthly_periods(dh.get_regime(r)) for r in dict.fromkeys(r for r, _ in configs)}
+    starts = {key: min(dirty, last[key] + MonthEnd(1)) if key in last else regimes[key[0]].index.min() for key in configs}
+    dates = industry.index.get_level_values('date') + MonthEnd(0)
+    recent = industry[dates >= min(starts.values())]
+
+    # leg means from each config's start, batched over the configs sharing a regime file and start
+    groups = {}
+    for key in configs:
+        groups.setdefault((key[0], starts[key]), []).append(key[1])
+    blocks, legs = [], {}
+    for (regime_file, start), selects in groups.items():
+        regime = regimes[regime_file]
+        regime = regime[regime.index >= start]
+        if regime.empty:
+            continue
+        block = bt.run_backtests({s: dh.industry_group_selection(s) for s in selects}, regime, recent)
+        block = block.rename(columns={'BT': 'selection'})
+        block.insert(0, 'regime', regime_file)
+        blocks.append(block)
+        values = block[LEGS].to_numpy().reshape(len(selects), len(regime), len(LEGS))
+        legs.update({(regime_file, s): pd.DataFrame(v, index=regime.index) for s, v in zip(selects, values)})
+
+    # stored months before each config's start are kept, as are configs not asked for
+    if portfolios is not None:
+        cutoff = pd.Series(starts).reindex(pd.MultiIndex.from_frame(portfolios[['regime', 'selection']])).to_numpy()
+        blocks.insert(0, portfolios[pd.isna(cutoff) | (portfolios['date'] < cutoff)])
+    portfolios = pd.concat(blocks, ignore_index=True)
+
+    market, new_market, records = None, bt.market_return(recent), []
+    for key in configs:
+        start = starts[key]
+        rows = legs.get(key, pd.DataFrame(columns=range(len(LEGS)), index=pd.DatetimeIndex([]), dtype=float))
+        prev = _combine([acc.get(key + (name,)) for name in LEGS])
+        if prev is not None and start <= prev[1]:
+            # months already folded in have changed, so rebuild from the whole series
+            full = portfolios[(portfolios['regime'] == key[0]) & (portfolios['selection'] == key[1])]
+            rows, prev = full.set_index('date')[LEGS], None
+        state, through = _extend(prev, rows, start)
+        records += [key + (name, state, j, through) for j, name in enumerate(LEGS)]
+
+        prev = acc.get(key + ('market',))
+        market_start = min(dirty, prev[1] + MonthEnd(1)) if prev is not None else pd.Timestamp.min
+        if prev is None or market_start <= prev[1]:
+            if market is None:
+                market = bt.market_return(industry)
+            rows, prev = market, None
+        else:
+            rows = new_market
+        state, through = _extend(prev, rows, market_start)
+        records.append(key + ('market', state, 0, through))
+
+    frame = pd.DataFrame([r[:3] + tuple(r[3][name][r[4]] for name in mt.ACCUMULATORS) + (r[5],) for r in records],
+                         columns=['regime', 'selection', 'series'] + mt.ACCUMULATORS + ['through'])
+    frame = frame.set_index(['regime', 'selection', 'series'])
+    if accumulators is not None:
+        frame = pd.concat([accumulators[~accumulators.index.isin(frame.index)], frame])
+    save_state(industry, portfolios, frame.sort_index())
+    written = {key: len(legs[key]) if key in legs else 0 for key in configs}
+    return pd.Series(written, name='months').rename_axis(['regime', 'selection'])
+
+def stats(accumulators: pd.DataFrame, regime_file: str, select: str, ex_stag: bool = False) -> pd.DataFrame:
+    # bt_stats table for one config from its accumulators
+    legs = ['market'] + (LEGS[2:] if ex_stag else LEGS[:2])
+    rows = accumulators.loc[(regime_file, select)].loc[legs]
+    values = mt.accumulated_stats({name: rows[name].to_numpy(dtype=float) for name in mt.ACCUMULATORS})
+    return pd.DataFrame([values[m] for m in STATS], index=STATS, columns=['Market', 'Favour', 'Avoid'])
+
+def check_consistency(configs: list = None, returns: pd.DataFrame = None, rtol: float = 1e-9) -> pd.DataFrame:
+    # compare the stored series and metrics with run_backtest / bt_stats over the full history
+    configs = configs or default_configs()
+    returns = dh.get_return_panel('industry') if returns is None else returns
+    _, portfolios, accumulators = load_state()
+    stored = dict(list(portfolios.groupby(['regime', 'selection'], sort=False)))
+    checks = []
+    for regime_file, select in configs:
+        incl, excl, incl_ex_stag, excl_ex_stag, market = bt.run_backtest(
+            dh.industry_group_selection(select), dh.get_regime(regime_file), returns)
+        full = pd.DataFrame({'favour_mean': incl['favour_mean'], 'avoid_mean': excl['avoid_mean'],
+                             'favour_mean_ex_stag': incl_ex_stag['favour_mean'], 'avoid_mean_ex_stag': excl_ex_stag['avoid_mean']})
+        series = stored[(regime_file, select)].set_index('date')[LEGS]
+        same_dates = series.index.equals(full.index)
+        series_diff = np.abs(series.to_numpy() - full.to_numpy()).max() if same_dates else np.inf
+
+        stats_diff = 0.0
+        for ex_stag, (i, e) in [(False, (incl, excl)), (True, (incl_ex_stag, excl_ex_stag))]:
+            expected = bt.bt_stats(i, e, market).to_numpy(dtype=float)
+            actual = stats(accumulators, regime_file, select, ex_stag).to_numpy(dtype=float)
+            with np.errstate(invalid='ignore'):
+                diff = np.abs(actual - expected) / np.maximum(np.abs(expected), 1)
+            stats_diff = max(stats_diff, np.nanmax(np.where(np.isnan(actual) == np.isnan(expected), diff, np.inf)))
+        checks.append({'regime': regime_file, 'selection': select, 'series_diff': series_diff, 'stats_diff': stats_diff,
+                       'ok': same_dates and series_diff <= rtol and stats_diff <= rtol})
+    return pd.DataFrame(checks)
+
+def main():
+    parser = argparse.ArgumentParser(description='Fold a new month of constituents into the stored backtest state.')
+    parser.add_argument('--append', action='append', help='csv of new constituent rows (repeatable)')
+    parser.add_argument('--check', action='store_true', help='compare the state with a full recompute')
+    args = parser.parse_args()
+    from streamlit.logger import set_log_level
+    set_log_level('error')
+
+    new = pd.concat([pd.read_csv(f) for f in args.append]) if args.append else None
+    written = update(new)
+    print(f'{len(written)} configs updated, {written.sum()} months rewritten')
+    if args.check:
+        checks = check_consistency()
+        print(checks[~checks['ok']].to_string() if not checks['ok'].all() else f'{len(checks)} configs match a full recompute')
+
+if __name__ == '__main__':
+    main()
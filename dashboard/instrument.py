@@ -0,0 +1,198 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import pandas as pd
+import paths
+
+# DASHBOARD_PROFILE=1 records wall time, calls and cache hits/misses of the instrumented stages for
+# every rerun, shown in a sidebar panel and appended to PROFILE_LOG as one JSON line per rerun.
+# DASHBOARD_PROFILE=memory also records each stage's peak traced memory; tracemalloc slows every
+# allocation, and is process-wide so concurrent sessions' allocations show up in each other's peaks.
+# Unset, an instrumented call costs one flag check. streamlit is only imported where it is used, so
+# backtest and plots stay cheap to import.
+MODE = os.environ.get('DASHBOARD_PROFILE', '')
+ENABLED = MODE in ('1', 'memory')
+MEMORY = MODE == 'memory'
+PROFILE_LOG = os.environ.get('DASHBOARD_PROFILE_LOG', paths.CACHE_FOLDER + 'profile.jsonl')
+# reruns kept per session for the download button
+HISTORY = 50
+
+# each Streamlit rerun runs in its own script thread, so the current rerun's record is thread-local
+_local = threading.local()
+
+def enable(on: bool = True, memory: bool = False):
+    global ENABLED, MEMORY
+    ENABLED, MEMORY = on, on and memory
+    if MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not MEMORY and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def _new_run(page: str = None) -> dict:
+    return {'page': page, 'started': time.time(), 'clock': time.perf_counter(), 'stages': {}, 'stack': []}
+
+def _run() -> dict:
+    run = getattr(_local, 'run', None)
+    if run is None:
+        run = _local.run = _new_run()
+    return run
+
+def _stage(run: dict, name: str) -> dict:
+    stage = run['stages'].get(name)
+    if stage is None:
+        stage = run['stages'][name] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'hits': 0, 'misses': 0,
+                                       'peak_mb': 0.0}
+    return stage
+
+def _enter(run: dict):
+    if not MEMORY:
+        return None
+    # each open stage tracks the highest traced memory seen while it was open; the tracemalloc
+    # peak is reset on entry and exit, so a stage's own peak is folded into its parent's
+    current, peak = tracemalloc.get_traced_memory()
+    if run['stack']:
+        run['stack'][-1]['peak'] = max(run['stack'][-1]['peak'], peak)
+    tracemalloc.reset_peak()
+    frame = {'start': current, 'peak': current}
+    run['stack'].append(frame)
+    return frame
+
+def _exit(run: dict, name: str, frame, seconds: float):
+    stage = _stage(run, name)
+    stage['calls'] += 1
+    stage['seconds'] += seconds
+    stage['max_seconds'] = max(stage['max_seconds'], seconds)
+    if frame is not None:
+        run['stack'].pop()
+        frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+        stage['peak_mb'] = max(stage['peak_mb'], (frame['peak'] - frame['start']) / 2**20)
+        if run['stack']:
+            run['stack'][-1]['peak'] = max(run['stack'][-1]['peak'], frame['peak'])
+        tracemalloc.reset_peak()
+
+@contextlib.contextmanager
+def stage(name: str):
+    # time a block of page code, e.g. the st.plotly_chart calls that serialise figures
+    if not ENABLED:
+        yield
+        return
+    run = _run()
+    frame = _enter(run)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _exit(run, name, frame, time.perf_counter() - start)
+
+def timed(func):
+    # record every call of func as the stage <module>.<name>; times are inclusive of nested stages
+    name = f'{func.__module__}.{func.__qualname__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return func(*args, **kwargs)
+        run = _run()
+        frame = _enter(run)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _exit(run, name, frame, time.perf_counter() - start)
+    return wrapper
+
+def count(name: str, hit: bool):
+    # a cache lookup that did (hit) or did not find its entry
+    if ENABLED:
+        _stage(_run(), name)['hits' if hit else 'misses'] += 1
+
+def _cached(cache, func, options: dict):
+    # cache(func) that is also timed, counting a call as a miss when the function body ran
+    @functools.wraps(func)
+    def body(*args, **kwargs):
+        _local.missed = True
+        return func(*args, **kwargs)
+    cached = cache(body, **options)
+    name = f'{func.__module__}.{func.__qualname__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return cached(*args, **kwargs)
+        # saved and restored so a cached call nested inside another's body is counted separately
+        outer = getattr(_local, 'missed', False)
+        _local.missed = False
+        run = _run()
+        frame = _enter(run)
+        start = time.perf_counter()
+        try:
+            return cached(*args, **kwargs)
+        finally:
+            _exit(run, name, frame, time.perf_counter() - start)
+            count(name, not _local.missed)
+            _local.missed = outer
+    wrapper.clear = cached.clear
+    return wrapper
+
+def cache_data(func=None, **options):
+    # drop-in for st.cache_data, with or without options
+    import streamlit as st
+    if func is None:
+        return lambda f: _cached(st.cache_data, f, options)
+    return _cached(st.cache_data, func, options)
+
+def cache_resource(func=None, **options):
+    import streamlit as st
+    if func is None:
+        return lambda f: _cached(st.cache_resource, f, options)
+    return _cached(st.cache_resource, func, options)
+
+def begin(page: str):
+    # start a rerun's record; called at the top of each page
+    if not ENABLED:
+        return
+    if MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _local.run = _new_run(os.path.basename(page))
+
+def record() -> dict:
+    # the current rerun so far, stages slowest first
+    run = _run()
+    stages = [dict(stage=name, **s) for name, s in run['stages'].items()]
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        session = get_script_run_ctx().session_id
+    except AttributeError:
+        session = None
+    return {'page': run['page'], 'session': session, 'started': run['started'],
+            'seconds': time.perf_counter() - run['clock'], 'memory': MEMORY,
+            'stages': sorted(stages, key=lambda s: -s['seconds'])}
+
+def panel():
+    # end of a rerun: log it and show it in the sidebar; called at the bottom of each page
+    if not ENABLED:
+        return
+    import streamlit as st
+    rerun = record()
+    os.makedirs(os.path.dirname(PROFILE_LOG), exist_ok=True)
+    with open(PROFILE_LOG, 'a') as f:
+        f.write(json.dumps(rerun) + '\n')
+    history = st.session_state.setdefault('_profile_history', [])
+    history.append(rerun)
+    del history[:-HISTORY]
+
+    with st.sidebar.expander(f'Profile: {rerun["seconds"] * 1000:.0f}ms rerun', expanded=False):
+        if rerun['stages']:
+            table = pd.DataFrame(rerun['stages']).set_index('stage')
+            table[['seconds', 'max_seconds']] *= 1000
+            table = table.rename(columns={'seconds': 'ms', 'max_seconds': 'max ms'})
+            if not MEMORY:
+                table = table.drop(columns='peak_mb')
+            st.dataframe(table.style.format({'ms': '{:.1f}', 'max ms': '{:.1f}', 'peak_mb': '{:.1f}'}))
+        st.caption('Times include nested stages.')
+        st.download_button('Download JSON lines', '\n'.join(json.dumps(r) for r in history) + '\n',
+                           file_name='profile.jsonl', mime='application/jsonl')
@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+
+# quantstats' default annualisation, which bt_stats has always used
+PERIODS = 252
+METRICS = ['cagr', 'volatility', 'sharpe', 'mdd', 'sortino', 'hit_rate']
+
+# All metrics take a (time x series) return matrix, NaN for missing months, and
+# return one value per column.
+
+def _matrix(returns) -> np.ndarray:
+    values = np.asarray(returns, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    return np.where(np.isinf(values), np.nan, values)
+
+def _count(values: np.ndarray) -> np.ndarray:
+    return (~np.isnan(values)).sum(axis=0)
+
+def _mean(values: np.ndarray) -> np.ndarray:
+    count = _count(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nansum(values, axis=0) / np.where(count > 0, count, np.nan)
+
+def _std(values: np.ndarray) -> np.ndarray:
+    count = _count(values)
+    dev = np.where(np.isnan(values), 0, values - _mean(values))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sqrt((dev ** 2).sum(axis=0) / np.where(count > 1, count - 1, np.nan))
+
+def cagr(returns, periods: int = PERIODS) -> np.ndarray:
+    # non-compounded, as qs.stats.cagr(compounded=False)
+    values = _matrix(returns)
+    wealth = 1 + np.nansum(values, axis=0)
+    years = _count(values) / periods
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(wealth < 0, np.nan, np.abs(wealth) ** (1 / years) - 1)
+
+def volatility(returns, periods: int = PERIODS) -> np.ndarray:
+    return _std(_matrix(returns)) * np.sqrt(periods)
+
+def sharpe(returns, periods: int = PERIODS) -> np.ndarray:
+    values = _matrix(returns)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return _mean(values) / _std(values) * np.sqrt(periods)
+
+def sortino(returns, periods: int = PERIODS) -> np.ndarray:
+    values = _matrix(returns)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        downside = np.sqrt(np.nansum(np.where(values < 0, values, 0) ** 2, axis=0) / _count(values))
+        return _mean(values) / np.where(downside == 0, np.nan, downside) * np.sqrt(periods)
+
+def _prefix_sums(values: np.ndarray):
+    # running sums along axis 0 of the values, of their deviations from the overall mean
+    # (which keeps the sum of squares stable), of the squared deviations and of the count
+    held = ~np.isnan(values)
+    raw = np.where(held, values, 0)
+    dev = np.where(held, values - raw.sum(axis=0) / np.maximum(held.sum(axis=0), 1), 0)
+    zero = np.zeros((1,) + values.shape[1:])
+    return [np.concatenate([zero, np.cumsum(a, axis=0)]) for a in (raw, dev, dev ** 2, held)]
+
+def window_moments(values: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+    # per-window total, squared deviation from the window mean and count from one set of prefix sums
+    sums = _prefix_sums(values)
+    total, dev, sq, count = [s[ends] - s[starts] for s in sums]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sq_dev = sq - np.where(count > 0, dev ** 2 / count, 0)
+    # below the rounding error of the running sums, e.g. a window of constant returns
+    sq_dev = np.where(sq_dev <= 1e-10 * sums[2][ends], 0, sq_dev)
+    return total, sq_dev, count
+
+def moment_stats(total: np.ndarray, sq_dev: np.ndarray, count: np.ndarray, periods: int = PERIODS) -> dict:
+    # cagr, volatility and sharpe from per-series sum, sum of squared deviations and count
+    with np.errstate(invalid='ignore', divide='ignore'):
+        wealth = 1 + total
+        std = np.sqrt(sq_dev / np.where(count > 1, count - 1, np.nan))
+        return {
+            'cagr': np.where(wealth < 0, np.nan, np.abs(wealth) ** (periods / count) - 1),
+            'volatility': std * np.sqrt(periods),
+            'sharpe': total / np.where(count > 0, count, np.nan) / std * np.sqrt(periods),
+        }
+
+ACCUMULATORS = ['count', 'total', 'mean', 'sq_dev', 'equity', 'peak', 'mdd']
+
+def accumulate(returns, state: dict = None) -> dict:
+    # running per-column count, sum, mean, squared deviation, equity, peak and max drawdown,
+    # extended by the rows of `returns`; batches are merged as in Chan et al.'s parallel variance
+    values = _matrix(returns)
+    if state is None:
+        state = {name: np.zeros(values.shape[1]) for name in ACCUMULATORS}
+        state['equity'] = state['peak'] = np.ones(values.shape[1])
+    if len(values) == 0:
+        return state
+    held = ~np.isnan(values)
+    count = held.sum(axis=0)
+    total = np.where(held, values, 0).sum(axis=0)
+    mean = np.divide(total, count, out=np.zeros(total.shape), where=count > 0)
+    sq_dev = (np.where(held, values - mean, 0) ** 2).sum(axis=0)
+
+    merged = state['count'] + count
+    weight = np.divide(count, merged, out=np.zeros(total.shape), where=merged > 0)
+    delta = mean - state['mean']
+    equity = state['equity'] * np.cumprod(1 + np.nan_to_num(values), axis=0)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=0), state['peak'])
+    return {
+        'count': merged,
+        'total': state['total'] + total,
+        'mean': state['mean'] + delta * weight,
+        'sq_dev': state['sq_dev'] + sq_dev + delta ** 2 * state['count'] * weight,
+        'equity': equity[-1],
+        'peak': peak[-1],
+        'mdd': np.minimum(state['mdd'], (equity / peak).min(axis=0) - 1),
+    }
+
+def accumulated_stats(state: dict, periods: int = PERIODS) -> dict:
+    # cagr, volatility, sharpe and mdd from accumulate's running state
+    stats = moment_stats(state['total'], state['sq_dev'], state['count'], periods)
+    stats['mdd'] = state['mdd']
+    return stats
+
+def max_drawdown(returns) -> np.ndarray:
+    # compounded equity from a base of 1, so a loss in the first month counts
+    values = _matrix(returns)
+    if len(values) == 0:
+        return np.zeros(values.shape[1])
+    equity = np.cumprod(1 + np.nan_to_num(values), axis=0)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=0), 1)
+    return (equity / peak).min(axis=0) - 1
+
+def hit_rate(returns) -> np.ndarray:
+    # share of positive months among non-zero months
+    values = _matrix(returns)
+    traded = (values != 0) & ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = (values > 0).sum(axis=0) / traded.sum(axis=0)
+    return np.where(traded.any(axis=0), rate, 0.0)
+
+def turnover(weights) -> np.ndarray:
+    # average one-way turnover per period of a (time x asset) or (series x time x asset) weight array
+    weights = np.nan_to_num(np.asarray(weights, dtype=float))
+    if weights.shape[-2] < 2:
+        return np.zeros(weights.shape[:-2])
+    return 0.5 * np.abs(np.diff(weights, axis=-2)).sum(axis=-1).mean(axis=-1)
+
+def holding_weights(result: pd.DataFrame) -> np.ndarray:
+    # equal weights over the industries held each month in a run_backtest result frame
+    held = result.drop(columns=['OECD_CH', 'favour_mean', 'avoid_mean'], errors='ignore').notna().to_numpy()
+    count = held.sum(axis=1, keepdims=True)
+    return np.divide(held, count, out=np.zeros(held.shape), where=count > 0)
+
+FUNCS = {
+    'cagr': cagr,
+    'volatility': volatility,
+    'sharpe': sharpe,
+    'mdd': max_drawdown,
+    'sortino': sortino,
+    'hit_rate': hit_rate,
+}
+
+def stats_table(returns: pd.DataFrame, metrics: list = METRICS) -> pd.DataFrame:
+    # metrics x series table for the columns of a return frame
+    values = _matrix(returns)
+    return pd.DataFrame({m: FUNCS[m](values) for m in metrics}, index=returns.columns).transpose()
+
+def _window_mdd(equity: np.ndarray, length: int) -> np.ndarray:
+    # max drawdown within every run of `length` rows of a (time x series) equity array, as
+    # (time - length + 1 x series), in O(time) whatever the length. Cut into blocks of `length` rows,
+    # each run is a suffix of one block and a prefix of the next; the drawdown of the two joined is the
+    # worse of each one's and of the prefix's low below the suffix's peak
+    n = len(equity) - length + 1
+    if n <= 0:
+        return np.zeros((0, equity.shape[1]))
+    blocks = len(equity) // length + 1
+    padded = np.ones((blocks * length, equity.shape[1]))
+    padded[:len(equity)] = equity
+    block = padded.reshape(blocks, length, -1)
+    # from each row to the end of its block
+    suf_max = np.maximum.accumulate(block[:, ::-1], axis=1)[:, ::-1]
+    suf_min = np.minimum.accumulate(block[:, ::-1], axis=1)[:, ::-1]
+    suf_mdd = np.minimum.accumulate((suf_min / block - 1)[:, ::-1], axis=1)[:, ::-1]
+    # from the start of each block to before each row; the first is empty
+    empty = np.ones((blocks, 1, equity.shape[1]))
+    pre_min = np.concatenate([empty * np.inf, np.minimum.accumulate(block, axis=1)], axis=1)
+    pre_mdd = np.concatenate([empty * 0, np.minimum.accumulate(block / np.maximum.accumulate(block, axis=1) - 1, axis=1)], axis=1)
+    k, off = np.divmod(np.arange(n), length)
+    return np.minimum(np.minimum(suf_mdd[k, off], pre_mdd[k + 1, off]), pre_min[k + 1, off] / suf_max[k, off] - 1)
+
+def rolling_stats(returns, window: int = None, periods: int = PERIODS) -> dict:
+    # rolling (or expanding when window is None) cagr, volatility, sharpe, drawdown and max drawdown,
+    # each a (time x series) array, NaN until a full window is available
+    values = _matrix(returns)
+    ends = np.arange(1, len(values) + 1)
+    starts = np.zeros(len(values), dtype=int) if window is None else np.maximum(ends - window, 0)
+    stats = moment_stats(*window_moments(values, starts, ends), periods)
+
+    equity = np.cumprod(1 + np.nan_to_num(values), axis=0)
+    if window is None:
+        peak = np.maximum(np.maximum.accumulate(equity, axis=0), 1)
+        stats['drawdown'] = equity / peak - 1
+        stats['mdd'] = np.minimum.accumulate(stats['drawdown'], axis=0)
+    else:
+        # drawdown from the peak of the trailing window (including the equity it started from)
+        base = np.vstack([np.ones((1, values.shape[1])), equity])
+        peak = pd.DataFrame(base).rolling(window + 1, min_periods=1).max().to_numpy(copy=True)[1:]
+        stats['drawdown'] = equity / peak - 1
+        # max drawdown of each full window on its own, as max_drawdown of the window's returns: from
+        # the equity the window started from to its last month
+        stats['mdd'] = np.full(values.shape, np.nan)
+        stats['mdd'][window - 1:] = _window_mdd(base, window + 1)
+        for metric in stats.values():
+            metric[:window - 1] = np.nan
+    return stats
@@ -0,0 +1,201 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import backtest as bt
+import metrics as mt
+import instrument as ins
+
+# column order of the selection files
+SELECTION_REGIMES = ['Recovery', 'Stagflation', 'Reccesion', 'Overheat']
+# objectives are maximised over the (month x candidate) leg returns of the train months
+OBJECTIVES = {
+    'mean': lambda values: values.mean(axis=0),
+    'cagr': mt.cagr,
+    'sharpe': mt.sharpe,
+    'sortino': mt.sortino,
+    'mdd': mt.max_drawdown,
+    'hit_rate': mt.hit_rate,
+}
+LEGS = ['favour', 'avoid', 'spread']
+# candidates per kernel call; each holds a months x BATCH float array per leg
+BATCH = 16384
+
+# A candidate is a (regime x industry) int8 matrix of 1 (favour), -1 (avoid) or 0, as in the
+# selection files. A month's legs only depend on its regime's row, so a batch is scored with one
+# matmul per regime of that regime's months' returns against the batch's rows, and the objective
+# is computed down the months for every candidate at once. The search is a batched local search:
+# every member of a population of random starts moves to its best single-cell change until none
+# improves the train score.
+
+def prepare(periods: pd.DataFrame, returns: pd.DataFrame, train: tuple = bt.WINDOWS['Prior 2023'],
+            test: tuple = bt.WINDOWS['2023 onwards']) -> dict:
+    # the industry return matrix on the regime's month ends, split into train and test windows of
+    # (start inclusive, end exclusive) dates, either bound None
+    indgp = bt.industry_matrix(returns)
+    regime = bt.monthly_periods(periods)['OECD_CH']
+    codes, labels = pd.factorize(regime, sort=True)
+    ret = indgp.reindex(regime.index).to_numpy(dtype=float)
+    held = ~np.isnan(ret)
+    filled = np.where(held, ret, 0)
+    data = {'industries': list(indgp.columns), 'labels': list(labels), 'dates': regime.index}
+    for name, (start, end) in [('train', train), ('test', test)]:
+        keep = np.ones(len(regime), dtype=bool)
+        if start is not None:
+            keep &= regime.index >= pd.Timestamp(start)
+        if end is not None:
+            keep &= regime.index < pd.Timestamp(end)
+        months = np.flatnonzero(keep)
+        # per regime: its positions among the window's months, and those months' returns (0 where
+        # missing) and held masks
+        data[name] = []
+        for k in range(len(labels)):
+            pos = np.flatnonzero(codes[months] == k)
+            data[name].append((pos, filled[months[pos]], held[months[pos]].astype(float)))
+        data[name + '_months'] = len(months)
+    return data
+
+def _leg(total: np.ndarray, count: np.ndarray) -> np.ndarray:
+    # equal-weighted mean of the picks with returns, 0 when none (their total is 0 too), as bt.leg_mean
+    return total / np.maximum(count, 1)
+
+def leg_returns(data: dict, candidates: np.ndarray, window: str = 'train', leg: str = 'spread') -> np.ndarray:
+    # (month x candidate) favour_mean, avoid_mean or their sum for a (candidate x regime x industry)
+    # batch over a prepared window's months
+    out = np.zeros((data[window + '_months'], len(candidates)))
+    for k, (pos, ret, held) in enumerate(data[window]):
+        if not len(pos):
+            continue
+        rows = candidates[:, k, :]
+        if leg in ('favour', 'spread'):
+            pick = (rows == 1).T.astype(float)
+            out[pos] += _leg(ret @ pick, held @ pick)
+        if leg in ('avoid', 'spread'):
+            pick = (rows == -1).T.astype(float)
+            out[pos] -= _leg(ret @ pick, held @ pick)
+    return out
+
+def score(data: dict, candidates: np.ndarray, window: str = 'train', leg: str = 'spread',
+          objective: str = 'sharpe', batch: int = BATCH) -> np.ndarray:
+    # objective per candidate, -inf where undefined (e.g. the sharpe of a matrix that never trades)
+    scores = np.concatenate([OBJECTIVES[objective](leg_returns(data, candidates[i:i + batch], window, leg))
+                             for i in range(0, len(candidates), batch)])
+    return np.where(np.isnan(scores), -np.inf, scores)
+
+def feasible(candidates: np.ndarray, max_favour: int, max_avoid: int, excluded: np.ndarray) -> np.ndarray:
+    # at most max_favour / max_avoid picks per regime, and none in the excluded regimes
+    return (((candidates == 1).sum(axis=2) <= max_favour).all(axis=1)
+            & ((candidates == -1).sum(axis=2) <= max_avoid).all(axis=1)
+            & ~(candidates[:, excluded, :] != 0).any(axis=(1, 2)))
+
+def random_candidates(n: int, shape: tuple, max_favour: int, max_avoid: int, excluded: np.ndarray,
+                      rng: np.random.Generator) -> np.ndarray:
+    # n feasible matrices, each regime with up to max_favour / max_avoid random distinct industries
+    n_regimes, n_industries = shape
+    rank = np.argsort(rng.random((n, n_regimes, n_industries)), axis=2).argsort(axis=2)
+    favour = rng.integers(0, max_favour + 1, (n, n_regimes, 1))
+    avoid = rng.integers(0, max_avoid + 1, (n, n_regimes, 1))
+    candidates = np.where(rank < favour, 1, np.where(rank < favour + avoid, -1, 0)).astype(np.int8)
+    candidates[:, excluded, :] = 0
+    return candidates
+
+def neighbours(population: np.ndarray) -> np.ndarray:
+    # (member x move x regime x industry) every single-cell change of every member (and the member)
+    n, n_regimes, n_industries = population.shape
+    k, i, v = [a.ravel() for a in np.meshgrid(np.arange(n_regimes), np.arange(n_industries), [-1, 0, 1], indexing='ij')]
+    moves = np.repeat(population[:, None], len(k), axis=1)
+    moves[:, np.arange(len(k)), k, i] = v
+    return moves
+
+@ins.timed
+def optimise(data: dict, objective: str = 'sharpe', leg: str = 'spread', max_favour: int = 5, max_avoid: int = 5,
+             exclude: list = (), starts: int = 64, rounds: int = 50, keep: int = 10, seed: int = 0) -> dict:
+    # best selection matrices on the train window, each also scored on the test window
+    labels, industries = data['labels'], data['industries']
+    unknown = [label for label in exclude if label not in labels]
+    if unknown:
+        raise ValueError(f'unknown regimes to exclude: {unknown}; the regime file has {labels}')
+    excluded = np.array([label in exclude for label in labels])
+    rng = np.random.default_rng(seed)
+    population = random_candidates(starts, (len(labels), len(industries)), max_favour, max_avoid, excluded, rng)
+    current = score(data, population, 'train', leg, objective)
+    evaluated = len(population)
+    for _ in range(rounds):
+        moves = neighbours(population)
+        shape = moves.shape
+        moves = moves.reshape(-1, *shape[2:])
+        ok = feasible(moves, max_favour, max_avoid, excluded)
+        scores = np.full(len(moves), -np.inf)
+        scores[ok] = score(data, moves[ok], 'train', leg, objective)
+        scores = scores.reshape(shape[:2])
+        evaluated += ok.sum()
+        best = scores.argmax(axis=1)
+        improved = scores[np.arange(len(population)), best] > current + 1e-12
+        if not improved.any():
+            break
+        population[improved] = moves.reshape(shape)[improved, best[improved]]
+        current[improved] = scores[improved, best[improved]]
+
+    # distinct local optima, best first
+    _, first = np.unique(population.reshape(len(population), -1), axis=0, return_index=True)
+    first = first[np.argsort(-current[first], kind='stable')][:keep]
+    best = population[first]
+    table = pd.DataFrame({
+        'train': current[first],
+        'test': score(data, best, 'test', leg, objective),
+        'favour': (best == 1).sum(axis=(1, 2)),
+        'avoid': (best == -1).sum(axis=(1, 2)),
+    }, index=pd.RangeIndex(1, len(best) + 1, name='rank'))
+    return {'scores': table, 'candidates': best, 'evaluated': evaluated}
+
+def from_selection(selection: pd.DataFrame, data: dict) -> np.ndarray:
+    # a (regime x indgp) frame from industry_group_selection as a candidate matrix
+    selection = selection.reindex(index=data['labels'], columns=data['industries'])
+    return selection.fillna(0).to_numpy(dtype=np.int8)
+
+def to_selection(candidate: np.ndarray, data: dict) -> pd.DataFrame:
+    # a candidate matrix in the selection file layout: indgp x regime, 1 / -1 / blank
+    selection = pd.DataFrame(candidate.T, index=pd.Index(data['industries'], name='indgp'), columns=data['labels'])
+    selection = selection.reindex(columns=SELECTION_REGIMES, fill_value=0)
+    return selection.astype('Int64').mask(selection == 0).reset_index()
+
+def main():
+    from streamlit.logger import set_log_level
+    set_log_level('error')
+    import datahandler as dh
+    parser = argparse.ArgumentParser(description='Search for selection matrices with the best train-window backtest.')
+    parser.add_argument('--regime', default=dh.REGIME_FILE_OPTION[0], help='regime file name')
+    parser.add_argument('--objective', choices=OBJECTIVES, default='sharpe')
+    parser.add_argument('--leg', choices=LEGS, default='spread')
+    parser.add_argument('--max-favour', type=int, default=5, help='favoured industries per regime')
+    parser.add_argument('--max-avoid', type=int, default=5, help='avoided industries per regime')
+    parser.add_argument('--exclude', action='append', default=[], help='regime with no trades (repeatable)')
+    parser.add_argument('--split', default=bt.WINDOWS['2023 onwards'][0], help='first test month')
+    parser.add_argument('--starts', type=int, default=64)
+    parser.add_argument('--keep', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--name', help=f'write the best matrix to {dh.DATA_FOLDER}{dh.SELECTION_FOLDER}<name>.csv')
+    args = parser.parse_args()
+
+    data = prepare(dh.get_regime(args.regime), dh.get_return_panel('industry'),
+                   train=(bt.WINDOWS['ALL'][0], args.split), test=(args.split, None))
+    result = optimise(data, args.objective, args.leg, args.max_favour, args.max_avoid, args.exclude,
+                      args.starts, keep=args.keep, seed=args.seed)
+    print(f'{result["evaluated"]:,} candidates evaluated; {args.objective} of the {args.leg} leg')
+    print(result['scores'].to_string(float_format='{:.3f}'.format))
+
+    # the hand-made files on the same windows, for comparison
+    handmade = np.stack([from_selection(dh.industry_group_selection(s), data) for s in dh.INDUSTRY_GROUPS_OPTION])
+    table = pd.DataFrame({'train': score(data, handmade, 'train', args.leg, args.objective),
+                          'test': score(data, handmade, 'test', args.leg, args.objective)},
+                         index=pd.Index(dh.INDUSTRY_GROUPS_OPTION, name='selection file'))
+    print(table.sort_values('train', ascending=False).head(args.keep).to_string(float_format='{:.3f}'.format))
+
+    if args.name:
+        file = dh.DATA_FOLDER + dh.SELECTION_FOLDER + args.name + '.csv'
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        to_selection(result['candidates'][0], data).to_csv(file, index=False)
+        print(f'best matrix -> {file}')
+
+if __name__ == '__main__':
+    main()
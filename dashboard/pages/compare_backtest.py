@@ -4,15 +4,17 @@ import datahandler as dh
 import backtest as bt
 import numpy as np
 import plots as pt
+import figcache as fc
+import significance as sg
+import instrument as ins
 
-df = dh.get_constituents()
-df['date'] = pd.to_datetime(df['date']).dt.date
+ins.begin(__file__)
 
-selected_regime = st.selectbox('Regime config', dh.REGIME_FILE_OPTION)
+selected_regime = st.selectbox('Regime config', dh.regime_options())
 regime = dh.get_regime(selected_regime)
 
-selected_bt = st.multiselect('Backtest config', dh.INDUSTRY_GROUPS_OPTION, default='Ind Gp +1M-0-ALL')
-industry_return = dh.industry_return(df)
+selected_bt = st.multiselect('Backtest config', dh.selection_options(), default='Ind Gp +1M-0-ALL')
+industry_return = dh.get_return_panel('industry')
 
 bt_data = pd.DataFrame()
 summary_data = pd.DataFrame()
@@ -21,9 +23,11 @@ summary_data_p2 = pd.DataFrame()
 stats_data = pd.DataFrame()
 stats_data_p1 = pd.DataFrame()
 stats_data_p2 = pd.DataFrame()
-for i in selected_bt:
-    selected_industry = dh.industry_group_selection(i)
-    result_incl, result_excl, result_incl_ex_stag, result_excl_ex_stag, market = bt.run_backtest(selected_industry, regime, industry_return)
+selections = {i: dh.industry_group_selection(i) for i in selected_bt}
+results = bt.run_backtests(selections, regime, industry_return)
+market = bt.market_return(industry_return)
+for i, result in results.groupby('BT', sort=False):
+    result_incl = result_excl = result.set_index('date')
 
     tmp = pd.DataFrame()
     tmp['favour'] = (result_incl.loc[result_incl.index >= '2005-11-01']['favour_mean']).cumsum()
@@ -34,48 +38,22 @@ for i in selected_bt:
     tmp['BT'] = i
     bt_data = pd.concat([bt_data, tmp])
 
-    tmp2 = bt.summary_table(result_incl.loc[result_incl.index >= '2005-11-01'], 
-                            result_excl.loc[result_excl.index >= '2005-11-01'], 
-                            market.loc[market.index >= '2005-11-01'])
-    tmp2['BT'] = i
-    summary_data = pd.concat([summary_data, tmp2])
-
-    tmp2 = bt.summary_table(result_incl.loc[(result_incl.index >= '2005-11-01') & (result_incl.index < '2023-01-01')], 
-                            result_excl.loc[(result_excl.index >= '2005-11-01') & (result_excl.index < '2023-01-01')], 
-                            market.loc[(market.index >= '2005-11-01') & (market.index < '2023-01-01')])
-    tmp2['BT'] = i
-    summary_data_p1 = pd.concat([summary_data_p1, tmp2])
-
-    tmp2 = bt.summary_table(result_incl.loc[result_incl.index >= '2023-01-01'], 
-                            result_excl.loc[result_excl.index >= '2023-01-01'], 
-                            market.loc[market.index >= '2023-01-01'])
-    tmp2['BT'] = i
-    summary_data_p2 = pd.concat([summary_data_p2, tmp2])
-
-    tmp_stats = bt.bt_stats(result_incl.loc[result_incl.index >= '2005-11-01'],
-                            result_excl.loc[result_excl.index >= '2005-11-01'],
-                            market.loc[market.index >= '2005-11-01'])
-    tmp_stats['BT'] = i
-    stats_data = pd.concat([stats_data, tmp_stats])
-
-    tmp_stats = bt.bt_stats(result_incl.loc[(result_incl.index >= '2005-11-01') & (result_incl.index < '2023-01-01')],
-                            result_excl.loc[(result_excl.index >= '2005-11-01') & (result_excl.index < '2023-01-01')],
-                            market.loc[(market.index >= '2005-11-01') & (market.index < '2023-01-01')])
-    tmp_stats['BT'] = i
-    stats_data_p1 = pd.concat([stats_data_p1, tmp_stats])
-
-    tmp_stats = bt.bt_stats(result_incl.loc[result_incl.index >= '2023-01-01'],
-                            result_excl.loc[result_excl.index >= '2023-01-01'],
-                            market.loc[market.index >= '2023-01-01'])
-    tmp_stats['BT'] = i
-    stats_data_p2 = pd.concat([stats_data_p2, tmp_stats])
+    summaries, stats = bt.evaluate_windows(result_incl, result_excl, market, bt.WINDOWS)
+    summary_data = pd.concat([summary_data, summaries['ALL'].assign(BT=i)])
+    summary_data_p1 = pd.concat([summary_data_p1, summaries['Prior 2023'].assign(BT=i)])
+    summary_data_p2 = pd.concat([summary_data_p2, summaries['2023 onwards'].assign(BT=i)])
+    stats_data = pd.concat([stats_data, stats['ALL'].assign(BT=i)])
+    stats_data_p1 = pd.concat([stats_data_p1, stats['Prior 2023'].assign(BT=i)])
+    stats_data_p2 = pd.concat([stats_data_p2, stats['2023 onwards'].assign(BT=i)])
 
 to_plot = bt_data.melt(id_vars = ['date', 'BT', 'OECD_CH'], value_vars= ['favour', 'avoid', 'market'])
 to_plot['label'] = np.where(to_plot['variable'] != 'market', to_plot['BT'] + "-" + to_plot['variable'], 'market')
 to_plot = to_plot[to_plot['value'].notna()]
 
 st.subheader('Cumulative return')
-st.plotly_chart(pt.plot_multi(to_plot), use_container_width=True, theme="streamlit", key=None, on_select="ignore")
+with ins.stage('st.plotly_chart'):
+    st.plotly_chart(fc.cached_figure(fc.figure_key('plot_multi', selected_regime, selected_bt), pt.plot_multi, to_plot),
+                    use_container_width=True, theme="streamlit", key=None, on_select="ignore")
 
 st.subheader('Average return in each period')
 summary_data = summary_data.reset_index().set_index(['BT', 'OECD_CH']).unstack('BT')
@@ -85,7 +63,9 @@ st.dataframe(summary_data.style.format('{:.2f}%'), use_container_width=True)
 
 picks = ['favour', 'avoid']
 pick = st.radio('Type', picks, horizontal=True)
-st.plotly_chart(pt.plot_summary(summary_data, pick))
+with ins.stage('st.plotly_chart'):
+    st.plotly_chart(fc.cached_figure(fc.figure_key('plot_summary', selected_regime, selected_bt, 'ALL', pick),
+                                     pt.plot_summary, summary_data, pick))
 
 st.subheader('Average return in each period (prior 2023)')
 summary_data_p1 = summary_data_p1.reset_index().set_index(['BT', 'OECD_CH']).unstack('BT')
@@ -94,7 +74,9 @@ summary_data_p1 = ((summary_data_p1*100).transpose())
 st.dataframe(summary_data_p1.style.format('{:.2f}%'), use_container_width=True)
 
 pick_p1 = st.radio('Type 1', picks, horizontal=True)
-st.plotly_chart(pt.plot_summary(summary_data_p1, pick_p1))
+with ins.stage('st.plotly_chart'):
+    st.plotly_chart(fc.cached_figure(fc.figure_key('plot_summary', selected_regime, selected_bt, 'Prior 2023', pick_p1),
+                                     pt.plot_summary, summary_data_p1, pick_p1))
 
 st.subheader('Average return in each period (2023 onwards)')
 summary_data_p2 = summary_data_p2.reset_index().set_index(['BT', 'OECD_CH']).unstack('BT')
@@ -103,7 +85,9 @@ summary_data_p2 = ((summary_data_p2*100).transpose())
 st.dataframe(summary_data_p2.style.format('{:.2f}%'), use_container_width=True)
 
 pick_p2 = st.radio('Type 2', picks, horizontal=True)
-st.plotly_chart(pt.plot_summary(summary_data_p2, pick_p2))
+with ins.stage('st.plotly_chart'):
+    st.plotly_chart(fc.cached_figure(fc.figure_key('plot_summary', selected_regime, selected_bt, '2023 onwards', pick_p2),
+                                     pt.plot_summary, summary_data_p2, pick_p2))
 
 stats_data.reset_index(inplace=True, names=['metrics'])
 stats_data.set_index(['BT','metrics'], inplace=True)
@@ -142,4 +126,15 @@ with col2_a:
     f2 = stats_data_p2[['Avoid']].unstack('metrics')
     f2 = f2.droplevel(0, axis=1)
     mkt2 = stats_data_p2[['Market']].loc[selected_bt[0]].T
-    st.dataframe(pd.concat([f2, mkt2]))
\ No newline at end of file
+    st.dataframe(pd.concat([f2, mkt2]))
+
+st.subheader('Significance')
+if st.checkbox('Test against shuffled regime labels'):
+    block = st.radio('Shuffle', ['episode', 'month'], horizontal=True)
+    significance = sg.significance(selections, regime, industry_return, block=block).set_index(['BT', 'OECD_CH', 'leg'])
+    st.caption(f'{sg.RESAMPLES:,} shuffles of the OECD_CH {block}s; p-value of doing at least as well as the '
+               f'observed mean, 95% bootstrap interval.')
+    st.dataframe(significance.style.format({'observed': '{:.2%}', 'null_mean': '{:.2%}', 'p_value': '{:.4f}',
+                                            'ci_low': '{:.2%}', 'ci_high': '{:.2%}'}), use_container_width=True)
+
+ins.panel()
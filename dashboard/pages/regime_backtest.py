@@ -1,91 +1,89 @@
 import streamlit as st
-import pandas as pd
 import datahandler as dh
 import backtest as bt
-import quantstats as qs
 import plots as pt
+import figcache as fc
+import instrument as ins
 
-df = dh.get_constituents()
-df['date'] = pd.to_datetime(df['date']).dt.date
+ins.begin(__file__)
 
-selected_regime = st.selectbox('Regime config', dh.REGIME_FILE_OPTION)
+selected_regime = st.selectbox('Regime config', dh.regime_options())
 regime = dh.get_regime(selected_regime)
 
-selected_bt = st.selectbox('Backtest config', dh.INDUSTRY_GROUPS_OPTION)
+selected_bt = st.selectbox('Backtest config', dh.selection_options())
 selected_industry = dh.industry_group_selection(selected_bt)
-industry_return = dh.industry_return(df)
+industry_return = dh.get_return_panel('industry')
 
 st.subheader('Selection: ' + selected_bt)
 # selected_industry_style = selected_industry.style.map(lambda x: f"background-color: {'green' if x > 0 else 'red' if x < 0 else None}")
 st.dataframe(selected_industry.style.format('{:.1f}'))
-result_incl, result_excl, result_incl_ex_stag, result_excl_ex_stag, market = bt.run_backtest(selected_industry, regime, industry_return)
+result_incl, result_excl, result_incl_ex_stag, result_excl_ex_stag, market = bt.cached_backtest(selected_industry, regime, industry_return)
 
 st.subheader('Cumulative return')
-st.plotly_chart(pt.plot(result_incl.loc[result_incl.index >= '2005-11-01'], 
-                        result_excl.loc[result_excl.index >= '2005-11-01'], 
-                        market.loc[market.index >= '2005-11-01']), 
-                use_container_width=True, theme="streamlit", key=None, on_select="ignore")
+with ins.stage('st.plotly_chart'):
+    st.plotly_chart(fc.cached_figure(fc.figure_key('plot', selected_regime, [selected_bt], '2005-11-01'), pt.plot,
+                                     result_incl.loc[result_incl.index >= '2005-11-01'], 
+                                     result_excl.loc[result_excl.index >= '2005-11-01'], 
+                                     market.loc[market.index >= '2005-11-01']), 
+                    use_container_width=True, theme="streamlit", key=None, on_select="ignore")
 
 st.subheader('Cumulative return (ex Stagflation)')
-st.plotly_chart(pt.plot(result_incl_ex_stag.loc[result_incl_ex_stag.index >= '2005-11-01'], 
-                        result_excl_ex_stag.loc[result_excl_ex_stag.index >= '2005-11-01'], 
-                        market.loc[market.index >= '2005-11-01']), 
-                use_container_width=True, theme="streamlit", key=None, on_select="ignore")
+with ins.stage('st.plotly_chart'):
+    st.plotly_chart(fc.cached_figure(fc.figure_key('plot ex stag', selected_regime, [selected_bt], '2005-11-01'), pt.plot,
+                                     result_incl_ex_stag.loc[result_incl_ex_stag.index >= '2005-11-01'], 
+                                     result_excl_ex_stag.loc[result_excl_ex_stag.index >= '2005-11-01'], 
+                                     market.loc[market.index >= '2005-11-01']), 
+                    use_container_width=True, theme="streamlit", key=None, on_select="ignore")
+
+windows = dict(bt.WINDOWS, **{'Up to 2023': (None, '2023-01-01')})
+summaries, stats = bt.evaluate_windows(result_incl, result_excl, market, windows)
+_, stats_ex_stag = bt.evaluate_windows(result_incl_ex_stag, result_excl_ex_stag, market, windows)
 
 s_col1, s_col2 = st.columns(2)
 with s_col1:
     st.write('Average return in each period (Prior 2023)')
-    summary1 = bt.summary_table(result_incl.loc[result_incl.index < '2023-01-01'], result_excl.loc[result_excl.index < '2023-01-01'], market.loc[market.index < '2023-01-01'])
-    st.dataframe((summary1*100).style.format('{:.2f}%'))
+    st.dataframe((summaries['Up to 2023']*100).style.format('{:.2f}%'))
 with s_col2:
     st.write('Average return in each period (2023 onwards)')
-    summary2 = bt.summary_table(result_incl.loc[result_incl.index >= '2023-01-01'], result_excl.loc[result_excl.index >= '2023-01-01'], market.loc[market.index >= '2023-01-01'])
-    st.dataframe((summary2*100).style.format('{:.2f}%'))
+    st.dataframe((summaries['2023 onwards']*100).style.format('{:.2f}%'))
 
 st.write('Backtest stats')
 col1, col2, col3 = st.columns(3)
 with col1:
     st.write('ALL')
-    st.dataframe(bt.bt_stats(result_incl.loc[result_incl.index >= '2005-11-01'],
-                result_excl.loc[result_excl.index >= '2005-11-01'],
-                market.loc[market.index >= '2005-11-01']))
+    st.dataframe(stats['ALL'])
 
 with col2:
     st.write('Prior 2023')
-    st.dataframe(bt.bt_stats(result_incl.loc[(result_incl.index >= '2005-11-01') & (result_incl.index < '2023-01-01')],
-                result_excl.loc[(result_excl.index >= '2005-11-01') & (result_excl.index < '2023-01-01')],
-                market.loc[(market.index >= '2005-11-01') & (market.index < '2023-01-01')]))
+    st.dataframe(stats['Prior 2023'])
 
 with col3:
     st.write('2023 onwards')
-    st.dataframe(bt.bt_stats(result_incl.loc[(result_incl.index >= '2023-01-01')],
-                result_excl.loc[(result_excl.index >= '2023-01-01')],
-                market.loc[(market.index >= '2023-01-01')]))
+    st.dataframe(stats['2023 onwards'])
 
 st.write('Backtest stats (ex Stag)')
 ex_col1, ex_col2, ex_col3 = st.columns(3)
 with ex_col1:
     st.write('ALL')
-    st.dataframe(bt.bt_stats(result_incl_ex_stag.loc[result_incl_ex_stag.index >= '2005-11-01'],
-                result_excl_ex_stag.loc[result_excl_ex_stag.index >= '2005-11-01'],
-                market.loc[market.index >= '2005-11-01']))
+    st.dataframe(stats_ex_stag['ALL'])
 
 with ex_col2:
     st.write('Prior 2023')
-    st.dataframe(bt.bt_stats(result_incl_ex_stag.loc[(result_incl_ex_stag.index >= '2005-11-01') & (result_incl_ex_stag.index < '2023-01-01')],
-                result_excl_ex_stag.loc[(result_excl_ex_stag.index >= '2005-11-01') & (result_excl_ex_stag.index < '2023-01-01')],
-                market.loc[(market.index >= '2005-11-01') & (market.index < '2023-01-01')]))
+    st.dataframe(stats_ex_stag['Prior 2023'])
 
 with ex_col3:
     st.write('2023 onwards')
-    st.dataframe(bt.bt_stats(result_incl_ex_stag.loc[(result_incl_ex_stag.index >= '2023-01-01')],
-                result_excl_ex_stag.loc[(result_excl_ex_stag.index >= '2023-01-01')],
-                market.loc[(market.index >= '2023-01-01')]))
+    st.dataframe(stats_ex_stag['2023 onwards'])
 
+# served as cached png, so quantstats is only imported when a heatmap has to be drawn
 st.subheader('Favour monthly return')
-fig = qs.plots.monthly_returns(result_incl.loc[result_incl.index >= '2000-11-01']['favour_mean'], compounded=False, show=False)
-st.pyplot(fig)
+fig = fc.cached_figure(fc.figure_key('monthly favour', selected_regime, [selected_bt], '2000-11-01'), pt.monthly_returns,
+                       result_incl.loc[result_incl.index >= '2000-11-01']['favour_mean'], kind='pyplot')
+st.image(fig, width='stretch')
 
 st.subheader('Avoid monthly return')
-fig_avoid = qs.plots.monthly_returns(result_excl.loc[result_excl.index >= '2000-11-01']['avoid_mean'], compounded=False, show=False)
-st.pyplot(fig_avoid)
+fig_avoid = fc.cached_figure(fc.figure_key('monthly avoid', selected_regime, [selected_bt], '2000-11-01'), pt.monthly_returns,
+                             result_excl.loc[result_excl.index >= '2000-11-01']['avoid_mean'], kind='pyplot')
+st.image(fig_avoid, width='stretch')
+
+ins.panel()
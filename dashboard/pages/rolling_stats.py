@@ -0,0 +1,42 @@
+import streamlit as st
+import datahandler as dh
+import backtest as bt
+import plotly.express as px
+import instrument as ins
+
+ins.begin(__file__)
+
+WINDOW_OPTIONS = {'12M': 12, '36M': 36, 'Expanding': None}
+METRICS = {'sharpe': 'Sharpe', 'volatility': 'Volatility', 'drawdown': 'Drawdown', 'mdd': 'Max drawdown'}
+
+selected_regime = st.selectbox('Regime config', dh.regime_options())
+regime = dh.get_regime(selected_regime)
+
+selected_bt = st.selectbox('Backtest config', dh.selection_options())
+selected_industry = dh.industry_group_selection(selected_bt)
+industry_return = dh.get_return_panel('industry')
+
+window = st.radio('Window', list(WINDOW_OPTIONS), horizontal=True)
+ex_stag = st.checkbox('ex Stagflation')
+
+result_incl, result_excl, result_incl_ex_stag, result_excl_ex_stag, market = bt.cached_backtest(selected_industry, regime, industry_return)
+if ex_stag:
+    result_incl, result_excl = result_incl_ex_stag, result_excl_ex_stag
+stats = bt.rolling_bt_stats(result_incl.loc[result_incl.index >= '2005-11-01'],
+                            result_excl.loc[result_excl.index >= '2005-11-01'],
+                            market.loc[market.index >= '2005-11-01'],
+                            WINDOW_OPTIONS[window])
+
+for metric, title in METRICS.items():
+    st.subheader(f'{title} ({window})')
+    fig = px.line(stats.loc[metric])
+    fig.update_layout(legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=1.02,
+        xanchor="right",
+        x=1
+    ))
+    st.plotly_chart(fig, use_container_width=True, theme="streamlit", key=None, on_select="ignore")
+
+ins.panel()
@@ -1,16 +1,15 @@
 import streamlit as st
-import pandas as pd
 import datahandler as dh
 import plotly.express as px
+import instrument as ins
+
+ins.begin(__file__)
 
 SECTOR = ['Communication Services','Consumer Discretionary','Consumer Staples','Energy','Financials','Health Care','Industrials','Information Technology','Materials','Real Estate','Utilities']
 INDUSTRY = ['Automobiles & Components', 'Banks', 'Capital Goods', 'Commercial & Professional Services', 'Consumer Discretionary Distribution & Retail', 'Consumer Durables & Apparel', 'Consumer Services', 'Consumer Staples Distribution & Retail', 'Energy', 'Equity Real Estate Investment Trusts (REITs)', 'Financial Services', 'Food Beverage & Tobacco', 'Health Care Equipment & Services', 'Household & Personal Products', 'Insurance', 'Materials', 'Media', 'Pharmaceuticals, Biotechnology & Life Sciences', 'Semiconductors & Semiconductor Equipment', 'Software & Services', 'Technology Hardware & Equipment', 'Telecommunication Services', 'Transportation', 'Utilities', ]
 
-df = dh.get_constituents()
-df['date'] = pd.to_datetime(df['date']).dt.date
-
-sector_return = dh.sector_return(df)
-industry_return = dh.industry_return(df)
+sector_return = dh.get_return_panel('sector')
+industry_return = dh.get_return_panel('industry')
 
 cum_ret = (1 + sector_return['cap_weighted_ret'].unstack('sector')).cumprod()
 fig = px.line(cum_ret)
@@ -47,3 +46,5 @@ with col1:
 with col2:
     st.subheader('By industry')
     st.dataframe(industry_return['count'].unstack('industry_adj').mean(), use_container_width=True)
+
+ins.panel()
@@ -1,15 +1,16 @@
 import streamlit as st
 import pandas as pd
 import datahandler as dh
+import query
 import plotly.express as px
+import instrument as ins
+
+ins.begin(__file__)
 
 SECTOR = ['Communication Services','Consumer Discretionary','Consumer Staples','Energy','Financials','Health Care','Industrials','Information Technology','Materials','Real Estate','Utilities']
 INDUSTRY = ['Automobiles & Components', 'Banks', 'Capital Goods', 'Commercial & Professional Services', 'Consumer Discretionary Distribution & Retail', 'Consumer Durables & Apparel', 'Consumer Services', 'Consumer Staples Distribution & Retail', 'Energy', 'Equity Real Estate Investment Trusts (REITs)', 'Financial Services', 'Food Beverage & Tobacco', 'Health Care Equipment & Services', 'Household & Personal Products', 'Insurance', 'Materials', 'Media', 'Pharmaceuticals, Biotechnology & Life Sciences', 'Semiconductors & Semiconductor Equipment', 'Software & Services', 'Technology Hardware & Equipment', 'Telecommunication Services', 'Transportation', 'Utilities', ]
 
-df = dh.get_constituents()
-df['date'] = pd.to_datetime(df['date']).dt.date
-
-universe_returns = dh.universe_return(df)
+universe_returns = dh.get_return_panel('universe')
 cum_ret = (1 + universe_returns['cap_weighted_ret']).cumprod()
 fig = px.line(cum_ret)
 fig.update_layout(legend=dict(
@@ -23,7 +24,7 @@ fig.update_layout(legend=dict(
 st.header('Universe return')
 st.plotly_chart(fig, use_container_width=True, theme="streamlit", key=None, on_select="ignore")
 
-country_returns = dh.universe_return_by_country(df)
+country_returns = dh.get_return_panel('country')
 cum_ret_ctry = (1 + country_returns['cap_weighted_ret'].unstack('country')).cumprod()
 fig_ctry = px.line(cum_ret_ctry)
 fig_ctry.update_layout(legend=dict(
@@ -37,23 +38,31 @@ fig_ctry.update_layout(legend=dict(
 st.header('Country return')
 st.plotly_chart(fig_ctry, use_container_width=True, theme="streamlit", key=None, on_select="ignore")
 
-stock_count = df.groupby(['date', 'country'])['country'].count().unstack('country')
+stock_count = country_returns['count'].unstack('country')
 fig_count = px.bar(stock_count)
 st.header('No of stock')
 st.plotly_chart(fig_count, use_container_width=True, theme="streamlit", key=None, on_select="ignore")
 
-df = df[['date', 'home_code', 'sector', 'industry_adj', 'MCAP_LOCAL']]
-df.rename(columns={'date': 'Date', 'home_code': 'Ticker', 'sector': 'Sector', 'industry_adj': 'Industry', 'MCAP_LOCAL': 'Market Cap (local $)'}, inplace = True)
+PAGE_SIZE = 1000
+
+index = query.get_index(['date', 'home_code', 'sector', 'industry_adj', 'MCAP_LOCAL'], ['sector', 'industry_adj'])
+first, last = pd.Timestamp(index['dates'][0]).date(), pd.Timestamp(index['dates'][-1]).date()
 
 col1, col2 = st.columns(2)
 with col1:
-    sdate = st.date_input('Start date', min_value=df['Date'].min(), max_value=df['Date'].max())
+    sdate = st.date_input('Start date', min_value=first, max_value=last)
 with col2:
-    edate = st.date_input('End date', min_value=df['Date'].min(), max_value=df['Date'].max())
+    edate = st.date_input('End date', min_value=first, max_value=last)
 
 selected_sector = st.multiselect('Sector', SECTOR, default=SECTOR)
 selected_industry = st.multiselect('Industry', INDUSTRY, default=INDUSTRY)
 
-filtered_df = df[(df['Date'] >= sdate) & (df['Date'] <= edate) & ((df['Sector'].isin(selected_sector)) | (df['Industry'].isin(selected_industry)))]
+rows = query.select(index, sdate, edate, {'sector': selected_sector, 'industry_adj': selected_industry})
+pages = max(1, -(-len(rows) // PAGE_SIZE))
+page_no = st.number_input(f'Page (of {pages:,}, {len(rows):,} rows)', min_value=1, max_value=pages, value=1)
+
+df = query.page(index, rows, page_no, PAGE_SIZE)
+df = df.rename(columns={'date': 'Date', 'home_code': 'Ticker', 'sector': 'Sector', 'industry_adj': 'Industry', 'MCAP_LOCAL': 'Market Cap (local $)'})
+st.dataframe(df, hide_index=True, use_container_width=True, column_config={'Date': st.column_config.DateColumn()})
 
-st.dataframe(filtered_df, hide_index=True, use_container_width=True)
+ins.panel()
@@ -0,0 +1,26 @@
+import os
+
+# data and cache locations, kept apart from datahandler so modules that must stay free of its
+# streamlit import (backtest, instrument) share the same folders
+DATA_FOLDER = './dashboard/data/'
+CACHE_FOLDER = DATA_FOLDER + 'cache/'
+
+def evict_lru(folder: str, budget: int, suffixes: tuple):
+    # drop the least recently used files ending in suffixes until they fit budget bytes; cache hits
+    # refresh the mtime. Files another process removes meanwhile are skipped
+    files = []
+    for entry in os.scandir(folder):
+        if entry.name.endswith(suffixes):
+            try:
+                files.append((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path))
+            except FileNotFoundError:
+                pass
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= budget:
+            break
+        total -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,6 +1,8 @@
-import plotly.graph_objects as go
-import plotly.express as px
+import numpy as np
 import pandas as pd
+import instrument as ins
+
+# plotly is imported inside the plot functions so importing this module stays cheap
 
 COLOUR_MAP = {
     'Stagflation': '#E6A8D7',  # Pastel Orchid
@@ -9,7 +11,10 @@ COLOUR_MAP = {
     'Recovery': '#F4C7A1',  # Pastel Peach
 }
 
+@ins.timed
 def plot_summary(summary_data, pick):
+    import plotly.graph_objects as go
+
     cols = summary_data.columns
     s2 = summary_data.loc[pick]
     mkt = summary_data.loc['market']
@@ -47,66 +52,88 @@ def plot_summary(summary_data, pick):
     )
     return fig
 
-def plot_multi(to_plot):
-    fig = px.line(to_plot, x='date' , y='value', color='label')
-
-    # Apply background color dynamically based on OECD_CH values
-    legend_patches = []
-    seen_colors = set()  # To track which colors have already been added to the legend
-
-    # Apply background color dynamically based on OECD_CH values
-    previous_oecd_value = None
-    start_date = None
-
-    cycle = to_plot[to_plot['label'] == 'market']
-    cycle.set_index('date', inplace=True)
-    for date in cycle.index:
-        oecd_value = cycle.loc[date, 'OECD_CH']  # Get the OECD_CH value at each date
-        if oecd_value != previous_oecd_value:
-            if start_date is not None:
-                # Add a 'rect' shape for background coloring in Plotly
-                bg_color = COLOUR_MAP.get(previous_oecd_value, 'white')
-                fig.add_shape(type="rect", 
-                            x0=start_date, x1=date, 
-                            y0=0, y1=1, 
-                            xref="x", yref="paper", 
-                            fillcolor=bg_color, opacity=0.3,
-                            line=dict(color='rgba(0,0,0,0)', width=0))
-
-                # Create a dummy trace for the background color to appear in the legend, if not already added
-                if bg_color not in seen_colors:
-                    legend_patches.append(go.Scatter(
-                        x=[None], y=[None], mode='markers',
-                        marker=dict(color=bg_color, size=10),
-                        name=f"OECD_CH {previous_oecd_value}"  # Add to legend
-                    ))
-                    seen_colors.add(bg_color)  # Mark the color as seen
-
-            start_date = date  # Update the start date for the new period
-        previous_oecd_value = oecd_value
-
-    # Ensure the last region gets colored for background color
-    if previous_oecd_value is not None:
-        bg_color = COLOUR_MAP.get(previous_oecd_value, 'white')
-        fig.add_shape(type="rect", 
-                    x0=start_date, x1=cycle.index[-1], 
-                    y0=0, y1=1, 
-                    xref="x", yref="paper", 
-                    fillcolor=bg_color, opacity=0.3,
-                            line=dict(color='rgba(0,0,0,0)', width=0))
-
-        # Create a dummy trace for the last background color to appear in the legend, if not already added
-        if bg_color not in seen_colors:
-            legend_patches.append(go.Scatter(
-                x=[None], y=[None], mode='markers',
-                marker=dict(color=bg_color, size=10),
-                name=f"{previous_oecd_value}"  # Add to legend
-            ))
-            seen_colors.add(bg_color)  # Mark the color as seen
-
-    # Add the dummy traces for background color to the figure to show in the legend
-    fig.add_traces(legend_patches)
+@ins.timed
+def monthly_returns(returns):
+    # quantstats pulls in matplotlib/seaborn/scipy, so it is only loaded when a heatmap is drawn
+    import quantstats as qs
+    return qs.plots.monthly_returns(returns, compounded=False, show=False)
+
+def regime_bands(labels: pd.Series) -> pd.DataFrame:
+    # run-length encode the regime labels into (start, end, OECD_CH) bands; a band ends where the
+    # next one starts and the last one at the final date
+    values = labels.to_numpy()
+    change = np.ones(len(values), dtype=bool)
+    change[1:] = values[1:] != values[:-1]
+    starts = np.flatnonzero(change)
+    ends = np.append(starts[1:], len(values) - 1)[:len(starts)]
+    return pd.DataFrame({'start': labels.index[starts], 'end': labels.index[ends], 'OECD_CH': values[starts]})
+
+def band_shapes(bands: pd.DataFrame) -> list:
+    return [
+        dict(type="rect", x0=start, x1=end, y0=0, y1=1, xref="x", yref="paper",
+             fillcolor=COLOUR_MAP.get(label, 'white'), opacity=0.3,
+             line=dict(color='rgba(0,0,0,0)', width=0))
+        for start, end, label in bands.itertuples(index=False)
+    ]
+
+def band_traces(bands: pd.DataFrame) -> list:
+    # one filled trace per regime on a hidden 0-1 axis, its rectangles separated by gaps
+    import plotly.graph_objects as go
+
+    traces = []
+    for label, group in bands.groupby('OECD_CH', sort=False, dropna=False):
+        n = len(group)
+        x = np.column_stack([group['start'], group['start'], group['end'], group['end'], np.full(n, None)]).ravel()
+        traces.append(go.Scatter(
+            x=x, y=np.tile([0, 1, 1, 0, None], n), yaxis='y2',
+            mode='none', fill='toself', fillcolor=COLOUR_MAP.get(label, 'white'), opacity=0.3,
+            hoverinfo='skip', name=f"OECD_CH {label}"
+        ))
+    return traces
+
+def add_regime_bands(fig, labels: pd.Series, bands: str = 'shapes'):
+    # background colour by OECD_CH, either as one batch of layout shapes (with legend-only marker
+    # traces) or as one filled trace per regime
+    import plotly.graph_objects as go
+
+    runs = regime_bands(labels)
+    if bands == 'trace':
+        fig.add_traces(band_traces(runs))
+        fig.update_layout(yaxis2=dict(range=[0, 1], overlaying='y', visible=False))
+        return fig
+
+    fig.update_layout(shapes=band_shapes(runs))
+    # Create a dummy trace for each background color to appear in the legend
+    fig.add_traces([
+        go.Scatter(x=[None], y=[None], mode='markers',
+                   marker=dict(color=COLOUR_MAP.get(label, 'white'), size=10),
+                   name=f"OECD_CH {label}")
+        for label in runs['OECD_CH'].unique()
+    ])
+    return fig
 
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int = None):
+    # min/max decimation: the first and last point plus the lowest and highest of each bucket,
+    # so peaks and troughs survive
+    n = len(y)
+    if max_points is None or n <= max_points:
+        return x, y
+    values = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    bucket = valid * max(max_points // 2 - 1, 1) // n
+    # sorted by bucket then value, each bucket's first entry is its minimum and its last the maximum
+    order = valid[np.lexsort((values[valid], bucket))]
+    bounds = np.flatnonzero(np.diff(bucket, prepend=-1, append=-1))
+    keep = np.unique(np.concatenate([[0, n - 1], order[bounds[:-1]], order[bounds[1:] - 1]]))
+    return np.asarray(x)[keep], np.asarray(y)[keep]
+
+def line(x, y, name: str, max_points: int = None):
+    import plotly.graph_objects as go
+
+    x, y = downsample(np.asarray(x), np.asarray(y), max_points)
+    return go.Scattergl(x=x, y=y, mode='lines', name=name)
+
+def _layout(fig):
     # Add title and labels
     fig.update_layout(
         xaxis_title="Date",
@@ -119,91 +146,35 @@ def plot_multi(to_plot):
             x=1
         )
     )
-
     return fig
 
-def plot(result_incl, result_excl, market):
-    fig = go.Figure()
-
-    # Add the first line plot (Favour, Avoid, and Market) for the first subplot
-    fig.add_trace(go.Scatter(x=result_incl.loc[result_incl.index >= '2005-11-01'].index, 
-                            y=result_incl.loc[result_incl.index >= '2005-11-01']['favour_mean'].cumsum(),
-                            mode='lines', name='Favour'))
+@ins.timed
+def plot_multi(to_plot, bands: str = 'shapes', max_points: int = None):
+    import plotly.graph_objects as go
 
-    fig.add_trace(go.Scatter(x=result_excl.loc[result_excl.index >= '2005-11-01'].index, 
-                            y=result_excl.loc[result_excl.index >= '2005-11-01']['avoid_mean'].cumsum(),
-                            mode='lines', name='Avoid'))
+    fig = go.Figure()
+    for label, series in to_plot.groupby('label', sort=False):
+        fig.add_trace(line(series['date'], series['value'], label, max_points))
 
-    fig.add_trace(go.Scatter(x=market.loc[market.index >= '2005-11-01'].index, 
-                            y=market.loc[market.index >= '2005-11-01'].cumsum(),
-                            mode='lines', name='Market'))  
-    
     # Apply background color dynamically based on OECD_CH values
-    legend_patches = []
-    seen_colors = set()  # To track which colors have already been added to the legend
+    cycle = to_plot[to_plot['label'] == 'market'].set_index('date')['OECD_CH']
+    add_regime_bands(fig, cycle, bands)
+    return _layout(fig)
 
-    # Apply background color dynamically based on OECD_CH values
-    previous_oecd_value = None
-    start_date = None
-
-    for date in result_incl.index:
-        oecd_value = result_incl.loc[date, 'OECD_CH']  # Get the OECD_CH value at each date
-        if oecd_value != previous_oecd_value:
-            if start_date is not None:
-                # Add a 'rect' shape for background coloring in Plotly
-                bg_color = COLOUR_MAP.get(previous_oecd_value, 'white')
-                fig.add_shape(type="rect", 
-                            x0=start_date, x1=date, 
-                            y0=0, y1=1, 
-                            xref="x", yref="paper", 
-                            fillcolor=bg_color, opacity=0.3,
-                            line=dict(color='rgba(0,0,0,0)', width=0))
-
-                # Create a dummy trace for the background color to appear in the legend, if not already added
-                if bg_color not in seen_colors:
-                    legend_patches.append(go.Scatter(
-                        x=[None], y=[None], mode='markers',
-                        marker=dict(color=bg_color, size=10),
-                        name=f"OECD_CH {previous_oecd_value}"  # Add to legend
-                    ))
-                    seen_colors.add(bg_color)  # Mark the color as seen
-
-            start_date = date  # Update the start date for the new period
-        previous_oecd_value = oecd_value
-
-    # Ensure the last region gets colored for background color
-    if previous_oecd_value is not None:
-        bg_color = COLOUR_MAP.get(previous_oecd_value, 'white')
-        fig.add_shape(type="rect", 
-                    x0=start_date, x1=result_incl.index[-1], 
-                    y0=0, y1=1, 
-                    xref="x", yref="paper", 
-                    fillcolor=bg_color, opacity=0.3,
-                            line=dict(color='rgba(0,0,0,0)', width=0))
-
-        # Create a dummy trace for the last background color to appear in the legend, if not already added
-        if bg_color not in seen_colors:
-            legend_patches.append(go.Scatter(
-                x=[None], y=[None], mode='markers',
-                marker=dict(color=bg_color, size=10),
-                name=f"{previous_oecd_value}"  # Add to legend
-            ))
-            seen_colors.add(bg_color)  # Mark the color as seen
-
-    # Add the dummy traces for background color to the figure to show in the legend
-    fig.add_traces(legend_patches)
+@ins.timed
+def plot(result_incl, result_excl, market, bands: str = 'shapes', max_points: int = None):
+    import plotly.graph_objects as go
 
-    # Add title and labels
-    fig.update_layout(
-        xaxis_title="Date",
-        yaxis_title="Cum Sum Return",
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        )
-    )
+    favour = result_incl.loc[result_incl.index >= '2005-11-01', 'favour_mean'].cumsum()
+    avoid = result_excl.loc[result_excl.index >= '2005-11-01', 'avoid_mean'].cumsum()
+    market = market.loc[market.index >= '2005-11-01'].cumsum()
 
-    return fig
+    fig = go.Figure()
+    # Favour, Avoid and Market cumulative returns
+    fig.add_trace(line(favour.index, favour, 'Favour', max_points))
+    fig.add_trace(line(avoid.index, avoid, 'Avoid', max_points))
+    fig.add_trace(line(market.index, market, 'Market', max_points))
+
+    # Apply background color dynamically based on OECD_CH values
+    add_regime_bands(fig, result_incl['OECD_CH'], bands)
+    return _layout(fig)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import datahandler as dh
+import instrument as ins
+
+# Range and membership queries over the constituents without scanning the frame: rows are sorted by
+# date, so a date range is a slice found with searchsorted, and each label of an indexed column keeps
+# the sorted positions of its rows, so membership only touches the matching rows.
+
+def build_index(df: pd.DataFrame, columns: list) -> dict:
+    # stable sort keeps the stored order within a date
+    frame = df.sort_values('date', kind='stable', ignore_index=True)
+    positions = {}
+    for column in columns:
+        labels = frame[column].astype('category')
+        codes = labels.cat.codes.to_numpy()
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(labels.cat.categories) + 1))
+        positions[column] = {label: order[bounds[i]:bounds[i + 1]]
+                             for i, label in enumerate(labels.cat.categories) if bounds[i + 1] > bounds[i]}
+    return {'frame': frame, 'dates': frame['date'].to_numpy(), 'positions': positions}
+
+@ins.cache_resource
+def load_index(version: str, columns: tuple, indexed: tuple) -> dict:
+    # one index per data version, shared by every session rather than copied into each
+    return build_index(dh.load_constituents(version, list(columns)), list(indexed))
+
+def get_index(columns: list, indexed: list) -> dict:
+    return load_index(dh.ingest_constituents(), tuple(columns), tuple(indexed))
+
+@ins.timed
+def select(index: dict, start=None, end=None, any_of: dict = None) -> np.ndarray:
+    # positions of the rows dated within [start, end] whose label is in any_of[column] for at least
+    # one of the columns (all rows in the range if any_of is empty)
+    dates = index['dates']
+    lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), 'left')
+    hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), 'right')
+    if hi <= lo:
+        return np.arange(0)
+    if not any_of:
+        return np.arange(lo, hi)
+
+    mask = np.zeros(hi - lo, dtype=bool)
+    for column, labels in any_of.items():
+        positions = index['positions'][column]
+        if set(positions) <= set(labels):
+            # every label of the column is picked, so the union is the whole range
+            return np.arange(lo, hi)
+        for label in labels:
+            rows = positions.get(label)
+            if rows is None:
+                continue
+            rows = rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)]
+            mask[rows - lo] = True
+    return lo + np.flatnonzero(mask)
+
+def page(index: dict, rows: np.ndarray, number: int, size: int) -> pd.DataFrame:
+    # rows of page `number` (from 1) of a selection
+    return index['frame'].iloc[rows[(number - 1) * size:number * size]]
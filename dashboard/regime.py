@@ -0,0 +1,79 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from pandas.tseries.offsets import MonthEnd
+import datahandler as dh
+import clock
+
+# clock quadrant -> regime label, as used in the OECD_CH column of the regime files
+REGIMES = {
+    (True, False): 'Recovery',     # OECD above its MA, CPI below
+    (True, True): 'Overheat',      # both above
+    (False, True): 'Stagflation',  # OECD below, CPI above
+    (False, False): 'Reccesion',   # both below
+}
+
+def classify(dist_cpi: np.ndarray, dist_oecd: np.ndarray) -> np.ndarray:
+    growth = np.asarray(dist_oecd) > 0
+    inflation = np.asarray(dist_cpi) > 0
+    labels = np.array([REGIMES[(False, False)], REGIMES[(False, True)], REGIMES[(True, False)], REGIMES[(True, True)]])
+    return labels[2 * growth + inflation]
+
+def regime_name(region: str, cpi: str, lookback: int, freq: str, zscore: bool) -> str:
+    return f"{dh.REGIME_FOLDER}{region} {cpi} & OECD_CH ({lookback}M {freq}{' zscore' if zscore else ''})"
+
+def derive_regime(econ: pd.DataFrame, cpi: str, lookback: int, freq: str, zscore: bool) -> pd.DataFrame:
+    # OECD_CH per period end from one region's econ data, in the shape get_regime returns
+    df = clock.clock_data(econ, cpi, lookback, freq, zscore)
+    # only quarters whose months are all in: a quarter's row is never revised once appended
+    df = df.loc[:econ.index.max() + MonthEnd(0), ['dist_CPI', 'dist_OECD']].dropna()
+    periods = pd.DataFrame({'OECD_CH': classify(df['dist_CPI'], df['dist_OECD'])},
+                           index=pd.DatetimeIndex(df.index + MonthEnd(0), name='date'))
+    return periods
+
+def update_regime(region: str, cpi: str, lookback: int, freq: str, zscore: bool) -> int:
+    # (re)generate one regime file, appending only periods after its last row; returns rows written
+    econ = dh.get_econ_panel().loc[region]
+    file = dh.DATA_FOLDER + regime_name(region, cpi, lookback, freq, zscore) + '.csv'
+    if os.path.exists(file):
+        last = pd.to_datetime(pd.read_csv(file)['Period'], format='%d/%m/%Y').max()
+        new = econ.index + MonthEnd(0) > last
+        if not new.any():
+            return 0
+        # derived from the whole history rather than a trailing slice: the rolling means and
+        # z-scores depend in the last bits on where they start, which can flip a distance of 0
+        periods = derive_regime(econ, cpi, lookback, freq, zscore)
+        periods = periods[periods.index > last]
+        mode, header = 'a', False
+    else:
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        periods = derive_regime(econ, cpi, lookback, freq, zscore)
+        mode, header = 'w', True
+
+    periods = periods.reset_index().rename(columns={'date': 'Period'})
+    periods['Period'] = periods['Period'].dt.strftime('%d/%m/%Y')
+    periods.to_csv(file, mode=mode, header=header, index=False)
+    return len(periods)
+
+def update_all(regions: list = None, zscores: tuple = (False, True)) -> dict:
+    written = {}
+    for region in regions or dh.econ_regions():
+        for cpi in dh.ECON_CPI_OPTION:
+            for lookback in dh.ECON_LOOKBACK_OPTION:
+                for freq in dh.ECON_FREQUENCY_OPTION:
+                    for zscore in zscores:
+                        written[regime_name(region, cpi, lookback, freq, zscore)] = update_regime(region, cpi, lookback, freq, zscore)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate or extend OECD_CH regime files from the econ data.')
+    parser.add_argument('--region', action='append', help='region (repeatable, default: every *_econ_data.csv)')
+    args = parser.parse_args()
+    from streamlit.logger import set_log_level
+    set_log_level('error')
+    for name, rows in update_all(args.region).items():
+        print(f'{rows:4d} rows -> {name}')
+
+if __name__ == '__main__':
+    main()
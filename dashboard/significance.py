@@ -0,0 +1,149 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import backtest as bt
+import instrument as ins
+
+RESAMPLES = 10_000
+# resamples per array op; a batch's weights are regimes x months x BATCH floats
+BATCH = 1000
+LEGS = ['favour', 'avoid', 'spread']
+
+# Is a selection's favour/avoid return in a regime better than its picks earn in months chosen at
+# random? The permutation test shuffles the regime labels over the months (whole OECD_CH episodes
+# when block='episode', single months when block='month') and recomputes summary_table's per-regime
+# means; the bootstrap resamples episodes (or months) within each regime for confidence intervals.
+# Both only reweight months, so every resample is one batched matmul of the legs each regime's
+# picks earn in every month against a (regime x month x resample) weight array.
+
+def regime_legs(selections: dict, periods: pd.DataFrame, returns: pd.DataFrame):
+    # favour/avoid leg means of every selection's picks for every regime in every month, as
+    # (regime x config*leg x month), with the observed regime codes and labels
+    indgp = bt.industry_matrix(returns)
+    regime = bt.monthly_periods(periods)['OECD_CH']
+    codes, labels = pd.factorize(regime, sort=True)
+    columns = list(indgp.columns)
+    ret = indgp.reindex(regime.index).to_numpy(dtype=float)
+    legs = []
+    for label in labels:
+        # every month treated as being in this regime
+        sel = np.stack([bt.selection_matrix(s, np.full(len(regime), label), columns) for s in selections.values()])
+        favour, avoid, _, _ = bt.apply_selection(sel, ret, regime.to_numpy())
+        favour, avoid = bt.leg_mean(favour), bt.leg_mean(avoid)
+        # avoid legs are already signed, so long favour / short avoid is their sum
+        legs.append(np.concatenate([favour, avoid, favour + avoid]))
+    return np.stack(legs), codes, list(labels)
+
+def episodes(codes: np.ndarray) -> np.ndarray:
+    # id of the run of equal regime codes each month belongs to
+    return np.concatenate([[0], np.cumsum(codes[1:] != codes[:-1])])
+
+def _units(codes: np.ndarray, block: str) -> np.ndarray:
+    if block == 'episode':
+        return episodes(codes)
+    if block == 'month':
+        return np.arange(len(codes))
+    raise ValueError(f'block must be episode or month, not {block!r}')
+
+def permuted_weights(codes: np.ndarray, block: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    # (regime x month x n) one-hot labels of n shuffles of the units, each keeping its length and label
+    unit = _units(codes, block)
+    lengths = np.bincount(unit)
+    unit_codes = codes[np.r_[0, np.cumsum(lengths)[:-1]]]
+    order = np.argsort(rng.random((n, len(lengths))), axis=1)
+    labels = np.repeat(unit_codes[order].ravel(), lengths[order].ravel()).reshape(n, len(codes))
+    return (labels.T[None] == np.arange(codes.max() + 1)[:, None, None]).astype(float)
+
+def bootstrap_weights(codes: np.ndarray, block: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    # (regime x month x n) times each month is drawn when each regime's units are resampled with
+    # replacement, as many units as the regime has
+    unit = _units(codes, block)
+    lengths = np.bincount(unit)
+    unit_codes = codes[np.r_[0, np.cumsum(lengths)[:-1]]]
+    draws = np.zeros((n, len(lengths)))
+    for k in np.unique(unit_codes[unit_codes >= 0]):
+        ids = np.flatnonzero(unit_codes == k)
+        picks = ids[rng.integers(0, len(ids), (n, len(ids)))]
+        draws += np.bincount((picks + len(lengths) * np.arange(n)[:, None]).ravel(),
+                             minlength=n * len(lengths)).reshape(n, len(lengths))
+    onehot = codes[:, None] == np.arange(codes.max() + 1)
+    return draws[:, unit].T[None] * onehot.T[:, :, None]
+
+def regime_means(legs: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # weighted mean of each regime's legs over the months, then over every month ('ALL'), as
+    # (regime + 1 x config*leg x resample)
+    sums = legs @ weights
+    counts = weights.sum(axis=1)[:, None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.concatenate([sums / counts, sums.sum(axis=0, keepdims=True) / counts.sum(axis=0, keepdims=True)])
+
+def _resample_batch(legs: np.ndarray, codes: np.ndarray, observed: np.ndarray, block: str, n: int, seed):
+    # exceedance counts and null sum of one batch of permutations, and one batch of bootstrap means
+    rng = np.random.default_rng(seed)
+    null = regime_means(legs, permuted_weights(codes, block, n, rng))
+    exceed = (null >= observed - 1e-12).sum(axis=2)
+    return exceed, null.sum(axis=2), regime_means(legs, bootstrap_weights(codes, block, n, rng)).astype(np.float32)
+
+@ins.timed
+def significance(selections: dict, periods: pd.DataFrame, returns: pd.DataFrame, resamples: int = RESAMPLES,
+                 block: str = 'episode', alpha: float = 0.05, seed: int = 0, workers: int = 1,
+                 batch: int = BATCH) -> pd.DataFrame:
+    # per selection, regime (and 'ALL') and leg: the summary_table mean, the mean under shuffled
+    # labels, the one-sided permutation p-value of doing at least as well, and a 1 - alpha bootstrap
+    # interval. Batches draw from their own seeds, so results do not depend on workers
+    legs, codes, labels = regime_legs(selections, periods, returns)
+    observed = regime_means(legs, (codes[:, None] == np.arange(len(labels))).T[:, :, None].astype(float))
+    sizes = [min(batch, resamples - start) for start in range(0, resamples, batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(legs, codes, observed, block, size, s) for size, s in zip(sizes, seeds)]
+    if workers <= 1:
+        batches = [_resample_batch(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            batches = list(pool.map(_resample_batch, *zip(*tasks)))
+
+    exceed = sum(b[0] for b in batches)
+    null_mean = sum(b[1] for b in batches) / resamples
+    boot = np.concatenate([b[2] for b in batches], axis=2)
+    low, high = np.nanquantile(boot, [alpha / 2, 1 - alpha / 2], axis=2)
+
+    # (regime + 1 x leg*config) -> rows by config, regime, leg
+    configs = list(selections)
+    shape = (len(labels) + 1, len(LEGS), len(configs))
+    columns = {'observed': observed[:, :, 0], 'null_mean': null_mean, 'p_value': (1 + exceed) / (1 + resamples),
+               'ci_low': low, 'ci_high': high}
+    index = pd.MultiIndex.from_product([configs, labels + ['ALL'], LEGS], names=['BT', 'OECD_CH', 'leg'])
+    return pd.DataFrame({name: values.reshape(shape).transpose(2, 0, 1).ravel() for name, values in columns.items()},
+                        index=index).reset_index()
+
+def main():
+    import datahandler as dh
+    parser = argparse.ArgumentParser(description='Permutation p-values and bootstrap intervals of the favour/avoid returns per regime.')
+    parser.add_argument('--regime', action='append', help='regime file name (repeatable, default: all)')
+    parser.add_argument('--selection', action='append', help='selection file name (repeatable, default: all)')
+    parser.add_argument('--resamples', type=int, default=RESAMPLES)
+    parser.add_argument('--block', choices=['episode', 'month'], default='episode')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', default=dh.CACHE_FOLDER + 'significance.csv', help='csv or parquet results file')
+    args = parser.parse_args()
+
+    returns = dh.get_return_panel('industry')
+    selections = {s: dh.industry_group_selection(s) for s in args.selection or dh.INDUSTRY_GROUPS_OPTION}
+    tables = []
+    for regime in args.regime or dh.REGIME_FILE_OPTION:
+        table = significance(selections, dh.get_regime(regime), returns, args.resamples, args.block, args.alpha,
+                             args.seed, args.workers)
+        table.insert(0, 'regime', regime)
+        tables.append(table)
+    results = pd.concat(tables, ignore_index=True)
+    if args.output.endswith('.parquet'):
+        results.to_parquet(args.output, index=False)
+    else:
+        results.to_csv(args.output, index=False)
+    print(f'{len(results)} rows written to {args.output}')
+
+if __name__ == '__main__':
+    main()
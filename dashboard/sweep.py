@@ -0,0 +1,86 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import datahandler as dh
+import backtest as bt
+
+RESULTS_FILE = dh.CACHE_FOLDER + 'sweep.parquet'
+
+# industry return panel, loaded once per worker process rather than pickled with every task
+_returns = None
+
+def _init_worker(panel_file: str):
+    global _returns
+    from streamlit.logger import set_log_level
+    set_log_level('error')
+    _returns = pd.read_parquet(panel_file)
+
+def _tidy(table: pd.DataFrame, kind: str) -> pd.DataFrame:
+    table = table.rename_axis('row').reset_index().melt(id_vars='row', var_name='column')
+    table.insert(0, 'table', kind)
+    return table
+
+def run_config(regime_file: str, select: str, windows: dict = bt.WINDOWS, returns: pd.DataFrame = None) -> pd.DataFrame:
+    # returns defaults to the pool worker's panel, or outside the pool to the current industry panel
+    if returns is None:
+        returns = _returns if _returns is not None else dh.get_return_panel('industry')
+    periods = dh.get_regime(regime_file)
+    selection = dh.industry_group_selection(select)
+    result_incl, result_excl, result_incl_ex_stag, result_excl_ex_stag, market = bt.run_backtest(selection, periods, returns)
+    variants = {'all': (result_incl, result_excl), 'ex_stag': (result_incl_ex_stag, result_excl_ex_stag)}
+
+    tables = []
+    for variant, (incl, excl) in variants.items():
+        summaries, stats = bt.evaluate_windows(incl, excl, market, windows)
+        for name in windows:
+            for kind, table in [('summary', summaries[name]), ('stats', stats[name])]:
+                table = _tidy(table, kind)
+                table.insert(0, 'window', name)
+                table.insert(0, 'variant', variant)
+                tables.append(table)
+    result = pd.concat(tables, ignore_index=True)
+    result.insert(0, 'selection', select)
+    result.insert(0, 'regime', regime_file)
+    return result
+
+def run_sweep(regimes: list = None, selections: list = None, windows: dict = bt.WINDOWS,
+              workers: int = None, output: str = RESULTS_FILE) -> pd.DataFrame:
+    # Backtest every regime x selection pair over each window in a process pool
+    regimes = regimes or dh.REGIME_FILE_OPTION
+    selections = selections or dh.INDUSTRY_GROUPS_OPTION
+    panel_file = dh.materialise_return_panels(dh.ingest_constituents()) + 'industry.parquet'
+    grid = [(r, s) for r in regimes for s in selections]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(panel_file,)) as pool:
+        futures = [pool.submit(run_config, r, s, windows) for r, s in grid]
+        results = pd.concat([f.result() for f in futures], ignore_index=True)
+
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        results.to_parquet(output, index=False)
+    return results
+
+def _parse_window(text: str):
+    name, start, end = text.split(':')
+    return name, (start or None, end or None)
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest every regime x selection file over a set of date windows.')
+    parser.add_argument('--regime', action='append', help='regime file name (repeatable, default: all)')
+    parser.add_argument('--selection', action='append', help='selection file name (repeatable, default: all)')
+    parser.add_argument('--window', action='append', type=_parse_window,
+                        help='NAME:START:END with END exclusive, either date may be blank (repeatable)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=RESULTS_FILE, help='parquet or csv results file')
+    args = parser.parse_args()
+
+    windows = dict(args.window) if args.window else bt.WINDOWS
+    output = args.output if args.output.endswith('.parquet') else None
+    results = run_sweep(args.regime, args.selection, windows, args.workers, output)
+    if output is None:
+        results.to_csv(args.output, index=False)
+    print(f'{len(results)} rows written to {args.output}')
+
+if __name__ == '__main__':
+    main()